@@ -0,0 +1,45 @@
+# assign_patients_main.py
+import argparse
+import csv
+import os
+import time
+from datetime import datetime
+
+from clustering.assignment import CommunityAssigner
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(
+        description='Asigna pacientes nuevos a las comunidades de un modelo guardado con --save-model')
+    parser.add_argument('model_path',
+                        help='Fichero .npz guardado con community_detection_main.py --save-model')
+    parser.add_argument('ttl_path', nargs='+',
+                        help='Ficheros .ttl con los pacientes nuevos (admite patrones glob)')
+    parser.add_argument('--no-streaming', action='store_true',
+                        help='Carga el rdflib.Graph completo en lugar de leer en streaming')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    assigner = CommunityAssigner.load(args.model_path)
+    print(f"[1] Modelo cargado: {len(assigner.patient_ids)} pacientes, {len(assigner.communities)} comunidades "
+          f"({1000 * (time.perf_counter() - start):.1f} ms).", flush=True)
+
+    start = time.perf_counter()
+    assignments = assigner.assign_ttl(args.ttl_path, streaming=not args.no_streaming)
+    print(f"[2] {len(assignments)} pacientes asignados ({1000 * (time.perf_counter() - start):.1f} ms):", flush=True)
+    for pid, comm_id in assignments.items():
+        print(f"  {pid} → {comm_id if comm_id is not None else 'sin comunidad'}")
+
+    output_dir = "outputs"
+    os.makedirs(output_dir, exist_ok=True)
+    today_str = datetime.today().strftime("%Y%m%d")
+    output_file = os.path.join(output_dir, f"{today_str}_Assignments.csv")
+
+    with open(output_file, mode="w", newline="", encoding="utf-8") as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(["Cluster", "PatientID"])
+        for pid, comm_id in assignments.items():
+            writer.writerow([comm_id if comm_id is not None else "", pid])
+
+    print(f"CSV file saved to {output_file}")
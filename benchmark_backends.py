@@ -0,0 +1,88 @@
+# benchmark_backends.py
+import argparse
+import time
+
+from sklearn.datasets import make_blobs
+
+from feature_builder.vectorizer import build_feature_vectors
+from feature_builder.graph_builder import build_similarity_graph
+from clustering.community_detector import detect_communities, evaluate_modularity, BACKENDS
+
+
+def benchmark_graph(G, methods, repeats: int = 3, seed: int = 42) -> list:
+    """
+    Mide el tiempo de detect_communities con cada backend sobre el mismo grafo.
+
+    :param G: PatientGraph sobre el que se ejecutan los métodos
+    :param methods: Métodos a comparar ('louvain', 'label_propagation')
+    :param repeats: Repeticiones por combinación; se conserva el mejor tiempo
+    :param seed: Semilla para la detección de comunidades
+    :return: Lista de dicts { method, backend, seconds, communities, modularity, speedup }
+    """
+    results = []
+    for method in methods:
+        baseline = None
+        for backend in BACKENDS:
+            times = []
+            for _ in range(repeats):
+                start = time.perf_counter()
+                partition = detect_communities(G, method=method, seed=seed, backend=backend)
+                times.append(time.perf_counter() - start)
+            seconds = min(times)
+            baseline = baseline or seconds
+            results.append({
+                "method": method,
+                "backend": backend,
+                "seconds": seconds,
+                "communities": len(set(partition.values())),
+                "modularity": evaluate_modularity(G, partition) if G.number_of_edges() else None,
+                "speedup": baseline / seconds,
+            })
+    return results
+
+
+def synthetic_graph(n_patients: int, knn: int, seed: int = 42):
+    """Grafo kNN sobre pacientes sintéticos agrupados en blobs, de tamaño similar a un grafo real."""
+    features, _ = make_blobs(n_samples=n_patients, n_features=40, centers=12, random_state=seed)
+    patient_ids = [f"synthetic#Case_{i}" for i in range(n_patients)]
+    return build_similarity_graph(features, patient_ids, knn=knn)
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(
+        description='Compara los backends networkx e igraph de detect_communities')
+    parser.add_argument('ttl_path', nargs='*',
+                        help='Ficheros .ttl con el grafo RDF (opcional si se usa --synthetic)')
+    parser.add_argument('--threshold', type=float, default=None,
+                        help='Umbral de similitud para el grafo construido a partir de ttl_path')
+    parser.add_argument('--knn', type=int, default=15,
+                        help='Vecinos por paciente en los grafos sintéticos (y en el de ttl_path si no hay --threshold)')
+    parser.add_argument('--synthetic', type=int, nargs='+', default=[],
+                        help='Tamaños de grafos sintéticos a evaluar (p. ej. 5000 20000 50000)')
+    parser.add_argument('--methods', nargs='+', choices=['louvain', 'label_propagation'],
+                        default=['louvain', 'label_propagation'], help='Métodos a comparar')
+    parser.add_argument('--repeats', type=int, default=3,
+                        help='Repeticiones por combinación (se muestra el mejor tiempo)')
+    args = parser.parse_args()
+
+    if not args.ttl_path and not args.synthetic:
+        parser.error('Indique ttl_path o --synthetic')
+
+    graphs = []
+    if args.ttl_path:
+        feature_vectors, patient_ids = build_feature_vectors(args.ttl_path)
+        knn = None if args.threshold is not None else args.knn
+        graphs.append(("ttl", build_similarity_graph(feature_vectors, patient_ids,
+                                                     threshold=args.threshold, knn=knn)))
+    for n_patients in args.synthetic:
+        graphs.append((f"synthetic-{n_patients}", synthetic_graph(n_patients, args.knn)))
+
+    print(f"  {'Grafo':>16} {'Nodos':>8} {'Aristas':>10} {'Método':>18} {'Backend':>9} "
+          f"{'Segundos':>9} {'Comun.':>7} {'Modularidad':>12} {'Speedup':>8}")
+    for name, G in graphs:
+        for row in benchmark_graph(G, args.methods, repeats=args.repeats):
+            modularity = f"{row['modularity']:.4f}" if row['modularity'] is not None else "-"
+            print(f"  {name:>16} {G.number_of_nodes():>8} {G.number_of_edges():>10} {row['method']:>18} "
+                  f"{row['backend']:>9} {row['seconds']:>9.3f} {row['communities']:>7} "
+                  f"{modularity:>12} {row['speedup']:>7.1f}x", flush=True)
@@ -0,0 +1,171 @@
+# clustering/assignment.py
+import numpy as np
+import scipy.sparse as sp
+from sklearn.neighbors import NearestNeighbors
+from sklearn.preprocessing import normalize
+
+from feature_builder.graph_analyzer import extract_features_from_files, resolve_input_paths
+from feature_builder.vectorizer import FeatureVectorizer
+
+
+class CommunityAssigner:
+    """
+    Asigna pacientes nuevos a las comunidades de una partición ya calculada.
+
+    Guarda la matriz de características de la cohorte, la partición y el FeatureVectorizer
+    ajustado. Cada paciente nuevo se codifica contra el esquema guardado, se compara solo
+    con los pacientes de la cohorte (similitud coseno, con las mismas reglas de aristas que
+    build_similarity_graph: peso > 0, peso >= threshold y, con knn, como en knn_edges, basta con que
+    uno de los dos esté entre los k más similares del otro; con mutual, ambos deben estarlo)
+    y se asigna a la comunidad con mayor suma de pesos. La partición guardada no se modifica.
+
+    :param feature_vectors: Matriz NumPy o scipy.sparse de la cohorte (n_pacientes, n_características)
+    :param patient_ids: Identificadores de pacientes, en el orden de las filas
+    :param partition: Diccionario { patient_id: community_id }
+    :param vectorizer: FeatureVectorizer ajustado con el que se construyó feature_vectors
+    :param threshold: Umbral de similitud usado al construir el grafo (None = sin umbral)
+    :param knn: Número de vecinos si el grafo era de k vecinos más cercanos (None = grafo por umbral)
+    :param mutual: Con knn, el grafo se construyó solo con vecinos mutuos (ver knn_edges)
+    :param kth_similarity: Con knn, similitud de cada paciente de la cohorte con su k-ésimo vecino
+                           (la guarda save()); si no se indica, se calcula con NearestNeighbors
+    """
+
+    def __init__(self, feature_vectors, patient_ids, partition, vectorizer: FeatureVectorizer,
+                 threshold: float = None, knn: int = None, mutual: bool = False, kth_similarity=None):
+        if not vectorizer.is_fitted:
+            raise ValueError("El FeatureVectorizer no está ajustado. Llame antes a fit().")
+
+        self.feature_vectors = feature_vectors
+        self.patient_ids = list(patient_ids)
+        self.vectorizer = vectorizer
+        self.threshold = threshold
+        self.knn = knn
+        self.mutual = mutual
+
+        # Comunidad de cada fila (-1 = paciente sin comunidad, no vota)
+        self.membership = np.array([partition.get(pid, -1) for pid in self.patient_ids], dtype=np.int64)
+        self.communities = np.unique(self.membership[self.membership >= 0])
+
+        # Precalculado una vez: filas normalizadas e indicador fila → comunidad
+        self._normalized = normalize(feature_vectors)
+        voting = np.flatnonzero(self.membership >= 0)
+        community_idx = np.searchsorted(self.communities, self.membership[voting])
+        self._indicator = sp.csr_matrix((np.ones(len(voting)), (voting, community_idx)),
+                                        shape=(len(self.patient_ids), len(self.communities)))
+
+        # Con knn: similitud del k-ésimo vecino de cada paciente de la cohorte.
+        # Un paciente nuevo entra en su lista de vecinos solo si la iguala o la supera.
+        self._kth_similarity = None
+        if knn is not None:
+            self._kth_similarity = (self._kth_neighbor_similarity(knn) if kth_similarity is None
+                                    else np.asarray(kth_similarity, dtype=float))
+
+    def assign(self, feature_vectors, patient_ids) -> dict:
+        """
+        Asigna pacientes ya codificados con self.vectorizer.
+
+        :param feature_vectors: Matriz (m, n_características) de los pacientes nuevos
+        :param patient_ids: Identificadores de los pacientes nuevos
+        :return: Diccionario { patient_id: community_id }, con None si el paciente
+                 no tiene ninguna arista con la cohorte
+        """
+        sims = normalize(feature_vectors) @ self._normalized.T
+        sims = sims.toarray() if sp.issparse(sims) else np.asarray(sims)
+
+        mask = sims > 0
+        if self.threshold is not None:
+            mask &= sims >= self.threshold
+        if self.knn is not None:
+            # Cohorte entre los k más similares del paciente nuevo, y viceversa
+            in_top = np.ones_like(mask)
+            if self.knn < sims.shape[1]:
+                top = np.argpartition(-sims, self.knn - 1, axis=1)[:, :self.knn]
+                in_top = np.zeros_like(mask)
+                np.put_along_axis(in_top, top, True, axis=1)
+            in_their_top = sims >= self._kth_similarity[np.newaxis, :]
+            mask &= (in_top & in_their_top) if self.mutual else (in_top | in_their_top)
+
+        scores = np.asarray(self._indicator.T @ np.where(mask, sims, 0).T).T
+        best = scores.argmax(axis=1)
+        has_edges = scores.max(axis=1, initial=0) > 0
+        return {pid: (self.communities[best[i]].item() if has_edges[i] else None)
+                for i, pid in enumerate(patient_ids)}
+
+    def _kth_neighbor_similarity(self, k: int):
+        """Similitud coseno de cada fila de la cohorte con su k-ésimo vecino (como en knn_edges)."""
+        n = self._normalized.shape[0]
+        if n < 2:
+            return np.full(n, -np.inf)
+        n_neighbors = min(k, n - 1)
+        index = NearestNeighbors(n_neighbors=n_neighbors).fit(self._normalized)
+        kth = index.kneighbors(return_distance=False)[:, -1]
+        # Similitud exacta (producto escalar de las filas normalizadas), como los pesos de las aristas
+        if sp.issparse(self._normalized):
+            return np.asarray(self._normalized.multiply(self._normalized[kth]).sum(axis=1)).ravel()
+        return np.einsum("ij,ij->i", self._normalized, self._normalized[kth])
+
+    def assign_features(self, patient_features) -> dict:
+        """
+        Codifica y asigna pacientes nuevos.
+        :param patient_features: dict { patient_uri: [(feature_uri, value), ...] }
+        """
+        feature_vectors, patient_ids = self.vectorizer.transform(patient_features)
+        return self.assign(feature_vectors, patient_ids)
+
+    def assign_ttl(self, ttl_path, streaming: bool = True) -> dict:
+        """
+        Extrae, codifica y asigna los pacientes de uno o varios ficheros .ttl.
+        :param ttl_path: Ruta, patrón glob o lista de rutas
+        :param streaming: Si True, lee los ficheros triple a triple (ver stream_patient_features)
+        """
+        patient_features = extract_features_from_files(resolve_input_paths(ttl_path), streaming=streaming, n_jobs=1)
+        return self.assign_features(patient_features)
+
+    def save(self, path, graph=None):
+        """
+        Guarda cohorte, partición y vectorizador en un fichero .npz.
+        :param graph: PatientGraph opcional de la cohorte, necesario para actualizar la ejecución
+                      de forma incremental (ver clustering.incremental)
+        """
+        if sp.issparse(self.feature_vectors):
+            matrix = self.feature_vectors.tocsr()
+            arrays = {"data": matrix.data, "indices": matrix.indices,
+                      "indptr": matrix.indptr, "shape": np.array(matrix.shape)}
+        else:
+            arrays = {"feature_vectors": np.asarray(self.feature_vectors)}
+        if graph is not None:
+            arrays.update(graph.state_arrays(prefix="graph_"))
+        np.savez(path,
+                 patient_ids=np.array(self.patient_ids, dtype=str),
+                 membership=self.membership,
+                 threshold=np.array(np.nan if self.threshold is None else self.threshold),
+                 knn=np.array(0 if self.knn is None else self.knn),
+                 mutual=np.array(self.mutual),
+                 kth_similarity=np.zeros(0) if self._kth_similarity is None else self._kth_similarity,
+                 **arrays,
+                 **self.vectorizer.state_arrays(prefix="vectorizer_"))
+
+    @classmethod
+    def load(cls, path) -> "CommunityAssigner":
+        """Carga un CommunityAssigner guardado con save()."""
+        with np.load(path, allow_pickle=False) as data:
+            if "feature_vectors" in data.files:
+                feature_vectors = data["feature_vectors"]
+            else:
+                feature_vectors = sp.csr_matrix((data["data"], data["indices"], data["indptr"]),
+                                                shape=tuple(data["shape"]))
+            patient_ids = data["patient_ids"].tolist()
+            membership = data["membership"]
+            threshold = float(data["threshold"])
+            knn = int(data["knn"])
+            # Modelos guardados antes de admitir vecinos mutuos
+            mutual = bool(data["mutual"]) if "mutual" in data.files else False
+            # Modelos antiguos sin kth_similarity: se recalcula al construir
+            kth_similarity = data["kth_similarity"] if "kth_similarity" in data.files else None
+            vectorizer = FeatureVectorizer.from_state_arrays(data, prefix="vectorizer_")
+
+        partition = {pid: int(c) for pid, c in zip(patient_ids, membership) if c >= 0}
+        return cls(feature_vectors, patient_ids, partition, vectorizer,
+                   threshold=None if np.isnan(threshold) else threshold,
+                   knn=knn or None, mutual=mutual,
+                   kth_similarity=kth_similarity if knn else None)
@@ -1,39 +1,215 @@
-from feature_builder.graph_analyzer import extract_patient_features, extract_patient_nodes, filter_features
+from feature_builder.graph_analyzer import index_patient_graph, filter_features, load_rdf_graph
+from feature_builder.cache import cache_key, load_cached, store_cached
 from clustering.preprocess import preprocess_data_clustering
+from feature_builder.vectorizer import FeatureVectorizer
+from feature_builder.graph_builder import DEFAULT_MEMORY_BUDGET_MB, build_similarity_graph
 import argparse
-from sklearn.cluster import KMeans
+from concurrent.futures import ProcessPoolExecutor
+from sklearn.cluster import KMeans, MiniBatchKMeans, AgglomerativeClustering, SpectralClustering
 from clustering.community_detector import evaluate_modularity
 import networkx as nx
+import os
+import time
 import numpy as np
-from sklearn.metrics import (
-    silhouette_score, silhouette_samples,
-    calinski_harabasz_score, davies_bouldin_score,
-)
-
-def clustering_apply(graph, method, nclusters=5):
-    if method == "kmeans":
-        preprocessed_df, patient_nodes = _clustering_apply_preprocess(graph)
-        labels = kmeans_apply(preprocessed_df, nclusters)
+import pandas as pd
+import scipy.sparse as sp
+from sklearn.metrics.pairwise import euclidean_distances
+
+# Motores de k-means disponibles: KMeans completo o MiniBatchKMeans para cohortes grandes
+KMEANS_ENGINES = ["kmeans", "minibatch"]
+
+# Métodos que agrupan sobre el grafo de similitud disperso (kNN o por umbral)
+GRAPH_METHODS = ["agglomerative_ward", "agglomerative_average", "spectral"]
+
+# Matriz preprocesada de cada proceso trabajador del barrido de k (ver _init_sweep_worker)
+_sweep_matrix = None
+
+def clustering_apply(graph, method, nclusters=5, ttl_path=None, use_cache=True, vectorizer=None,
+                     report_sample_size=None, engine="kmeans", graph_knn=10, graph_threshold=None):
+    """
+    graph: rdflib.Graph ya cargado, o None si se indica ttl_path (se carga solo si no está en caché)
+    ttl_path: fichero .ttl de origen; necesario para usar la caché de preprocesado
+    vectorizer: FeatureVectorizer opcional (ver preprocess_data_clustering); si no está ajustado,
+                queda ajustado al terminar y se puede guardar con save(). Con sparse=True la
+                matriz CSR se usa tal cual en k-means y en el informe, sin densificarla
+    report_sample_size: tamaño de la muestra para estimar la silueta del informe (None = todos los puntos)
+    engine: "kmeans" (KMeans) o "minibatch" (MiniBatchKMeans)
+    graph_knn, graph_threshold: grafo de similitud para los métodos de GRAPH_METHODS
+                                (ver build_similarity_graph; graph_knn=None para un grafo solo por umbral)
+    """
+    if method in GRAPH_METHODS:
+        preprocessed_df, patient_nodes = _clustering_apply_preprocess(graph, ttl_path, use_cache, vectorizer)
+        labels = graph_clustering_apply(preprocessed_df, nclusters, method, knn=graph_knn, threshold=graph_threshold)
+        patient_labels = dict(zip(patient_nodes, labels))
+
+        print(f"[DEBUG] {method} quick report:", flush=True)
+        print(kmeans_quick_report(preprocessed_df, labels, sample_size=report_sample_size), flush=True)
+
+        return reorganize_clusters(patient_labels)
+    elif method == "kmeans":
+        preprocessed_df, patient_nodes = _clustering_apply_preprocess(graph, ttl_path, use_cache, vectorizer)
+        labels = kmeans_apply(preprocessed_df, nclusters, engine)
         patient_labels = dict(zip(patient_nodes, labels))
 
         print("[DEBUG] K-means quick report:", flush=True)
-        print(kmeans_quick_report(preprocessed_df, labels), flush=True)
+        print(kmeans_quick_report(preprocessed_df, labels, sample_size=report_sample_size), flush=True)
 
         return reorganize_clusters(patient_labels)
     else:
-        raise ValueError(f"Unknown clustering method: {method}. Use 'kmeans'.")
+        raise ValueError(f"Unknown clustering method: {method}. Use 'kmeans' or one of {GRAPH_METHODS}.")
+
+def graph_clustering_apply(preprocessed_df, nclusters, method, knn=10, threshold=None):
+    """
+    Clustering restringido al grafo de similitud disperso de build_similarity_graph, con memoria
+    proporcional al número de aristas en lugar de n²:
+      - agglomerative_ward / agglomerative_average: AgglomerativeClustering con el grafo como
+        conectividad (solo se fusionan clusters unidos por alguna arista)
+      - spectral: SpectralClustering con la matriz de similitudes del grafo como afinidad precalculada
+    """
+    X = _feature_matrix(preprocessed_df)
+    similarity_graph = build_similarity_graph(X, list(range(X.shape[0])), threshold=threshold, knn=knn)
+    adjacency = similarity_graph.adjacency.astype(float)
+
+    if method in ("agglomerative_ward", "agglomerative_average"):
+        connectivity = adjacency.copy()
+        connectivity.data[:] = 1
+        model = AgglomerativeClustering(n_clusters=nclusters, linkage=method.split("_")[1],
+                                        connectivity=connectivity)
+        # AgglomerativeClustering solo admite matrices densas
+        return model.fit_predict(X.toarray() if sp.issparse(X) else X)
+    elif method == "spectral":
+        model = SpectralClustering(n_clusters=nclusters, affinity="precomputed", random_state=42,
+                                   assign_labels="cluster_qr")
+        return model.fit_predict(adjacency)
+    raise ValueError(f"Unknown graph clustering method: {method}. Use one of {GRAPH_METHODS}.")
 
-def _clustering_apply_preprocess(graph):
-    ## Load RDF graph and extract patient features
-    patient_nodes = extract_patient_nodes(graph)
-    features_by_patient = extract_patient_features(graph, patient_nodes)
+def has_cached_preprocess(ttl_path, vectorizer=None):
+    """
+    Indica si la caché tiene el preprocesado de ttl_path para este vectorizador, es decir, si
+    clustering_apply / clustering_sweep pueden ejecutarse sin cargar el TTL.
+    """
+    if vectorizer is None:
+        vectorizer = FeatureVectorizer(prefix_sep='_', fill_categorical=False)
+    if vectorizer.is_fitted or not os.path.isfile(ttl_path):
+        return False
+    return load_cached(_preprocess_cache_key(ttl_path, vectorizer)) is not None
+
+def _preprocess_cache_key(ttl_path, vectorizer):
+    return cache_key(ttl_path, stage="clustering_preprocess", sparse=vectorizer.sparse,
+                     fill_categorical=vectorizer.fill_categorical)
+
+def _clustering_apply_preprocess(graph, ttl_path=None, use_cache=True, vectorizer=None):
+    if vectorizer is None:
+        vectorizer = FeatureVectorizer(prefix_sep='_', fill_categorical=False)
+
+    ## Reuse the cached preprocessed matrix for the same TTL content, if any
+    ## (only when fitting; a fitted vectorizer always transforms against its own schema)
+    use_cache = use_cache and ttl_path is not None and not vectorizer.is_fitted
+    if use_cache:
+        key = _preprocess_cache_key(ttl_path, vectorizer)
+        cached = load_cached(key)
+        if cached is not None:
+            if vectorizer.sparse:
+                preprocessed_df = sp.csr_matrix((cached["data"], cached["indices"], cached["indptr"]),
+                                                shape=tuple(cached["shape"]))
+            else:
+                preprocessed_df = pd.DataFrame(cached["values"],
+                                               index=cached["index"].tolist(),
+                                               columns=cached["columns"].tolist())
+            vectorizer.set_state_arrays(cached, prefix="vectorizer_")
+            return preprocessed_df, cached["patient_nodes"].tolist()
+
+    if graph is None:
+        graph = load_rdf_graph(ttl_path)
+
+    ## Index the RDF graph once and extract patient features
+    index = index_patient_graph(graph)
+    patient_nodes = list(index.patients)
+    features_by_patient = index.features(patient_nodes)
     
     filtered_features_by_patient = filter_features(features_by_patient)
 
-    return preprocess_data_clustering(filtered_features_by_patient), patient_nodes # Receives dict, returns dataframe
+    preprocessed_df = preprocess_data_clustering(filtered_features_by_patient, vectorizer) # Receives dict, returns dataframe (or CSR)
+
+    if use_cache:
+        if sp.issparse(preprocessed_df):
+            arrays = {"data": preprocessed_df.data, "indices": preprocessed_df.indices,
+                      "indptr": preprocessed_df.indptr, "shape": np.array(preprocessed_df.shape)}
+        else:
+            arrays = {"values": preprocessed_df.to_numpy(),
+                      "index": np.array(preprocessed_df.index, dtype=str),
+                      "columns": np.array(preprocessed_df.columns, dtype=str)}
+        store_cached(key, {
+            **arrays,
+            "patient_nodes": np.array(patient_nodes, dtype=str),
+            **vectorizer.state_arrays(prefix="vectorizer_"),
+        })
+
+    return preprocessed_df, patient_nodes
+
+def clustering_sweep(graph, method, k_values, ttl_path=None, use_cache=True, vectorizer=None,
+                     report_sample_size=None, engine="kmeans", n_jobs=1):
+    """
+    Barrido de k: preprocesa una sola vez y ajusta k-means para cada k en procesos paralelos.
+
+    graph, ttl_path, use_cache, vectorizer: como en clustering_apply
+    k_values: valores de k a evaluar
+    report_sample_size: tamaño de la muestra para estimar la silueta (ver kmeans_quick_report)
+    engine: "kmeans" o "minibatch"
+    n_jobs: número de procesos (la matriz se envía una vez a cada proceso)
+    Devuelve (resultados, patient_nodes); cada resultado es el informe de kmeans_quick_report
+    con "k", "inertia", "seconds" y "labels".
+    """
+    if method != "kmeans":
+        raise ValueError(f"k sweep only supports 'kmeans', got: {method}.")
+
+    preprocessed_df, patient_nodes = _clustering_apply_preprocess(graph, ttl_path, use_cache, vectorizer)
+    X = _feature_matrix(preprocessed_df)
+    tasks = [(k, engine, report_sample_size) for k in sorted(set(k_values))]
+
+    if n_jobs and n_jobs > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=min(n_jobs, len(tasks)), initializer=_init_sweep_worker,
+                                 initargs=(X,)) as executor:
+            results = list(executor.map(_sweep_task, tasks))
+    else:
+        results = [_sweep_task(task, X) for task in tasks]
+
+    return results, patient_nodes
+
+def _feature_matrix(preprocessed):
+    """Matriz float del preprocesado: el array del DataFrame o la CSR tal cual."""
+    if sp.issparse(preprocessed):
+        return preprocessed.tocsr().astype(float)
+    if isinstance(preprocessed, pd.DataFrame):
+        return preprocessed.to_numpy(dtype=float)
+    return np.asarray(preprocessed, dtype=float)
+
+def _init_sweep_worker(X):
+    global _sweep_matrix
+    _sweep_matrix = X
+
+def _sweep_task(task, X=None):
+    k, engine, report_sample_size = task
+    if X is None:
+        X = _sweep_matrix
 
-def kmeans_apply(preprocessed_df, nclusters):
-    kmeans = KMeans(n_clusters=nclusters, random_state=42)
+    start = time.perf_counter()
+    model = _kmeans_model(k, engine).fit(X)
+    seconds = time.perf_counter() - start
+
+    report = kmeans_quick_report(X, model.labels_, sample_size=report_sample_size)
+    report.update({"k": k, "inertia": float(model.inertia_), "seconds": seconds, "labels": model.labels_})
+    return report
+
+def _kmeans_model(nclusters, engine="kmeans"):
+    if engine == "kmeans":
+        return KMeans(n_clusters=nclusters, random_state=42)
+    elif engine == "minibatch":
+        return MiniBatchKMeans(n_clusters=nclusters, random_state=42, batch_size=1024)
+    raise ValueError(f"Unknown k-means engine: {engine}. Use {' or '.join(KMEANS_ENGINES)}.")
+
+def kmeans_apply(preprocessed_df, nclusters, engine="kmeans"):
+    kmeans = _kmeans_model(nclusters, engine)
     kmeans.fit(preprocessed_df)
 
     return kmeans.labels_
@@ -47,25 +223,30 @@ def reorganize_clusters(patient_labels):
     return clusters
 
 
-def kmeans_quick_report(X, labels):
+def kmeans_quick_report(X, labels, sample_size=None, memory_budget_mb=DEFAULT_MEMORY_BUDGET_MB, random_state=0):
     """
-    X: matriz/df de features (ya preprocesado)
+    X: matriz/df de features (ya preprocesado), densa o scipy.sparse
     labels: array de clusters devuelto por k-means
-    louvain_labels (opcional): array de comunidades de Louvain (mismo orden) para comparar
+    sample_size: si se indica, la silueta se estima sobre una muestra estratificada por cluster
+                 (cada punto de la muestra se compara con todos los puntos) y se añade un
+                 intervalo de confianza del 95 %
+    memory_budget_mb: memoria máxima para los bloques de distancias de la silueta
     """
-    X = np.asarray(X)
+    if not sp.issparse(X):
+        X = np.asarray(X, dtype=float)
     labels = np.asarray(labels)
     k = int(len(np.unique(labels)))
     out = {"n_samples": int(len(labels)), "n_clusters": k}
 
     # Métricas internas (solo si hay >=2 clusters y < n_samples)
     if 2 <= k < len(labels):
-        s = silhouette_score(X, labels)
-        s_samples = silhouette_samples(X, labels)
-        out["silhouette"] = round(float(s), 3)
-        out["silhouette_pct_negative"] = round(float((s_samples < 0).mean()), 3)
-        out["calinski_harabasz"] = round(float(calinski_harabasz_score(X, labels)), 1)
-        out["davies_bouldin"] = round(float(davies_bouldin_score(X, labels)), 3)
+        # Normas al cuadrado de las filas: compartidas por la silueta y las métricas de centroides
+        row_sq = _row_sq_norms(X)
+        silhouette = _silhouette_report(X, labels, row_sq, sample_size, memory_budget_mb, random_state)
+        out.update(silhouette)
+        ch, db = _centroid_scores(X, labels, row_sq)
+        out["calinski_harabasz"] = round(float(ch), 1)
+        out["davies_bouldin"] = round(float(db), 3)
     else:
         out.update({
             "silhouette": None,
@@ -83,4 +264,138 @@ def kmeans_quick_report(X, labels):
         "largest_share_pct": round(100 * sizes.max() / sizes.sum(), 1),
     })
 
-    return out
\ No newline at end of file
+    return out
+
+def _row_sq_norms(X):
+    if sp.issparse(X):
+        return np.asarray(X.multiply(X).sum(axis=1)).ravel()
+    return np.einsum("ij,ij->i", X, X)
+
+def _silhouette_report(X, labels, row_sq, sample_size=None, memory_budget_mb=DEFAULT_MEMORY_BUDGET_MB,
+                       random_state=0):
+    """
+    Silueta media y porcentaje de siluetas negativas. Si sample_size es None se calculan
+    todas las siluetas (mismo resultado que silhouette_score); si no, se estiman con una
+    muestra estratificada por cluster y se añade el intervalo de confianza del 95 %.
+    """
+    n = len(labels)
+    cluster_ids, inverse = np.unique(labels, return_inverse=True)
+    sizes = np.bincount(inverse)
+
+    if sample_size is None or sample_size >= n:
+        s = _silhouette_samples_chunked(X, inverse, row_sq, np.arange(n), memory_budget_mb)
+        return {
+            "silhouette": round(float(s.mean()), 3),
+            "silhouette_pct_negative": round(float((s < 0).mean()), 3),
+        }
+
+    # Muestreo estratificado: asignación proporcional al tamaño, al menos un punto por cluster
+    rng = np.random.default_rng(random_state)
+    per_cluster = np.minimum(sizes, np.maximum(1, np.round(sample_size * sizes / n).astype(int)))
+    sample_idx = np.concatenate([
+        rng.choice(np.flatnonzero(inverse == c), size=per_cluster[c], replace=False)
+        for c in range(len(cluster_ids))
+    ])
+    s = _silhouette_samples_chunked(X, inverse, row_sq, sample_idx, memory_budget_mb)
+
+    # Estimadores estratificados (peso de cada cluster = tamaño / n)
+    strata = inverse[sample_idx]
+    weights = sizes / n
+    means = np.bincount(strata, weights=s) / per_cluster
+    negatives = np.bincount(strata, weights=(s < 0).astype(float)) / per_cluster
+    variances = np.array([
+        s[strata == c].var(ddof=1) if per_cluster[c] > 1 else 0.0 for c in range(len(cluster_ids))
+    ])
+    finite_population = 1 - per_cluster / sizes
+    std_error = np.sqrt(np.sum(weights ** 2 * variances / per_cluster * finite_population))
+    estimate = float(np.sum(weights * means))
+
+    return {
+        "silhouette": round(estimate, 3),
+        "silhouette_ci95": [round(estimate - 1.96 * std_error, 3), round(estimate + 1.96 * std_error, 3)],
+        "silhouette_pct_negative": round(float(np.sum(weights * negatives)), 3),
+        "silhouette_sample_size": int(len(sample_idx)),
+    }
+
+def _silhouette_samples_chunked(X, inverse, row_sq, rows, memory_budget_mb=DEFAULT_MEMORY_BUDGET_MB):
+    """
+    Siluetas (distancia euclídea, misma definición que silhouette_samples) de las filas `rows`
+    frente a todos los puntos, por bloques de filas de forma que cada bloque de distancias
+    ocupe como mucho memory_budget_mb. Las distancias de cada bloque se reducen en el momento
+    a sumas por cluster, sin guardar la matriz n x n.
+    """
+    n = X.shape[0]
+    k = int(inverse.max()) + 1
+    sizes = np.bincount(inverse, minlength=k)
+    indicator = sp.csr_matrix((np.ones(n), (np.arange(n), inverse)), shape=(n, k))
+
+    block_rows = int(memory_budget_mb * 1024 ** 2 // (max(1, n) * np.dtype(float).itemsize * 2))
+    block_rows = min(max(1, block_rows), max(1, len(rows)))
+
+    s = np.empty(len(rows))
+    for start in range(0, len(rows), block_rows):
+        block = rows[start:start + block_rows]
+        distances = euclidean_distances(X[block], X, X_norm_squared=row_sq[block][:, None],
+                                        Y_norm_squared=row_sq[None, :])
+        own = inverse[block]
+        cluster_sums = np.asarray((indicator.T @ distances.T).T)
+        # La distancia de cada punto a sí mismo debe ser exactamente 0
+        cluster_sums[np.arange(len(block)), own] -= distances[np.arange(len(block)), block]
+
+        # a: distancia media a su propio cluster (sin contarse a sí mismo)
+        own_sizes = sizes[own]
+        a = cluster_sums[np.arange(len(block)), own] / np.maximum(own_sizes - 1, 1)
+        # b: menor distancia media a otro cluster
+        means = cluster_sums / sizes
+        means[np.arange(len(block)), own] = np.inf
+        b = means.min(axis=1)
+
+        values = (b - a) / np.maximum(a, b)
+        # silhouette_samples asigna 0 a los puntos de clusters de tamaño 1
+        values[own_sizes == 1] = 0
+        s[start:start + len(block)] = np.nan_to_num(values)
+    return s
+
+def _centroid_scores(X, labels, row_sq=None):
+    """
+    Calinski-Harabasz y Davies-Bouldin (misma definición que sklearn) calculados a partir
+    de los centroides, sin densificar X. Admite matrices densas o scipy.sparse.
+    row_sq: normas al cuadrado de las filas, si ya están calculadas
+    """
+    n = X.shape[0]
+    cluster_ids, inverse = np.unique(labels, return_inverse=True)
+    k = len(cluster_ids)
+    sizes = np.bincount(inverse)
+
+    # Matriz de pertenencia (k x n) para sumar filas por cluster
+    membership = sp.csr_matrix((np.ones(n), (inverse, np.arange(n))), shape=(k, n))
+    centroids = membership @ X
+    if sp.issparse(centroids):
+        centroids = centroids.toarray()
+    centroids = np.asarray(centroids) / sizes[:, None]
+    mean = np.asarray(X.mean(axis=0)).ravel()
+
+    # ||x - c||^2 = ||x||^2 - 2 x·c + ||c||^2, con c el centroide de su cluster
+    if row_sq is None:
+        row_sq = _row_sq_norms(X)
+    dots = np.asarray(X @ centroids.T)[np.arange(n), inverse]
+    centroid_sq = np.einsum("ij,ij->i", centroids, centroids)
+    sq_dist = np.maximum(row_sq - 2 * dots + centroid_sq[inverse], 0)
+
+    # Calinski-Harabasz
+    extra_disp = float(np.sum(sizes * np.sum((centroids - mean) ** 2, axis=1)))
+    intra_disp = float(sq_dist.sum())
+    ch = 1.0 if intra_disp == 0 else extra_disp * (n - k) / (intra_disp * (k - 1))
+
+    # Davies-Bouldin
+    intra_dists = np.bincount(inverse, weights=np.sqrt(sq_dist)) / sizes
+    diff = centroids[:, None, :] - centroids[None, :, :]
+    centroid_distances = np.sqrt(np.sum(diff ** 2, axis=2))
+    if np.allclose(intra_dists, 0) or np.allclose(centroid_distances, 0):
+        db = 0.0
+    else:
+        centroid_distances[centroid_distances == 0] = np.inf
+        combined_intra_dists = intra_dists[:, None] + intra_dists
+        db = float(np.mean(np.max(combined_intra_dists / centroid_distances, axis=1)))
+
+    return ch, db
@@ -1,4 +1,7 @@
 # community/community_detector.py
+import random
+from contextlib import contextmanager
+
 import networkx as nx
 import igraph as ig
 try:
@@ -10,17 +13,42 @@ try:
 except ImportError:
     community_louvain = None
 
-from igraph_converter import convert_networkx_to_igraph_via_graphml
+from igraph_converter import convert_networkx_to_igraph
+from feature_builder.patient_graph import PatientGraph
+from metrics.community_quality import community_quality
+
+
+# Implementaciones disponibles para 'louvain' y 'label_propagation'
+BACKENDS = ['networkx', 'igraph']
 
 
-def detect_communities(G: nx.Graph, method: str = 'louvain', seed = None, weight="weight") -> dict:
+def detect_communities(G, method: str = 'louvain', seed = None, weight="weight", backend: str = 'networkx',
+                       initial_partition: dict = None) -> dict:
     """
     Detecta comunidades en el grafo de similitud de pacientes.
 
-    :param G: Grafo de NetworkX con nodos de pacientes y aristas ponderadas por similitud.
-    :param method: Algoritmo a utilizar: 'louvain' o 'label_propagation'.
+    :param G: PatientGraph o grafo de NetworkX con nodos de pacientes y aristas ponderadas por similitud.
+              Con un PatientGraph, 'leiden' y el backend 'igraph' trabajan directamente sobre sus arrays
+              y el backend 'networkx' materializa el grafo con to_networkx().
+    :param method: Algoritmo a utilizar: 'louvain', 'label_propagation' o 'leiden'.
+    :param backend: 'networkx' (python-louvain / NetworkX) o 'igraph' (community_multilevel /
+                    community_label_propagation, implementados en C). 'leiden' siempre usa igraph.
+    :param initial_partition: Solo 'leiden': partición { patient_id: community_id } de partida (p.ej. la
+                              de una ejecución anterior); los nodos que no aparecen empiezan solos.
     :return: Diccionario { patient_id: community_id }
     """
+    if backend not in BACKENDS:
+        raise ValueError(f"Backend desconocido: {backend}. Use {' o '.join(repr(b) for b in BACKENDS)}.")
+
+    if backend == 'igraph' and method in ('louvain', 'label_propagation'):
+        return _detect_communities_igraph(G, method, seed, weight)
+
+    if isinstance(G, PatientGraph):
+        if method == 'leiden':
+            weight = 'weight'
+        else:
+            G = G.to_networkx()
+
     if method == 'louvain':
         if community_louvain is None:
             raise ImportError("El paquete 'community' (python-louvain) no está instalado.")
@@ -34,13 +62,16 @@ def detect_communities(G: nx.Graph, method: str = 'louvain', seed = None, weight
                 partition[node] = idx
 
     elif method == 'leiden':
-        # Convert NetworkX graph to igraph via GraphML round-trip
-        ig_graph = convert_networkx_to_igraph_via_graphml(G)
+        # Convert NetworkX graph to igraph in memory
+        ig_graph = convert_networkx_to_igraph(G, weight=weight)
+        if leidenalg is None:
+            raise ImportError("El paquete 'leidenalg' no está instalado.")
 
         # Run Leiden algorithm on the igraph graph
         partition_obj = leidenalg.find_partition(
             ig_graph,
             leidenalg.ModularityVertexPartition,
+            initial_membership=_initial_membership(ig_graph, initial_partition),
             weights=weight,
             seed=seed
         )
@@ -56,14 +87,68 @@ def detect_communities(G: nx.Graph, method: str = 'louvain', seed = None, weight
     return partition
 
 
-def evaluate_modularity(G: nx.Graph, partition: dict) -> float:
+def _initial_membership(ig_graph, initial_partition: dict = None):
+    """Membership inicial por vértice; los nodos sin comunidad reciben una comunidad propia."""
+    if initial_partition is None:
+        return None
+    labels = {}
+    membership = []
+    for name in ig_graph.vs['name']:
+        comm_id = initial_partition.get(name)
+        key = ('community', comm_id) if comm_id is not None else ('node', name)
+        membership.append(labels.setdefault(key, len(labels)))
+    return membership
+
+
+def _detect_communities_igraph(G, method: str, seed=None, weight="weight") -> dict:
+    """
+    Louvain y propagación de etiquetas con las implementaciones nativas de igraph.
+    Devuelve la partición con el mismo formato que detect_communities.
+    """
+    if isinstance(G, PatientGraph):
+        ig_graph, weight = G.to_igraph(), 'weight'
+    else:
+        ig_graph = convert_networkx_to_igraph(G, weight=weight)
+    weights = weight if weight in ig_graph.es.attributes() else None
+
+    with _igraph_seed(seed):
+        if method == 'louvain':
+            clustering = ig_graph.community_multilevel(weights=weights, resolution=1)
+        else:
+            clustering = ig_graph.community_label_propagation(weights=weights)
+
+    membership = clustering.membership
+    node_names = ig_graph.vs['name']
+    return { node_names[i]: membership[i] for i in range(len(node_names)) }
+
+
+@contextmanager
+def _igraph_seed(seed=None):
+    """
+    igraph usa el módulo random de Python como generador; con una semilla se usa un
+    generador propio durante la llamada, sin alterar el estado global de random.
+    """
+    if seed is None:
+        yield
+        return
+    ig.set_random_number_generator(random.Random(seed))
+    try:
+        yield
+    finally:
+        ig.set_random_number_generator(random)
+
+
+def evaluate_modularity(G, partition: dict) -> float:
     """
     Calcula la modularidad de la partición dada en el grafo.
 
-    :param G: Grafo de NetworkX.
+    :param G: PatientGraph (cálculo vectorizado sobre las aristas, ver community_quality) o grafo de NetworkX.
     :param partition: Diccionario { node: community_id }.
     :return: Valor de modularidad (float).
     """
+    if isinstance(G, PatientGraph):
+        return community_quality(G.sources, G.targets, G.weights, G.membership(partition))["modularity"]
+
     community_dict = {}
     for node, comm_id in partition.items():
         community_dict.setdefault(comm_id, set()).add(node)
@@ -71,6 +156,9 @@ def evaluate_modularity(G: nx.Graph, partition: dict) -> float:
     return nx.algorithms.community.modularity(G, communities, weight='weight')
 
 def calculate_community_modularity(partition, G, weight='weight'):
+    # Misma definición que python-louvain, sin recorrer el grafo en Python
+    if isinstance(G, PatientGraph):
+        return evaluate_modularity(G, partition)
 
     modularity_score = community_louvain.modularity(partition, G, weight='weight')
     return modularity_score
\ No newline at end of file
@@ -1,26 +1,77 @@
 # community/visualization.py
+import hashlib
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
 import networkx as nx
+import igraph as ig
 import matplotlib.pyplot as plt
 import matplotlib.cm as cm
+from scipy.spatial import cKDTree
 from datetime import datetime
 
+from feature_builder.patient_graph import PatientGraph
+from feature_builder.cache import load_cached, store_cached
+from clustering.community_detector import _igraph_seed
+
+# Layouts available in visualize_communities ("auto" picks by graph size)
+LAYOUTS = ["auto", "spring", "community"]
+
+# Above this number of nodes "auto" uses the community layout instead of spring_layout
+SPRING_LAYOUT_MAX_NODES = 1000
+
+# Strongest edges per patient kept for the layout inside each community
+LOCAL_LAYOUT_NEIGHBOURS = 15
+
+# Cached positions live next to the feature cache (override with LAYOUT_CACHE_DIR)
+DEFAULT_LAYOUT_CACHE_DIR = os.environ.get("LAYOUT_CACHE_DIR", ".layout_cache")
+
+# Increase when the community layout changes to invalidate cached positions
+LAYOUT_CACHE_VERSION = 2
+
 
-def visualize_communities(G: nx.Graph,
+def visualize_communities(G,
                           partition: dict,
                           output_path: str = None,
                           show_edges: bool = True,
-                          figsize: tuple = (10, 10)):
+                          figsize: tuple = (10, 10),
+                          layout: str = "auto",
+                          seed: int = 42,
+                          n_jobs: int = 1,
+                          max_edges: int = 200_000,
+                          use_cache: bool = True,
+                          cache_dir: str = None):
     """
     Generates a plot of patient communities within the graph.
 
-    :param G: NetworkX graph with patient nodes.
+    :param G: NetworkX graph or PatientGraph with patient nodes.
     :param partition: Dictionary { patient_id: community_id }.
     :param output_path: Path to save the image. If None, it automatically saves as 'communities_<timestamp>.png'.
     :param show_edges: If False, edges are not drawn for clarity.
     :param figsize: Figure size (width, height).
+    :param layout: "spring" (spring_layout on the full graph), "community" (see community_layout)
+                   or "auto" (community above SPRING_LAYOUT_MAX_NODES nodes).
+    :param seed: Seed of the layout.
+    :param n_jobs: Worker processes for the per-community layouts (community layout only).
+    :param max_edges: Maximum number of edges drawn; a random sample is drawn above it (community layout only).
+    :param use_cache: Reuse positions cached for the same graph, partition and seed (community layout only).
+    :param cache_dir: Directory of the layout cache (default DEFAULT_LAYOUT_CACHE_DIR).
     """
+    if layout == "auto":
+        layout = "community" if G.number_of_nodes() > SPRING_LAYOUT_MAX_NODES else "spring"
+    if layout == "community":
+        _draw_community_layout(G, partition, output_path, show_edges, figsize, seed, n_jobs,
+                               max_edges, use_cache, cache_dir)
+        return
+    if layout != "spring":
+        raise ValueError(f"Unknown layout: {layout}. Use one of {LAYOUTS}.")
+
+    if isinstance(G, PatientGraph):
+        G = G.to_networkx()
+
     # Compute node positions
-    pos = nx.spring_layout(G, seed=42)
+    pos = nx.spring_layout(G, seed=seed)
 
     # Node colors by community
     node_colors = [partition.get(node, 0) for node in G.nodes()]
@@ -52,6 +103,230 @@ def visualize_communities(G: nx.Graph,
     plt.title("Patient Communities")
     plt.axis('off')
 
+    _save_figure(output_path)
+
+
+def community_layout(G, partition: dict, seed: int = 42, n_jobs: int = 1,
+                     use_cache: bool = True, cache_dir: str = None) -> np.ndarray:
+    """
+    Two-level layout for large graphs.
+
+    The community quotient graph (one node per community, edges weighted by the total
+    similarity between communities, built only from the community pairs that share edges)
+    is laid out first with igraph's Fruchterman-Reingold. Each community then gets a disc
+    around its position, with a radius that grows with its size and never reaches half the
+    distance to the nearest other community (found with a k-d tree), so discs do not overlap.
+    Patients are placed inside their disc with a Fruchterman-Reingold layout of the
+    community's internal edges only (igraph, grid variant for large communities), one
+    community per task. To keep its cost proportional to the number of patients, the local
+    layout only uses the LOCAL_LAYOUT_NEIGHBOURS strongest edges of every patient.
+    Patients missing from the partition go to community 0.
+
+    Positions are cached on disk keyed by the graph arrays, the partition and the seed.
+
+    :param G: NetworkX graph or PatientGraph.
+    :param partition: Dictionary { patient_id: community_id }.
+    :param seed: Seed of the quotient and local layouts.
+    :param n_jobs: Worker processes for the per-community layouts.
+    :param use_cache: Reuse and store positions in the layout cache.
+    :param cache_dir: Directory of the layout cache (default DEFAULT_LAYOUT_CACHE_DIR).
+    :return: (n_nodes x 2) array of positions, in the order of G's nodes.
+    """
+    if isinstance(G, nx.Graph):
+        G = PatientGraph.from_networkx(G)
+    membership = G.membership(partition)
+    membership[membership < 0] = 0
+
+    cache_dir = cache_dir or DEFAULT_LAYOUT_CACHE_DIR
+    key = _layout_key(G, membership, seed)
+    if use_cache:
+        cached = load_cached(key, cache_dir)
+        if cached is not None:
+            return cached["positions"]
+
+    communities, labels = np.unique(membership, return_inverse=True)
+    k = len(communities)
+    sizes = np.bincount(labels, minlength=k)
+    centers, radii = _community_discs(G, labels, sizes, seed)
+
+    # Local index of every node inside its community and internal edges grouped by community
+    order = np.argsort(labels, kind="stable")
+    starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+    local_index = np.empty(len(labels), dtype=np.int64)
+    local_index[order] = np.arange(len(labels)) - np.repeat(starts, sizes)
+
+    source_labels = labels[G.sources]
+    internal = np.flatnonzero(source_labels == labels[G.targets])
+    internal = internal[np.argsort(source_labels[internal], kind="stable")]
+    edge_bounds = np.searchsorted(source_labels[internal], np.arange(k + 1))
+
+    tasks = []
+    for c in np.argsort(-sizes):
+        edges = internal[edge_bounds[c]:edge_bounds[c + 1]]
+        tasks.append((int(sizes[c]), local_index[G.sources[edges]], local_index[G.targets[edges]],
+                      G.weights[edges], seed + int(c)))
+
+    if n_jobs and n_jobs > 1 and k > 1:
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            local_positions = list(executor.map(_local_layout, tasks))
+    else:
+        local_positions = [_local_layout(task) for task in tasks]
+
+    positions = np.empty((len(labels), 2))
+    for c, local in zip(np.argsort(-sizes), local_positions):
+        nodes = order[starts[c]:starts[c] + sizes[c]]
+        positions[nodes] = centers[c] + radii[c] * local
+
+    if use_cache:
+        store_cached(key, {"positions": positions}, cache_dir)
+    return positions
+
+
+def _layout_key(G: PatientGraph, membership, seed) -> str:
+    """Hash of the graph arrays, the node ids, the partition and the layout settings."""
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(f"{LAYOUT_CACHE_VERSION}:{seed}:{G.number_of_nodes()}".encode("utf-8"))
+    digest.update("\n".join(map(str, G.node_ids)).encode("utf-8"))
+    for array in (G.sources, G.targets, G.weights, np.asarray(membership, dtype=np.int64)):
+        digest.update(np.ascontiguousarray(array).tobytes())
+    return digest.hexdigest()
+
+
+def _community_discs(G: PatientGraph, labels, sizes, seed):
+    """Center and radius of every community disc from a layout of the quotient graph."""
+    k = len(sizes)
+    if k == 1:
+        return np.zeros((1, 2)), np.ones(1)
+
+    # Quotient graph: total weight between each pair of communities that share at least one edge
+    a, b = labels[G.sources], labels[G.targets]
+    between = a != b
+    lo, hi = np.minimum(a[between], b[between]), np.maximum(a[between], b[between])
+    pair_keys, inverse = np.unique(lo.astype(np.int64) * k + hi, return_inverse=True)
+    pair_weights = np.bincount(inverse, weights=G.weights[between], minlength=len(pair_keys))
+
+    quotient = ig.Graph(n=k, edges=np.column_stack([pair_keys // k, pair_keys % k]).tolist())
+    rng = np.random.default_rng(seed)
+    with _igraph_seed(seed):
+        # Communities without edges to others keep a plain (unweighted) layout
+        layout = quotient.layout_fruchterman_reingold(
+            weights=(pair_weights / pair_weights.max()).tolist() if len(pair_keys) else None,
+            seed=rng.uniform(-1, 1, size=(k, 2)).tolist(),
+            grid="auto")
+    centers = np.asarray(layout.coords, dtype=float)
+
+    # Half the distance to the nearest other center (spatial index, no k x k matrix),
+    # scaled down for small communities, so discs never overlap
+    nearest = cKDTree(centers).query(centers, k=2)[0][:, 1]
+    positive = nearest[nearest > 0]
+    nearest[nearest == 0] = positive.min() if len(positive) else 1.0
+    radii = 0.45 * nearest * np.sqrt(sizes / sizes.max())
+    return centers, radii
+
+
+def _local_layout(task):
+    """Layout of one community, scaled to the unit disc."""
+    n, sources, targets, weights, seed = task
+    if n == 1:
+        return np.zeros((1, 2))
+
+    keep = _strongest_edges(sources, targets, weights, LOCAL_LAYOUT_NEIGHBOURS)
+    sources, targets, weights = sources[keep], targets[keep], weights[keep]
+
+    rng = np.random.default_rng(seed)
+    graph = ig.Graph(n=n, edges=np.column_stack([sources, targets]).tolist())
+    with _igraph_seed(seed):
+        layout = graph.layout_fruchterman_reingold(weights=weights.astype(float).tolist() if len(weights) else None,
+                                                   seed=rng.uniform(-1, 1, size=(n, 2)).tolist(),
+                                                   grid="auto")
+    coords = np.asarray(layout.coords, dtype=float)
+    coords -= coords.mean(axis=0)
+    extent = np.linalg.norm(coords, axis=1).max()
+    return coords / extent if extent > 0 else coords
+
+
+def _strongest_edges(sources, targets, weights, k):
+    """Indices of the edges that are among the k heaviest of at least one of their endpoints."""
+    m = len(sources)
+    nodes = np.concatenate([sources, targets])
+    order = np.lexsort((-np.concatenate([weights, weights]), nodes))
+    sorted_nodes = nodes[order]
+    group_start = np.searchsorted(sorted_nodes, sorted_nodes)
+    ranked = order[np.arange(2 * m) - group_start < k]
+    return np.unique(ranked % m)
+
+
+def _draw_community_layout(G, partition, output_path, show_edges, figsize, seed, n_jobs,
+                           max_edges, use_cache, cache_dir):
+    """Draws the community layout with one scatter for the nodes and one density image for the edges."""
+    if isinstance(G, nx.Graph):
+        G = PatientGraph.from_networkx(G)
+    positions = community_layout(G, partition, seed=seed, n_jobs=n_jobs,
+                                 use_cache=use_cache, cache_dir=cache_dir)
+    membership = G.membership(partition)
+    membership[membership < 0] = 0
+    unique_communities = np.unique(membership)
+    color_map = cm.get_cmap('viridis', int(unique_communities.max()) + 1)
+
+    fig, ax = plt.subplots(figsize=figsize)
+
+    if show_edges and G.number_of_edges():
+        edges = np.arange(G.number_of_edges())
+        if len(edges) > max_edges:
+            edges = np.sort(np.random.default_rng(seed).choice(edges, size=max_edges, replace=False))
+        resolution = int(max(figsize) * fig.dpi)
+        density, extent = _edge_density(positions, G.sources[edges], G.targets[edges], resolution)
+        ax.imshow(np.log1p(density), extent=extent, origin='lower', cmap='Greys',
+                  vmin=0, vmax=2 * np.log1p(density.max()), interpolation='nearest', aspect='auto')
+
+    node_size = float(np.clip(20000 / max(G.number_of_nodes(), 1), 1, 50))
+    ax.scatter(positions[:, 0], positions[:, 1], c=membership, cmap=color_map,
+               vmin=0, vmax=int(unique_communities.max()), s=node_size,
+               alpha=0.9, linewidths=0, rasterized=True)
+
+    # The legend is only readable with a few communities
+    if len(unique_communities) <= 20:
+        for community in unique_communities:
+            ax.scatter([], [], c=[color_map(community)], label=f'Community {community}', s=50)
+        ax.legend(scatterpoints=1, frameon=False, labelspacing=0.5, title="Communities")
+
+    ax.set_title("Patient Communities")
+    ax.autoscale()
+    ax.set_aspect('equal')
+    ax.axis('off')
+
+    _save_figure(output_path)
+
+
+def _edge_density(positions, sources, targets, resolution, chunk_size=50_000):
+    """
+    Rasterizes all edges at once into a (resolution x resolution) count image: every edge is
+    sampled at about one point per pixel of its length and the points are accumulated with
+    a bincount, in chunks of edges to bound memory.
+
+    :return: (density image, extent (xmin, xmax, ymin, ymax) for imshow)
+    """
+    lower, upper = positions.min(axis=0), positions.max(axis=0)
+    span = np.maximum(upper - lower, np.finfo(float).eps)
+    density = np.zeros(resolution * resolution)
+
+    for start in range(0, len(sources), chunk_size):
+        a = ((positions[sources[start:start + chunk_size]] - lower) / span * (resolution - 1)).astype(np.float32)
+        b = ((positions[targets[start:start + chunk_size]] - lower) / span * (resolution - 1)).astype(np.float32)
+        samples = np.clip(np.ceil(np.abs(b - a).max(axis=1)), 1, resolution).astype(np.int64) + 1
+        # Position t in [0, 1] of every sample along its edge
+        first = np.repeat(np.cumsum(samples) - samples, samples)
+        t = (np.arange(first.size) - first).astype(np.float32) / np.repeat(samples - 1, samples).astype(np.float32)
+        x = np.repeat(a[:, 0], samples) + t * np.repeat(b[:, 0] - a[:, 0], samples)
+        y = np.repeat(a[:, 1], samples) + t * np.repeat(b[:, 1] - a[:, 1], samples)
+        cells = np.rint(y).astype(np.int32) * resolution + np.rint(x).astype(np.int32)
+        density += np.bincount(cells, minlength=resolution * resolution)
+
+    extent = (lower[0], upper[0], lower[1], upper[1])
+    return density.reshape(resolution, resolution), extent
+
+
+def _save_figure(output_path):
     # Automatic name if no output_path
     if not output_path:
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
@@ -60,4 +335,4 @@ def visualize_communities(G: nx.Graph,
     # Save figure
     plt.savefig(output_path, bbox_inches='tight')
     plt.close()
-    print(f"Graph saved at: {output_path}")
\ No newline at end of file
+    print(f"Graph saved at: {output_path}")
@@ -0,0 +1,190 @@
+# clustering/ensemble.py
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import numpy as np
+
+from feature_builder.patient_graph import PatientGraph
+from clustering.community_detector import detect_communities, evaluate_modularity
+from clustering.results import save_results, load_results
+
+
+# Grafo de solo lectura de cada proceso trabajador y rutas de las que se abrió (ver _load_worker_graph)
+_worker_graph = None
+_worker_paths = None
+
+
+class EnsemblePool:
+    """
+    Pool de procesos y directorio temporal reutilizables entre varias llamadas a run_ensemble
+    (p.ej. las rondas de fast_consensus_clustering, cada una sobre un grafo distinto).
+
+    Cada llamada vuelca su grafo con nombres de fichero propios en el mismo directorio; los
+    trabajadores reabren los arrays solo cuando cambian las rutas. Usar como gestor de contexto.
+
+    :param n_jobs: Número de procesos (None = número de CPUs; 1 = sin pool, en el proceso actual)
+    """
+
+    def __init__(self, n_jobs: int = None):
+        self.n_jobs = n_jobs or os.cpu_count() or 1
+        self._executor = None
+        self._tmp_dir = None
+        self._paths = None
+        self._calls = 0
+
+    def __enter__(self):
+        if self.n_jobs > 1:
+            self._tmp_dir = tempfile.TemporaryDirectory(prefix="ensemble_")
+            self._executor = ProcessPoolExecutor(max_workers=self.n_jobs)
+        return self
+
+    def __exit__(self, *exc_info):
+        # Cerrar los trabajadores (y sus mmap) antes de borrar el directorio
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._tmp_dir.cleanup()
+        self._executor = self._tmp_dir = None
+
+    def map(self, tasks, G: PatientGraph) -> list:
+        """Ejecuta _run_task para cada tarea sobre G; devuelve las salidas en el orden de tasks."""
+        if self._executor is None or len(tasks) <= 1:
+            return [_run_task(task, G) for task in tasks]
+
+        previous = self._paths
+        self._paths = _dump_graph_arrays(G, self._tmp_dir.name, prefix=f"{self._calls}_")
+        self._calls += 1
+        if previous is not None:
+            # Los arrays de la llamada anterior ya no se usan; si algún trabajador aún los tiene
+            # abiertos y el sistema no permite borrarlos, se eliminan al cerrar el pool
+            for path in previous.values():
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+        return list(self._executor.map(partial(_run_task, paths=self._paths), tasks))
+
+
+def run_ensemble(G: PatientGraph,
+                 seeds,
+                 methods=('louvain',),
+                 backend: str = 'networkx',
+                 n_jobs: int = None,
+                 pool: EnsemblePool = None) -> list:
+    """
+    Ejecuta detect_communities para cada combinación de método y semilla en un pool de procesos.
+
+    El grafo se comparte entre los procesos como arrays .npy mapeados en memoria
+    (identificadores de nodo, extremos y pesos de las aristas): cada trabajador los abre
+    una sola vez en modo lectura, sin que el grafo se serialice en cada tarea. Los trabajadores
+    devuelven la partición como array de comunidades por índice de nodo.
+
+    :param G: PatientGraph sobre el que se ejecutan todas las detecciones
+    :param seeds: Semillas a evaluar
+    :param methods: Métodos de detección (ver detect_communities)
+    :param backend: Implementación de louvain / label_propagation (ver detect_communities)
+    :param n_jobs: Número de procesos (None = número de CPUs; 1 = sin pool, en el proceso actual)
+    :param pool: EnsemblePool ya abierto a reutilizar en lugar de crear uno (se ignora n_jobs)
+    :return: Lista de dicts { method, seed, partition, communities, modularity, seconds },
+             en el orden de methods × seeds
+    """
+    tasks = [(method, seed, backend) for method in methods for seed in seeds]
+
+    if pool is not None:
+        outputs = pool.map(tasks, G)
+    else:
+        n_jobs = min(n_jobs or os.cpu_count() or 1, max(1, len(tasks)))
+        with EnsemblePool(n_jobs) as pool:
+            outputs = pool.map(tasks, G)
+
+    results = []
+    for (method, seed, _), (membership, modularity, seconds) in zip(tasks, outputs):
+        partition = {G.node_ids[i]: int(comm_id) for i, comm_id in enumerate(membership) if comm_id >= 0}
+        results.append({
+            "method": method,
+            "seed": seed,
+            "partition": partition,
+            "communities": len(set(partition.values())),
+            "modularity": modularity,
+            "seconds": seconds,
+        })
+    return results
+
+
+def save_ensemble(results: list, path, metadata: dict = None) -> str:
+    """
+    Guarda las particiones de run_ensemble en un único directorio de resultados (ver save_results).
+
+    :param results: Lista devuelta por run_ensemble
+    :param path: Directorio de salida
+    :param metadata: Metadatos comunes de la ejecución (umbral, ficheros de entrada...)
+    :return: Ruta del directorio escrito
+    """
+    return save_results(path,
+                        [row["partition"] for row in results],
+                        modularity=[row["modularity"] for row in results],
+                        metadata=[{**(metadata or {}), "method": row["method"], "seed": row["seed"],
+                                   "seconds": row["seconds"]} for row in results])
+
+
+def load_ensemble(path) -> list:
+    """Carga un directorio escrito con save_ensemble con la misma forma que devuelve run_ensemble."""
+    stored = load_results(path)
+    results = []
+    for i, info in enumerate(stored.metadata):
+        partition = stored.partition(i)
+        modularity = float(stored.modularity[i])
+        results.append({
+            "method": info.get("method"),
+            "seed": info.get("seed"),
+            "partition": partition,
+            "communities": len(set(partition.values())),
+            "modularity": None if np.isnan(modularity) else modularity,
+            "seconds": info.get("seconds"),
+        })
+    return results
+
+
+def _dump_graph_arrays(G: PatientGraph, directory: str, prefix: str = "") -> dict:
+    """Guarda los arrays del grafo como ficheros .npy para abrirlos con mmap_mode='r'."""
+    arrays = {
+        "node_ids": np.asarray(G.node_ids, dtype=str),
+        "sources": G.sources,
+        "targets": G.targets,
+        "weights": G.weights,
+    }
+    paths = {}
+    for name, array in arrays.items():
+        paths[name] = os.path.join(directory, f"{prefix}{name}.npy")
+        np.save(paths[name], array)
+    return paths
+
+
+def _load_worker_graph(paths: dict) -> PatientGraph:
+    """Abre los arrays del grafo mapeados en memoria, una vez por proceso trabajador y grafo."""
+    global _worker_graph, _worker_paths
+    if paths != _worker_paths:
+        arrays = {name: np.load(path, mmap_mode='r') for name, path in paths.items()}
+        _worker_graph = PatientGraph(arrays["node_ids"].tolist(), arrays["sources"],
+                                     arrays["targets"], arrays["weights"])
+        _worker_paths = paths
+    return _worker_graph
+
+
+def _run_task(task, G: PatientGraph = None, paths: dict = None):
+    """
+    Ejecuta una detección sobre G (o el grafo del proceso, abierto desde paths):
+    devuelve (membership, modularidad, segundos).
+    """
+    method, seed, backend = task
+    if G is None:
+        G = _load_worker_graph(paths)
+
+    start = time.perf_counter()
+    partition = detect_communities(G, method=method, seed=seed, backend=backend)
+    seconds = time.perf_counter() - start
+
+    modularity = evaluate_modularity(G, partition) if G.number_of_edges() else None
+    return G.membership(partition).astype(np.int32), modularity, seconds
@@ -0,0 +1,70 @@
+# clustering/incremental.py
+import numpy as np
+
+from feature_builder.graph_analyzer import extract_features_from_files, resolve_input_paths
+from feature_builder.graph_builder import update_similarity_graph, DEFAULT_MEMORY_BUDGET_MB
+from feature_builder.patient_graph import PatientGraph
+from clustering.assignment import CommunityAssigner
+from clustering.community_detector import detect_communities
+
+
+def load_run(path):
+    """
+    Carga una ejecución guardada con community_detection_main.py --save-model.
+    :return: (CommunityAssigner, PatientGraph)
+    """
+    assigner = CommunityAssigner.load(path)
+    with np.load(path, allow_pickle=False) as data:
+        if "graph_node_ids" not in data.files:
+            raise ValueError(f"{path} no contiene el grafo; vuelva a generarlo con --save-model.")
+        G = PatientGraph.from_state_arrays(data, prefix="graph_")
+    return assigner, G
+
+
+def incremental_update(assigner: CommunityAssigner,
+                       G: PatientGraph,
+                       ttl_path,
+                       streaming: bool = True,
+                       seed=None,
+                       memory_budget_mb: float = DEFAULT_MEMORY_BUDGET_MB,
+                       n_jobs: int = 1):
+    """
+    Actualiza una ejecución guardada con la cohorte actual del TTL.
+
+    Compara los pacientes del TTL con los de la ejecución guardada: solo los pacientes nuevos
+    se vectorizan (con el esquema guardado) y se comparan con el resto, los que ya no están
+    se eliminan del grafo, y Leiden se ejecuta partiendo de la partición anterior (los
+    pacientes nuevos empiezan en su propia comunidad). Coste O(Δn·n) en lugar de O(n²).
+
+    Los pacientes existentes conservan sus vectores guardados: si cambian sus datos o el
+    esquema, debe recalcularse la ejecución completa. Solo para grafos por umbral (no kNN).
+
+    :param assigner: Ejecución guardada (ver load_run)
+    :param G: Grafo de la ejecución guardada
+    :param ttl_path: Ruta, patrón glob o lista de rutas con la cohorte actual
+    :param streaming: Si True, extrae las características en streaming
+    :param seed: Semilla de Leiden
+    :param memory_budget_mb: Memoria máxima para los bloques de similitud
+    :param n_jobs: Número de hilos para las similitudes
+    :return: (CommunityAssigner actualizado, PatientGraph actualizado, added_ids, removed_ids)
+    """
+    if assigner.knn is not None:
+        raise ValueError("La actualización incremental solo admite grafos por umbral (sin knn).")
+
+    patient_features = extract_features_from_files(resolve_input_paths(ttl_path), streaming=streaming)
+    current = set(patient_features)
+    stored = set(G.node_ids)
+    added_ids = [pid for pid in patient_features if pid not in stored]
+    removed_ids = [pid for pid in G.node_ids if pid not in current]
+
+    added_vectors, added_ids = assigner.vectorizer.transform({pid: patient_features[pid] for pid in added_ids})
+    G, feature_vectors = update_similarity_graph(G, assigner.feature_vectors, added_vectors, added_ids,
+                                                 removed_ids, threshold=assigner.threshold,
+                                                 memory_budget_mb=memory_budget_mb, n_jobs=n_jobs)
+
+    previous = {pid: int(c) for pid, c in zip(assigner.patient_ids, assigner.membership) if c >= 0}
+    partition = detect_communities(G, method='leiden', seed=seed, initial_partition=previous)
+
+    updated = CommunityAssigner(feature_vectors, G.node_ids, partition, assigner.vectorizer,
+                                threshold=assigner.threshold)
+    return updated, G, added_ids, removed_ids
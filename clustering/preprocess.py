@@ -1,40 +1,36 @@
 # clustering/preprocess.py
 import pandas as pd
-from sklearn.preprocessing import StandardScaler
 from typing import List, Tuple, Optional
 
-
-def preprocess_data_clustering(features_by_patient):
-
-    features_by_patient = pd.DataFrame.from_dict(features_by_patient, orient='index')
-
-    features_by_patient = features_by_patient.apply(pd.to_numeric, errors='ignore')
-
-    one_hot_features = _apply_onehot(features_by_patient)
-    normalized_features,_ = _apply_normalization(one_hot_features)
-
-    normalized_features = normalized_features.rename(str,axis="columns") 
-
-    return normalized_features
-
-def _apply_onehot(features_by_patient):
-    non_numeric_cols = features_by_patient.select_dtypes(exclude=['number']).columns
-    return pd.get_dummies(features_by_patient, columns=non_numeric_cols)
-
-
-def _apply_normalization(df: pd.DataFrame):
-    numeric_cols, _ = get_numeric_and_non_numeric_cols(df)
-    out = df.copy()
-
-    if not numeric_cols:
-        # Nothing to do
-        return out, numeric_cols
-
-    scaler = StandardScaler() # z-score normalization
-    out[numeric_cols] = scaler.fit_transform(out[numeric_cols])
-
-    return out, numeric_cols
-
+from feature_builder.vectorizer import FeatureVectorizer
+
+
+def preprocess_data_clustering(features_by_patient, vectorizer=None):
+    """
+    One-hot de las columnas no numéricas y normalización z-score de las numéricas.
+
+    :param features_by_patient: dict { patient: [valor, ...] } (salida de filter_features)
+    :param vectorizer: FeatureVectorizer opcional. Si ya está ajustado solo se aplica transform()
+                       (p.ej. para nuevos pacientes); si no, se ajusta sobre estos datos.
+    :return: DataFrame preprocesado (una fila por paciente) o, si el vectorizador es disperso,
+             la matriz scipy.sparse CSR tal cual (filas en el orden de features_by_patient)
+    """
+    if vectorizer is None:
+        vectorizer = FeatureVectorizer(prefix_sep='_', fill_categorical=False)
+
+    # Cada posición de la lista es una columna ("0", "1", ...), como en DataFrame.from_dict
+    positional_features = {
+        patient: [(str(position), value) for position, value in enumerate(values)]
+        for patient, values in features_by_patient.items()
+    }
+    if vectorizer.is_fitted:
+        normalized_features, patient_ids = vectorizer.transform(positional_features)
+    else:
+        normalized_features, patient_ids = vectorizer.fit_transform(positional_features)
+
+    if vectorizer.sparse:
+        return normalized_features
+    return pd.DataFrame(normalized_features, index=patient_ids, columns=vectorizer.columns)
 
 
 def get_numeric_and_non_numeric_cols(df: pd.DataFrame) -> Tuple[List[str], List[str]]:
@@ -0,0 +1,83 @@
+# clustering/resolution_sweep.py
+import time
+
+try:
+    import leidenalg
+except ImportError:
+    leidenalg = None
+
+from igraph_converter import convert_networkx_to_igraph
+from feature_builder.patient_graph import PatientGraph
+from clustering.community_detector import evaluate_modularity
+
+
+def resolution_sweep(G,
+                     resolutions,
+                     seed=None,
+                     warm_start: bool = True,
+                     weight: str = "weight") -> list:
+    """
+    Ejecuta Leiden para varios valores de resolución sobre el mismo grafo.
+
+    Se usa RBConfigurationVertexPartition (modularidad con parámetro de resolución).
+    Las resoluciones se recorren de mayor a menor y, con warm_start, cada paso parte
+    de la partición del paso anterior (initial_membership), de modo que el optimizador
+    solo tiene que fusionar o ajustar comunidades y converge en pocas iteraciones.
+    El orden descendente es intencionado: partiendo de una partición gruesa, los
+    movimientos de nodos individuales rara vez dividen una comunidad grande y el
+    resultado queda atrapado en la partición anterior. El grafo de igraph se construye
+    una sola vez para todo el barrido.
+
+    :param G: PatientGraph o grafo de NetworkX con aristas ponderadas por similitud
+    :param resolutions: Valores de resolución a evaluar (1 = modularidad estándar)
+    :param seed: Semilla del optimizador de Leiden
+    :param warm_start: Si True, inicializa cada paso con la partición del anterior
+    :param weight: Atributo de peso de las aristas (grafos de NetworkX)
+    :return: Lista de dicts { resolution, communities, modularity, quality, seconds, partition },
+             ordenada por resolución creciente. modularity es la modularidad estándar
+             (resolución 1) y quality el valor de la función objetivo con esa resolución.
+    """
+    if leidenalg is None:
+        raise ImportError("El paquete 'leidenalg' no está instalado.")
+
+    resolutions = sorted(set(resolutions), reverse=True)
+    if isinstance(G, PatientGraph):
+        ig_graph, weight = G.to_igraph(), "weight"
+    else:
+        ig_graph = convert_networkx_to_igraph(G, weight=weight)
+    weights = weight if weight in ig_graph.es.attributes() else None
+    node_names = ig_graph.vs["name"]
+
+    optimiser = leidenalg.Optimiser()
+    if seed is not None:
+        optimiser.set_rng_seed(seed)
+
+    results = []
+    membership = None
+    for resolution in resolutions:
+        start = time.perf_counter()
+
+        partition_obj = leidenalg.RBConfigurationVertexPartition(
+            ig_graph,
+            initial_membership=membership if warm_start else None,
+            weights=weights,
+            resolution_parameter=resolution,
+        )
+        # Iterar hasta que no haya mejora: con warm start basta con pocas pasadas
+        optimiser.optimise_partition(partition_obj, n_iterations=-1)
+        membership = partition_obj.membership
+
+        seconds = time.perf_counter() - start
+        partition = { node_names[i]: membership[i] for i in range(len(node_names)) }
+        modularity = evaluate_modularity(G, partition) if ig_graph.ecount() else None
+
+        results.append({
+            "resolution": resolution,
+            "communities": len(set(membership)),
+            "modularity": modularity,
+            "quality": partition_obj.quality(),
+            "seconds": seconds,
+            "partition": partition,
+        })
+
+    return results[::-1]
@@ -0,0 +1,241 @@
+# clustering/results.py
+import csv
+import json
+import os
+from itertools import chain
+
+import numpy as np
+
+from utils import group_partition_into_communities
+
+
+# Extensión de los directorios de resultados
+RESULTS_SUFFIX = ".partitions"
+
+# Incrementar al cambiar la disposición de los ficheros
+RESULTS_FORMAT_VERSION = 1
+
+# Nombres de columna reconocidos al leer particiones en CSV
+_CSV_ID_COLUMNS = ("PatientID", "patient_id")
+_CSV_LABEL_COLUMNS = ("Cluster", "community_id")
+
+
+class PartitionResults:
+    """
+    Conjunto de particiones sobre una misma tabla de pacientes, tal como lo devuelve load_results.
+
+    :param node_ids: Tabla índice → patient_id (array de cadenas)
+    :param membership: Matriz (n_particiones, n_pacientes) de comunidades; -1 = paciente fuera de la partición
+    :param modularity: Modularidad de cada partición (NaN si no se calculó)
+    :param metadata: Lista con un dict de metadatos de la ejecución por partición
+    """
+
+    def __init__(self, node_ids, membership, modularity, metadata):
+        self.node_ids = node_ids
+        self.membership = membership
+        self.modularity = modularity
+        self.metadata = metadata
+
+    def __len__(self) -> int:
+        return self.membership.shape[0]
+
+    def partition(self, index: int = 0) -> dict:
+        """Partición { patient_id: community_id } número index."""
+        row = np.asarray(self.membership[index])
+        present = np.flatnonzero(row >= 0)
+        return dict(zip(self.node_ids[present].tolist(), row[present].tolist()))
+
+    def partitions(self) -> list:
+        return [self.partition(i) for i in range(len(self))]
+
+    def community_sizes(self, index: int = 0) -> dict:
+        """Diccionario { community_id: número de pacientes } de la partición index."""
+        row = np.asarray(self.membership[index])
+        communities, counts = np.unique(row[row >= 0], return_counts=True)
+        return dict(zip(communities.tolist(), counts.tolist()))
+
+    def label_matrix(self) -> np.ndarray:
+        """
+        Etiquetas 0..c-1 de cada partición, como encode_partitions (los pacientes fuera de una
+        partición comparten etiqueta). Se puede pasar directamente a pairwise_partition_scores.
+        """
+        labels = np.empty(self.membership.shape, dtype=np.int64)
+        for row in range(len(self)):
+            _, labels[row] = np.unique(self.membership[row], return_inverse=True)
+        return labels
+
+
+def save_results(path, partitions, modularity=None, metadata=None) -> str:
+    """
+    Guarda una o varias particiones en un directorio de resultados.
+
+    Los identificadores de paciente se guardan una sola vez (node_ids.npy) y cada partición
+    como una fila de enteros sobre esa tabla (membership.npy, int32), de modo que cada
+    array se escribe con una única llamada y se puede mapear en memoria al leerlo.
+    La modularidad va en modularity.npy y los metadatos de la ejecución en metadata.json.
+
+    :param path: Directorio de salida (se añade RESULTS_SUFFIX si no lo tiene)
+    :param partitions: Partición { patient_id: community_id } (comunidades enteras) o lista de particiones
+    :param modularity: Modularidad de la partición o lista con la de cada una (None = sin calcular)
+    :param metadata: dict de metadatos común a todas las particiones o lista con uno por partición
+                     (método, semilla, umbral, ficheros de entrada...; serializable a JSON)
+    :return: Ruta del directorio escrito
+    """
+    if isinstance(partitions, dict):
+        partitions = [partitions]
+    if not partitions:
+        raise ValueError("No hay particiones que guardar.")
+    if not str(path).endswith(RESULTS_SUFFIX):
+        path = f"{path}{RESULTS_SUFFIX}"
+
+    # Tabla de identificadores: unión de los pacientes en orden de aparición
+    node_ids = list(dict.fromkeys(chain.from_iterable(partitions)))
+    node_index = None
+
+    membership = np.full((len(partitions), len(node_ids)), -1, dtype=np.int32)
+    for row, partition in enumerate(partitions):
+        values = np.fromiter(map(int, partition.values()), dtype=np.int64, count=len(partition))
+        # Caso habitual: los mismos pacientes en el mismo orden, sin buscar cada identificador
+        if len(partition) == len(node_ids) and list(partition) == node_ids:
+            membership[row] = values
+            continue
+        if node_index is None:
+            node_index = {node: i for i, node in enumerate(node_ids)}
+        columns = np.fromiter(map(node_index.__getitem__, partition), dtype=np.int64, count=len(partition))
+        membership[row, columns] = values
+
+    if modularity is None or np.isscalar(modularity):
+        modularity = [modularity] * len(partitions)
+    modularity = np.array([np.nan if m is None else m for m in modularity], dtype=float)
+
+    if metadata is None or isinstance(metadata, dict):
+        metadata = [dict(metadata or {}) for _ in partitions]
+    if len(metadata) != len(partitions) or len(modularity) != len(partitions):
+        raise ValueError("modularity y metadata deben tener un valor por partición.")
+
+    os.makedirs(path, exist_ok=True)
+    np.save(os.path.join(path, "node_ids.npy"), np.array(node_ids, dtype=str))
+    np.save(os.path.join(path, "membership.npy"), membership)
+    np.save(os.path.join(path, "modularity.npy"), modularity)
+    with open(os.path.join(path, "metadata.json"), "w", encoding="utf-8") as f:
+        json.dump({"version": RESULTS_FORMAT_VERSION, "partitions": metadata}, f, indent=1, default=str)
+    return path
+
+
+def load_results(path, mmap: bool = True) -> PartitionResults:
+    """
+    Carga un directorio escrito con save_results.
+
+    :param path: Directorio de resultados
+    :param mmap: Si True, los arrays se abren mapeados en memoria (solo lectura)
+    """
+    mmap_mode = "r" if mmap else None
+    with open(os.path.join(path, "metadata.json"), encoding="utf-8") as f:
+        info = json.load(f)
+    if info.get("version") != RESULTS_FORMAT_VERSION:
+        raise ValueError(f"Versión de resultados no soportada en {path}: {info.get('version')}")
+
+    return PartitionResults(
+        node_ids=np.load(os.path.join(path, "node_ids.npy"), mmap_mode=mmap_mode),
+        membership=np.load(os.path.join(path, "membership.npy"), mmap_mode=mmap_mode),
+        modularity=np.load(os.path.join(path, "modularity.npy")),
+        metadata=info["partitions"],
+    )
+
+
+def read_partition(path, index: int = 0, id_column: str = None, label_column: str = None) -> dict:
+    """
+    Lee una partición de un directorio de resultados o de sus vistas exportadas (CSV o TXT).
+
+    :param path: Directorio de resultados, CSV (columnas Cluster/PatientID o community_id/patient_id)
+                 o TXT con cabeceras "Community <id>" o "Comunidad <id>"
+    :param index: Partición a leer de un directorio de resultados
+    :param id_column: Columna de identificadores en un CSV (por defecto, detectada)
+    :param label_column: Columna de comunidades en un CSV (por defecto, detectada)
+    :return: Diccionario { patient_id: community_id }
+    """
+    if os.path.isdir(path):
+        return load_results(path).partition(index)
+    if str(path).lower().endswith(".csv"):
+        return _read_csv_partition(path, id_column, label_column)
+    return _read_txt_partition(path)
+
+
+def write_csv(partition: dict, path):
+    """Vista CSV de una partición (columnas Cluster, PatientID), agrupada por comunidad."""
+    with open(path, mode="w", newline="", encoding="utf-8") as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(["Cluster", "PatientID"])
+        for comm_id, members in group_partition_into_communities(partition).items():
+            for pid in members:
+                writer.writerow([comm_id, pid])
+
+
+def write_txt(partition: dict, path):
+    """Vista TXT de una partición: bloques "Community <id> (<n> patients):" con un paciente por línea."""
+    communities = group_partition_into_communities(partition)
+    with open(path, "w", encoding="utf-8") as f:
+        for comm_id in sorted(communities):
+            members = communities[comm_id]
+            f.write(f"Community {comm_id} ({len(members)} patients):\n")
+            for pid in members:
+                f.write(f"  {pid}\n")
+            f.write("\n")
+
+
+def _community_label(value):
+    try:
+        return int(value)
+    except ValueError:
+        return value
+
+
+def _read_csv_partition(path, id_column=None, label_column=None) -> dict:
+    with open(path, newline="", encoding="utf-8") as csvfile:
+        reader = csv.DictReader(csvfile)
+        fields = reader.fieldnames or []
+        id_column = id_column or next((c for c in _CSV_ID_COLUMNS if c in fields), None)
+        label_column = label_column or next((c for c in _CSV_LABEL_COLUMNS if c in fields), None)
+        if id_column is None or label_column is None:
+            raise ValueError(f"No se encuentran las columnas de paciente y comunidad en {path}: {fields}")
+        return {row[id_column]: _community_label(row[label_column]) for row in reader}
+
+
+def _read_txt_partition(path) -> dict:
+    partition = {}
+    current = None
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            stripped = line.strip()
+            if stripped.startswith(("Community", "Comunidad")):
+                parts = stripped.split()
+                current = _community_label(parts[1].strip(":")) if len(parts) >= 2 else None
+            elif stripped and current is not None:
+                partition[stripped] = current
+            elif not stripped:
+                current = None
+    return partition
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Exporta una partición de un directorio de resultados a TXT o CSV.')
+    parser.add_argument('results', help='Directorio de resultados (.partitions)')
+    parser.add_argument('--index', type=int, default=0, help='Partición a exportar')
+    parser.add_argument('--txt', default=None, help='Ruta del TXT de salida')
+    parser.add_argument('--csv', default=None, help='Ruta del CSV de salida')
+    args = parser.parse_args()
+
+    results = load_results(args.results)
+    print(f"{len(results)} particiones, {len(results.node_ids)} pacientes")
+    for i, (info, modularity) in enumerate(zip(results.metadata, results.modularity)):
+        print(f"  [{i}] modularidad={modularity:.4f} {info}")
+
+    partition = results.partition(args.index)
+    if args.txt:
+        write_txt(partition, args.txt)
+        print(f"TXT file saved to {args.txt}")
+    if args.csv:
+        write_csv(partition, args.csv)
+        print(f"CSV file saved to {args.csv}")
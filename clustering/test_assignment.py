@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+import clustering.assignment as assignment
+from clustering.assignment import CommunityAssigner
+from feature_builder.graph_builder import knn_edges
+from feature_builder.vectorizer import FeatureVectorizer
+
+
+def _patient_features(n, seed=0):
+    rng = np.random.default_rng(seed)
+    values = rng.random((n, 6))
+    values[values < 0.5] = 0
+    return {f"p{i}": [(f"f{c}", float(values[i, c])) for c in range(6)] for i in range(n)}
+
+
+@pytest.mark.parametrize("sparse", [False, True])
+@pytest.mark.parametrize("mutual, seed", [(True, 9), (False, 8)])
+def test_knn_assignment_matches_knn_graph(sparse, mutual, seed, tmp_path, monkeypatch):
+    # Con estas semillas, la lista de k vecinos de la cohorte cambia la comunidad asignada
+    # (vecinos mutuos: la descarta; unión: añade aristas que el paciente nuevo no tiene entre sus k)
+    features = _patient_features(200, seed=seed)
+    vectorizer = FeatureVectorizer(sparse=sparse)
+    matrix, patient_ids = vectorizer.fit_transform(features)
+    cohort_ids, new_id = patient_ids[:-1], patient_ids[-1]
+    partition = {pid: i % 4 for i, pid in enumerate(cohort_ids)}
+    assigner = CommunityAssigner(matrix[:-1], cohort_ids, partition, vectorizer, knn=5, mutual=mutual)
+
+    # Aristas del paciente nuevo en el grafo de k vecinos de la cohorte completa
+    sources, targets, weights = knn_edges(matrix, 5, mutual=mutual)
+    last = len(patient_ids) - 1
+    neighbors = np.concatenate([targets[sources == last], sources[targets == last]])
+    neighbor_weights = np.concatenate([weights[sources == last], weights[targets == last]])
+    scores = np.bincount(neighbors % 4, weights=neighbor_weights, minlength=4)
+    expected = int(scores.argmax()) if scores.max() > 0 else None
+
+    assert assigner.assign(matrix[-1:], [new_id]) == {new_id: expected}
+
+    path = tmp_path / "model.npz"
+    assigner.save(path)
+    # La similitud del k-ésimo vecino se guarda en el modelo: cargar no vuelve a buscar vecinos
+    monkeypatch.setattr(assignment, "NearestNeighbors", None)
+    loaded = CommunityAssigner.load(path)
+    assert loaded.mutual == mutual and loaded.knn == 5
+    assert loaded.assign(matrix[-1:], [new_id]) == {new_id: expected}
@@ -0,0 +1,192 @@
+import csv
+import sys
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+import scipy.sparse as sp
+from sklearn.metrics import calinski_harabasz_score, davies_bouldin_score, silhouette_samples, silhouette_score
+from sklearn.preprocessing import StandardScaler
+
+import other_clusterings
+from clustering.clustering import (
+    _clustering_apply_preprocess,
+    clustering_apply,
+    clustering_sweep,
+    graph_clustering_apply,
+    kmeans_apply,
+    kmeans_quick_report,
+    GRAPH_METHODS,
+)
+from clustering.preprocess import preprocess_data_clustering
+from feature_builder import cache
+from feature_builder.graph_analyzer import filter_features
+from feature_builder.vectorizer import FeatureVectorizer
+
+
+def _pandas_clustering_encoding(features_by_patient):
+    """Codificación original del clustering con pandas (sin fillna: categóricas ausentes a cero)."""
+    df = pd.DataFrame.from_dict(features_by_patient, orient='index').apply(pd.to_numeric, errors='ignore')
+    df = pd.get_dummies(df, columns=df.select_dtypes(exclude=['number']).columns)
+    numeric_cols = df.select_dtypes(include='number').columns
+    df[numeric_cols] = StandardScaler().fit_transform(df[numeric_cols])
+    return df.rename(str, axis="columns").astype(float)
+
+
+def test_dense_preprocessing_matches_pandas_encoding(patient_features):
+    features_by_patient = filter_features(patient_features)
+    expected = _pandas_clustering_encoding(features_by_patient)
+    preprocessed = preprocess_data_clustering(features_by_patient)
+
+    # Sin nivel '<columna>_0' para las categóricas ausentes
+    assert preprocessed.columns.tolist() == expected.columns.tolist()
+    np.testing.assert_allclose(preprocessed.loc[expected.index].to_numpy(), expected.to_numpy())
+
+
+def test_sparse_preprocessing_is_used_as_is(patient_features):
+    X = preprocess_data_clustering(filter_features(patient_features), FeatureVectorizer(sparse=True, prefix_sep='_'))
+    assert sp.isspmatrix_csr(X)
+    assert X.shape[0] == len(patient_features)
+
+    labels = kmeans_apply(X, 3)
+    report = kmeans_quick_report(X, labels)
+    dense_report = kmeans_quick_report(X.toarray(), labels)
+    for metric in ("silhouette", "calinski_harabasz", "davies_bouldin", "sizes"):
+        assert report[metric] == pytest.approx(dense_report[metric])
+
+
+@pytest.mark.parametrize("sparse", [False, True])
+def test_kmeans_clusters_cover_all_patients(sparse, patients_ttl):
+    clusters = clustering_apply(None, "kmeans", 3, ttl_path=patients_ttl, use_cache=False,
+                                vectorizer=FeatureVectorizer(sparse=sparse, prefix_sep='_'))
+    assert len(clusters) == 3
+    assert sum(len(members) for members in clusters.values()) == 24
+
+
+@pytest.mark.parametrize("sparse", [False, True])
+def test_quick_report_matches_sklearn(sparse, patient_features):
+    X = preprocess_data_clustering(filter_features(patient_features), FeatureVectorizer(sparse=sparse, prefix_sep='_'))
+    X = X if sparse else X.to_numpy()
+    labels = kmeans_apply(X, 4)
+    dense = X.toarray() if sparse else X
+
+    # Presupuesto mínimo: la silueta se calcula por bloques de una fila
+    report = kmeans_quick_report(X, labels, memory_budget_mb=1e-6)
+
+    # El informe redondea a 3 decimales (1 en Calinski-Harabasz)
+    assert report["silhouette"] == pytest.approx(silhouette_score(dense, labels), abs=1e-3)
+    assert report["silhouette_pct_negative"] == pytest.approx((silhouette_samples(dense, labels) < 0).mean(), abs=1e-3)
+    assert report["calinski_harabasz"] == pytest.approx(calinski_harabasz_score(dense, labels), abs=0.1)
+    assert report["davies_bouldin"] == pytest.approx(davies_bouldin_score(dense, labels), abs=1e-3)
+    assert report["sizes"] == np.bincount(labels).tolist()
+
+
+def test_sampled_silhouette_reports_a_confidence_interval(patient_features):
+    X = preprocess_data_clustering(filter_features(patient_features)).to_numpy()
+    labels = kmeans_apply(X, 3)
+
+    full = kmeans_quick_report(X, labels)
+    sampled = kmeans_quick_report(X, labels, sample_size=12)
+
+    assert sampled["silhouette_sample_size"] >= 12 - 3
+    low, high = sampled["silhouette_ci95"]
+    assert low <= sampled["silhouette"] <= high
+    # Con la muestra completa no hay estimación: mismo valor que sin muestreo
+    assert kmeans_quick_report(X, labels, sample_size=len(labels))["silhouette"] == full["silhouette"]
+
+
+
+@pytest.mark.parametrize("sparse", [False, True])
+@pytest.mark.parametrize("n_jobs", [1, 2])
+def test_k_sweep_matches_single_fits(sparse, n_jobs, patients_ttl, tmp_path, monkeypatch):
+    # Con la caché, el barrido reutiliza la misma matriz (y el mismo orden de pacientes)
+    monkeypatch.setattr(cache, "DEFAULT_CACHE_DIR", str(tmp_path / "cache"))
+    X, patient_nodes = _clustering_apply_preprocess(None, patients_ttl,
+                                                    vectorizer=FeatureVectorizer(sparse=sparse, prefix_sep='_'))
+
+    results, sweep_nodes = clustering_sweep(None, "kmeans", [4, 2, 3, 2], ttl_path=patients_ttl,
+                                            vectorizer=FeatureVectorizer(sparse=sparse, prefix_sep='_'),
+                                            n_jobs=n_jobs)
+
+    # Un resultado por k distinto, en orden creciente, igual que un ajuste aislado
+    assert sweep_nodes == [str(patient) for patient in patient_nodes]
+    assert [row["k"] for row in results] == [2, 3, 4]
+    for row in results:
+        labels = kmeans_apply(X, row["k"])
+        np.testing.assert_array_equal(row["labels"], labels)
+        report = kmeans_quick_report(X, labels)
+        for metric in ("silhouette", "calinski_harabasz", "davies_bouldin", "sizes"):
+            assert row[metric] == report[metric]
+        assert row["inertia"] > 0 and row["seconds"] >= 0
+
+
+def test_k_sweep_writes_the_table_and_the_best_k(patients_ttl, tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(sys, "argv", ["other_clusterings.py", patients_ttl, "-m", "kmeans", "--no-cache",
+                                      "--k-values", "3", "2", "4"])
+    other_clusterings.main()
+
+    today = datetime.today().strftime("%Y%m%d")
+    with open(tmp_path / "outputs" / f"{today}_kmeans_KSweep.csv", newline="", encoding="utf-8") as f:
+        table = list(csv.DictReader(f))
+    assert [row["k"] for row in table] == ["2", "3", "4"]
+    assert list(table[0]) == ["k", "inertia", "silhouette", "silhouette_pct_negative", "calinski_harabasz",
+                              "davies_bouldin", "min_cluster_size", "max_cluster_size", "largest_share_pct",
+                              "seconds"]
+
+    # El CSV de clusters habitual se escribe para el k con mayor silueta
+    best = max(table, key=lambda row: float(row["silhouette"]))["k"]
+    assert f"k elegido (mayor silueta): {best}" in capsys.readouterr().out
+    with open(tmp_path / "outputs" / f"{today}_kmeans_{best}.csv", newline="", encoding="utf-8") as f:
+        rows = list(csv.reader(f))
+    assert rows[0] == ["Cluster", "PatientID"]
+    assert len(rows) == 1 + 24
+    assert len({cluster for cluster, _ in rows[1:]}) == int(best)
+
+
+@pytest.mark.parametrize("sparse", [False, True])
+@pytest.mark.parametrize("method", GRAPH_METHODS)
+def test_graph_methods_return_one_entry_per_cluster(method, sparse, patients_ttl):
+    clusters = clustering_apply(None, method, 3, ttl_path=patients_ttl, use_cache=False,
+                                vectorizer=FeatureVectorizer(sparse=sparse, prefix_sep='_'), graph_knn=5)
+
+    # Mismo formato que k-means: { etiqueta 0..k-1: [pacientes] }, cada paciente una sola vez
+    assert sorted(clusters) == [0, 1, 2]
+    assert all(clusters[label] for label in clusters)
+    patients = [patient for members in clusters.values() for patient in members]
+    assert len(patients) == len(set(patients)) == 24
+
+
+def test_graph_methods_accept_a_threshold_graph(patient_features):
+    X = preprocess_data_clustering(filter_features(patient_features))
+    for method in GRAPH_METHODS:
+        labels = graph_clustering_apply(X, 3, method, knn=None, threshold=0.1)
+        assert len(labels) == len(patient_features)
+        assert set(labels.tolist()) == {0, 1, 2}
+
+
+def test_unreadable_ttl_is_reported_on_a_cache_miss(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    ttl_path = tmp_path / "broken.ttl"
+    ttl_path.write_text("@prefix d: <http://example.org/> .\nd:Case_001 a d:ClinicalCase ;\n", encoding="utf-8")
+    monkeypatch.setattr(sys, "argv", ["other_clusterings.py", str(ttl_path), "-m", "kmeans"])
+
+    with pytest.raises(SystemExit) as exit_info:
+        other_clusterings.main()
+
+    assert exit_info.value.code == 1
+    assert "[ERROR] No se pudo cargar el TTL" in capsys.readouterr().err
+
+
+@pytest.mark.parametrize("method", GRAPH_METHODS)
+def test_k_sweep_is_rejected_for_graph_methods(method, patients_ttl, tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(sys, "argv", ["other_clusterings.py", patients_ttl, "-m", method, "--k-values", "2", "3"])
+
+    with pytest.raises(SystemExit) as exit_info:
+        other_clusterings.main()
+
+    assert exit_info.value.code == 2
+    assert "--k-values" in capsys.readouterr().err
+    assert not (tmp_path / "outputs").exists()
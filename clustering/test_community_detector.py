@@ -0,0 +1,48 @@
+import random
+
+import pytest
+
+from clustering.community_detector import BACKENDS, detect_communities, evaluate_modularity
+from feature_builder.graph_builder import build_similarity_graph
+from feature_builder.vectorizer import FeatureVectorizer
+
+
+@pytest.fixture
+def similarity_graph(patient_features):
+    feature_vectors, patient_ids = FeatureVectorizer().fit_transform(patient_features)
+    return build_similarity_graph(feature_vectors, patient_ids, threshold=0.3), patient_ids
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+@pytest.mark.parametrize("method", ["louvain", "label_propagation"])
+@pytest.mark.parametrize("networkx_input", [False, True])
+def test_backends_return_a_full_partition(backend, method, networkx_input, similarity_graph):
+    G, patient_ids = similarity_graph
+    if networkx_input:
+        G = G.to_networkx()
+
+    partition = detect_communities(G, method=method, seed=7, backend=backend)
+
+    # Todos los pacientes, con comunidades numeradas 0..k-1
+    assert sorted(partition) == sorted(patient_ids)
+    assert set(partition.values()) == set(range(len(set(partition.values()))))
+    if method == "louvain":
+        assert evaluate_modularity(G, partition) > 0
+
+
+def test_igraph_seed_is_reproducible_and_keeps_global_random(similarity_graph):
+    G, _ = similarity_graph
+    random.seed(0)
+    expected_state = random.getstate()
+
+    first = detect_communities(G, method="louvain", seed=7, backend="igraph")
+    second = detect_communities(G, method="louvain", seed=7, backend="igraph")
+
+    assert first == second
+    assert random.getstate() == expected_state
+
+
+def test_unknown_backend_is_rejected(similarity_graph):
+    G, _ = similarity_graph
+    with pytest.raises(ValueError):
+        detect_communities(G, backend="graph-tool")
@@ -0,0 +1,62 @@
+import numpy as np
+
+from feature_builder.patient_graph import PatientGraph
+from clustering.community_visualization import community_layout, visualize_communities
+
+
+def _cliques(n_cliques, size):
+    """n_cliques cliques of `size` nodes with no edges between them; partition = one community per clique."""
+    sources, targets = [], []
+    for c in range(n_cliques):
+        nodes = range(c * size, (c + 1) * size)
+        for i in nodes:
+            for j in nodes:
+                if i < j:
+                    sources.append(i)
+                    targets.append(j)
+    node_ids = [f"p{i}" for i in range(n_cliques * size)]
+    G = PatientGraph(node_ids, sources, targets, np.ones(len(sources)))
+    partition = {node: i // size for i, node in enumerate(node_ids)}
+    return G, partition
+
+
+def _assert_discs_separated(positions, partition, node_ids):
+    membership = np.array([partition[node] for node in node_ids])
+    centers = {c: positions[membership == c].mean(axis=0) for c in np.unique(membership)}
+    radii = {c: np.linalg.norm(positions[membership == c] - centers[c], axis=1).max() for c in centers}
+    for a in centers:
+        for b in centers:
+            if a < b:
+                assert np.linalg.norm(centers[a] - centers[b]) > radii[a] + radii[b]
+
+
+def test_community_layout_without_edges_between_communities():
+    G, partition = _cliques(2, 6)
+    positions = community_layout(G, partition, use_cache=False)
+    assert positions.shape == (12, 2)
+    assert np.isfinite(positions).all()
+    _assert_discs_separated(positions, partition, G.node_ids)
+
+
+def test_community_layout_many_isolated_communities():
+    G, partition = _cliques(300, 3)
+    positions = community_layout(G, partition, use_cache=False)
+    assert np.isfinite(positions).all()
+    _assert_discs_separated(positions, partition, G.node_ids)
+
+
+def test_community_layout_is_cached_and_deterministic(tmp_path):
+    G, partition = _cliques(3, 5)
+    G = PatientGraph(G.node_ids, np.append(G.sources, [0, 5]), np.append(G.targets, [5, 10]),
+                     np.append(G.weights, [0.5, 0.5]))
+    first = community_layout(G, partition, cache_dir=str(tmp_path))
+    assert len(list(tmp_path.iterdir())) == 1
+    assert np.array_equal(first, community_layout(G, partition, cache_dir=str(tmp_path)))
+    assert np.array_equal(first, community_layout(G, partition, use_cache=False))
+
+
+def test_visualize_communities_community_layout(tmp_path):
+    G, partition = _cliques(2, 6)
+    output = tmp_path / "communities.png"
+    visualize_communities(G, partition, str(output), layout="community", use_cache=False)
+    assert output.stat().st_size > 0
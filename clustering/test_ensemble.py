@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+from clustering import ensemble
+from clustering.ensemble import load_ensemble, run_ensemble, save_ensemble
+from clustering.results import load_results
+from feature_builder.graph_builder import build_similarity_graph
+from feature_builder.vectorizer import FeatureVectorizer
+
+
+@pytest.fixture
+def similarity_graph(patient_features):
+    feature_vectors, patient_ids = FeatureVectorizer().fit_transform(patient_features)
+    return build_similarity_graph(feature_vectors, patient_ids, threshold=0.3)
+
+
+def test_graph_arrays_round_trip_through_memory_mapped_files(similarity_graph, tmp_path, monkeypatch):
+    G = similarity_graph
+    monkeypatch.setattr(ensemble, "_worker_graph", None)
+    monkeypatch.setattr(ensemble, "_worker_paths", None)
+
+    paths = ensemble._dump_graph_arrays(G, str(tmp_path))
+    worker_graph = ensemble._load_worker_graph(paths)
+    # Las tareas siguientes con las mismas rutas reutilizan el grafo ya abierto
+    assert ensemble._load_worker_graph(dict(paths)) is worker_graph
+
+    assert worker_graph.node_ids == list(G.node_ids)
+    np.testing.assert_array_equal(worker_graph.sources, G.sources)
+    np.testing.assert_array_equal(worker_graph.targets, G.targets)
+    np.testing.assert_array_equal(worker_graph.weights, G.weights)
+
+
+def test_process_pool_matches_in_process_runs(similarity_graph):
+    G = similarity_graph
+    seeds = [1, 2, 3]
+    methods = ("louvain", "leiden")
+
+    serial = run_ensemble(G, seeds, methods=methods, n_jobs=1)
+    pooled = run_ensemble(G, seeds, methods=methods, n_jobs=2)
+
+    # Orden methods × seeds y mismas particiones con la misma semilla
+    assert [(r["method"], r["seed"]) for r in pooled] == [(m, s) for m in methods for s in seeds]
+    for expected, result in zip(serial, pooled):
+        assert result["partition"] == expected["partition"]
+        assert sorted(result["partition"]) == sorted(G.node_ids)
+        assert result["communities"] == expected["communities"]
+        assert result["modularity"] == pytest.approx(expected["modularity"])
+
+
+def test_save_load_ensemble_round_trip(similarity_graph, tmp_path):
+    results = run_ensemble(similarity_graph, [1, 2], methods=("louvain", "leiden"), n_jobs=1)
+
+    path = save_ensemble(results, tmp_path / "ensemble", metadata={"threshold": 0.3})
+    loaded = load_ensemble(path)
+
+    assert loaded == results
+    # Los metadatos comunes se guardan junto a los de cada partición
+    assert all(info["threshold"] == 0.3 for info in load_results(path).metadata)
@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+from clustering.assignment import CommunityAssigner
+from clustering.community_detector import detect_communities
+from clustering.incremental import incremental_update, load_run
+from feature_builder.graph_analyzer import extract_features_from_file
+from feature_builder.graph_builder import build_similarity_graph
+from feature_builder.vectorizer import FeatureVectorizer
+
+THRESHOLD = 0.3
+
+
+def _edge_weights(G):
+    ids = G.node_ids
+    return {frozenset((ids[s], ids[t])): w for s, t, w in zip(G.sources, G.targets, G.weights)}
+
+
+@pytest.mark.parametrize("sparse", [False, True])
+def test_incremental_update_matches_full_rebuild(sparse, patient_features, patients_update_ttl, tmp_path):
+    vectorizer = FeatureVectorizer(sparse=sparse)
+    feature_vectors, patient_ids = vectorizer.fit_transform(patient_features)
+    G = build_similarity_graph(feature_vectors, patient_ids, threshold=THRESHOLD)
+    partition = detect_communities(G, method='leiden', seed=1)
+
+    # Ida y vuelta por disco, como en community_detection_main.py --save-model
+    path = tmp_path / "run.npz"
+    CommunityAssigner(feature_vectors, patient_ids, partition, vectorizer, threshold=THRESHOLD).save(path, graph=G)
+    assigner, G = load_run(path)
+
+    updated, G_updated, added_ids, removed_ids = incremental_update(
+        assigner, G, patients_update_ttl, seed=1, memory_budget_mb=1e-4)
+
+    # Reconstrucción completa de la cohorte actual con el esquema guardado
+    current_features = extract_features_from_file(patients_update_ttl)
+    full_vectors, full_ids = vectorizer.transform(current_features)
+    G_full = build_similarity_graph(full_vectors, full_ids, threshold=THRESHOLD)
+
+    assert len(added_ids) == 4 and len(removed_ids) == 2
+    assert sorted(G_updated.node_ids) == sorted(full_ids)
+    expected = _edge_weights(G_full)
+    edges = _edge_weights(G_updated)
+    assert edges.keys() == expected.keys()
+    assert np.allclose([edges[pair] for pair in expected], list(expected.values()))
+
+    # Los vectores guardados siguen a los nodos del grafo actualizado
+    rows = {pid: i for i, pid in enumerate(full_ids)}
+    order = [rows[pid] for pid in updated.patient_ids]
+    dense = (lambda m: m.toarray()) if sparse else np.asarray
+    np.testing.assert_allclose(dense(updated.feature_vectors), dense(full_vectors[order]))
+    assert (updated.membership >= 0).all()
@@ -0,0 +1,40 @@
+import pytest
+
+from clustering.community_detector import evaluate_modularity
+from clustering.resolution_sweep import resolution_sweep
+from feature_builder.graph_builder import build_similarity_graph
+from feature_builder.vectorizer import FeatureVectorizer
+
+RESOLUTIONS = [1.5, 0.25, 3, 1, 0.5, 2]
+
+
+@pytest.fixture
+def similarity_graph(patient_features):
+    feature_vectors, patient_ids = FeatureVectorizer().fit_transform(patient_features)
+    return build_similarity_graph(feature_vectors, patient_ids, threshold=0.3), patient_ids
+
+
+@pytest.mark.parametrize("warm_start", [True, False])
+def test_results_are_sorted_full_partitions(warm_start, similarity_graph):
+    G, patient_ids = similarity_graph
+    results = resolution_sweep(G, RESOLUTIONS + [1], seed=1, warm_start=warm_start)
+
+    assert [result["resolution"] for result in results] == sorted(set(RESOLUTIONS))
+    for result in results:
+        assert sorted(result["partition"]) == sorted(patient_ids)
+        assert result["communities"] == len(set(result["partition"].values()))
+        assert result["modularity"] == pytest.approx(evaluate_modularity(G, result["partition"]))
+
+
+def test_warm_start_keeps_cold_start_quality(similarity_graph):
+    G, _ = similarity_graph
+    warm = resolution_sweep(G, RESOLUTIONS, seed=1, warm_start=True)
+    cold = resolution_sweep(G, RESOLUTIONS, seed=1, warm_start=False)
+
+    # El primer paso (resolución más alta) no tiene partición previa: ambos coinciden
+    assert warm[-1]["partition"] == cold[-1]["partition"]
+    # Partiendo de la partición anterior, el número de comunidades no crece al bajar la resolución
+    communities = [result["communities"] for result in warm]
+    assert communities == sorted(communities)
+    for w, c in zip(warm, cold):
+        assert w["quality"] >= c["quality"] - 0.05 * abs(c["quality"])
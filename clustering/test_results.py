@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+from clustering.results import load_results, read_partition, save_results, write_csv, write_txt
+
+
+@pytest.fixture
+def partitions():
+    nodes = [f"p{i}" for i in range(30)]
+    return [
+        {node: i % 3 for i, node in enumerate(nodes)},
+        # Mismos pacientes en otro orden
+        {node: i % 4 for i, node in reversed(list(enumerate(nodes)))},
+        # Subconjunto de pacientes más uno que no estaba
+        {**{node: i % 2 for i, node in enumerate(nodes[5:])}, "extra": 7},
+    ]
+
+
+@pytest.mark.parametrize("mmap", [True, False])
+def test_save_load_round_trip(partitions, tmp_path, mmap):
+    metadata = [{"method": "leiden", "seed": seed} for seed in range(len(partitions))]
+    path = save_results(tmp_path / "run", partitions, modularity=[0.5, None, 0.25], metadata=metadata)
+    assert path.endswith(".partitions")
+
+    results = load_results(path, mmap=mmap)
+    assert len(results) == len(partitions)
+    assert results.partitions() == partitions
+    np.testing.assert_array_equal(results.modularity, [0.5, np.nan, 0.25])
+    assert results.metadata == metadata
+    assert results.community_sizes(2) == {0: 13, 1: 12, 7: 1}
+    # Los pacientes ausentes de una partición comparten etiqueta en label_matrix
+    assert len(set(results.label_matrix()[2][:5])) == 1
+
+
+def test_single_partition_and_exported_views(partitions, tmp_path):
+    path = save_results(tmp_path / "run", partitions[0], modularity=0.5, metadata={"method": "louvain"})
+    assert read_partition(path) == partitions[0]
+
+    write_csv(partitions[0], tmp_path / "run.csv")
+    write_txt(partitions[0], tmp_path / "run.txt")
+    assert read_partition(str(tmp_path / "run.csv")) == partitions[0]
+    assert read_partition(str(tmp_path / "run.txt")) == partitions[0]
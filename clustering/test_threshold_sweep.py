@@ -0,0 +1,35 @@
+import pytest
+
+from clustering.community_detector import evaluate_modularity
+from clustering.threshold_sweep import threshold_sweep
+from feature_builder.graph_builder import build_similarity_graph
+from feature_builder.vectorizer import FeatureVectorizer
+
+THRESHOLDS = [0.2, 0.5, 0.8, 0.95]
+
+
+@pytest.mark.parametrize("sparse", [False, True])
+def test_sweep_matches_a_rebuild_at_each_threshold(sparse, patient_features):
+    feature_vectors, patient_ids = FeatureVectorizer(sparse=sparse).fit_transform(patient_features)
+
+    # Presupuesto mínimo: las aristas se calculan por bloques y se reutilizan entre umbrales
+    results = threshold_sweep(feature_vectors, patient_ids, THRESHOLDS, seed=42, memory_budget_mb=1e-4)
+
+    assert [result["threshold"] for result in results] == sorted(THRESHOLDS, reverse=True)
+    for result in results:
+        G = build_similarity_graph(feature_vectors, patient_ids, threshold=result["threshold"])
+        assert result["edges"] == G.number_of_edges()
+        assert set(result["partition"]) == set(patient_ids)
+        assert result["communities"] == len(set(result["partition"].values()))
+        if G.number_of_edges():
+            assert result["modularity"] == pytest.approx(evaluate_modularity(G, result["partition"]))
+        else:
+            assert result["modularity"] is None
+
+
+def test_edges_grow_as_the_threshold_drops(patient_features):
+    feature_vectors, patient_ids = FeatureVectorizer().fit_transform(patient_features)
+    results = threshold_sweep(feature_vectors, patient_ids, THRESHOLDS, seed=42)
+    edges = [result["edges"] for result in results]
+    assert edges == sorted(edges)
+    assert edges[-1] > edges[0]
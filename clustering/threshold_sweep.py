@@ -0,0 +1,82 @@
+# clustering/threshold_sweep.py
+import time
+
+import numpy as np
+import networkx as nx
+
+from feature_builder.graph_builder import similarity_edges, DEFAULT_MEMORY_BUDGET_MB
+from feature_builder.patient_graph import PatientGraph
+from clustering.community_detector import detect_communities, evaluate_modularity
+
+
+def threshold_sweep(feature_vectors,
+                    patient_ids: list,
+                    thresholds,
+                    method: str = 'louvain',
+                    seed=None,
+                    memory_budget_mb: float = DEFAULT_MEMORY_BUDGET_MB,
+                    n_jobs: int = 1,
+                    backend: str = 'networkx') -> list:
+    """
+    Evalúa varios umbrales de similitud calculando las similitudes una sola vez.
+
+    Las aristas se calculan con el umbral más bajo y se ordenan por peso descendente.
+    Después se recorre la lista de umbrales de mayor a menor: el grafo de cada paso es
+    un prefijo de la lista de aristas, sobre el que se calcula la modularidad de forma
+    vectorizada. Los métodos de NetworkX usan un grafo al que solo se añaden las aristas
+    nuevas de cada paso; Leiden y el backend igraph trabajan directamente con el prefijo
+    (mismas reglas que build_similarity_graph: peso > 0 y peso >= umbral).
+
+    :param feature_vectors: Matriz NumPy o scipy.sparse de forma (n_pacientes, n_características)
+    :param patient_ids: Lista de identificadores de pacientes
+    :param thresholds: Umbrales a evaluar
+    :param method: Algoritmo de detección de comunidades (ver detect_communities)
+    :param seed: Semilla para la detección de comunidades
+    :param memory_budget_mb: Memoria máxima para los bloques de similitud (ver similarity_edges)
+    :param n_jobs: Número de hilos para el cálculo de similitudes
+    :param backend: Implementación del método de detección (ver detect_communities)
+    :return: Lista de dicts { threshold, edges, communities, modularity, seconds, partition },
+             ordenada por umbral descendente
+    """
+    thresholds = sorted(set(thresholds), reverse=True)
+    if not thresholds:
+        return []
+
+    sources, targets, weights = similarity_edges(feature_vectors, thresholds[-1],
+                                                 memory_budget_mb=memory_budget_mb, n_jobs=n_jobs)
+    order = np.argsort(-weights, kind="stable")
+    sources, targets, weights = sources[order], targets[order], weights[order]
+    ids = np.asarray(patient_ids, dtype=object)
+    use_networkx = method != 'leiden' and backend == 'networkx'
+
+    G = nx.Graph()
+    G.add_nodes_from(patient_ids)
+
+    results = []
+    added = 0
+    for threshold in thresholds:
+        start = time.perf_counter()
+
+        # Aristas con peso >= umbral que aún no están en el grafo (pesos en orden descendente)
+        stop = int(np.searchsorted(-weights, -threshold, side="right"))
+        step_graph = PatientGraph(patient_ids, sources[:stop], targets[:stop], weights[:stop])
+        if use_networkx:
+            G.add_weighted_edges_from(zip(ids[sources[added:stop]], ids[targets[added:stop]],
+                                          weights[added:stop].tolist()))
+        added = stop
+
+        partition = detect_communities(G if use_networkx else step_graph, method=method, seed=seed,
+                                       backend=backend)
+        # La modularidad no está definida en un grafo sin aristas
+        modularity = evaluate_modularity(step_graph, partition) if stop else None
+
+        results.append({
+            "threshold": threshold,
+            "edges": stop,
+            "communities": len(set(partition.values())),
+            "modularity": modularity,
+            "seconds": time.perf_counter() - start,
+            "partition": partition,
+        })
+
+    return results
@@ -1,20 +1,31 @@
 # community_detection_main.py
-from feature_builder.vectorizer import build_feature_vectors
-from feature_builder.graph_builder import build_similarity_graph
-from clustering.community_detector import detect_communities, evaluate_modularity, calculate_community_modularity
+from feature_builder.vectorizer import build_feature_vectors, FeatureVectorizer
+from feature_builder.graph_builder import build_similarity_graph, DEFAULT_MEMORY_BUDGET_MB
+from clustering.community_detector import detect_communities, BACKENDS
 import argparse
-from clustering.community_visualization import visualize_communities
+from clustering.community_visualization import visualize_communities, LAYOUTS
+from clustering.assignment import CommunityAssigner
+from clustering.results import save_results, write_csv, write_txt
+from metrics.community_quality import partition_quality
 import random
 import numpy as np
-import community as community_louvain
 import os
-import csv
 
 
 def community_detection_main(ttl_path: str,
                              similarity_threshold: float = None,
                              method: str = 'louvain',
-                             seed_random = None) -> dict:
+                             seed_random = None,
+                             streaming: bool = False,
+                             use_cache: bool = True,
+                             n_jobs: int = None,
+                             similarity_jobs: int = 1,
+                             sparse: bool = False,
+                             memory_budget_mb: float = DEFAULT_MEMORY_BUDGET_MB,
+                             knn: int = None,
+                             mutual_knn: bool = False,
+                             backend: str = 'networkx',
+                             save_model: str = None) -> dict:
     """
     Función principal para ejecutar el pipeline completo de detección de comunidades.
 
@@ -25,28 +36,49 @@ def community_detection_main(ttl_path: str,
       4. Evaluación de la modularidad.
       5. Visualización básica de comunidades.
 
-    :param ttl_path: Ruta al archivo .ttl con el grafo RDF
+    :param ttl_path: Ruta al archivo .ttl con el grafo RDF, patrón glob o lista de ficheros
     :param similarity_threshold: Umbral de similitud para filtrar aristas (None = grafo completo)
     :param method: Algoritmo de detección de comunidades ('louvain' o 'label_propagation')
-    :return: Diccionario { paciente_id: comunidad_id }
+    :param streaming: Si True, extrae las características en streaming sin cargar el rdflib.Graph completo
+    :param use_cache: Si True, reutiliza los vectores de características guardados en la caché en disco
+    :param n_jobs: Número de procesos para la ingesta de varios ficheros (None = número de CPUs)
+    :param similarity_jobs: Número de hilos para el cálculo de similitudes por bloques
+    :param sparse: Si True, codifica las características como matriz dispersa CSR
+    :param memory_budget_mb: Memoria máxima (MB) para los bloques de la matriz de similitud
+    :param knn: Si se indica, construye un grafo de k vecinos más cercanos en lugar del grafo por umbral
+    :param mutual_knn: Con knn, conservar solo las aristas entre vecinos mutuos
+    :param backend: Implementación del método de detección ('networkx' o 'igraph', ver detect_communities)
+    :param save_model: Ruta .npz opcional donde guardar partición, características y esquema para
+                       asignar pacientes nuevos sin recalcular (ver CommunityAssigner y assign_patients_main.py)
+    :return: (partición { paciente_id: comunidad_id }, grafo, métricas de partition_quality)
     """
     print("[DEBUG] Iniciando community_detection_main", flush=True)
     # Paso 1: Construir vectores de características
-    feature_vectors, patient_ids = build_feature_vectors(ttl_path)
+    vectorizer = FeatureVectorizer(sparse=sparse)
+    feature_vectors, patient_ids = build_feature_vectors(ttl_path, streaming=streaming, use_cache=use_cache,
+                                                         n_jobs=n_jobs, vectorizer=vectorizer)
     print(f"[1] Características extraídas: {len(patient_ids)} pacientes, {feature_vectors.shape[1]} dimensiones.", flush=True)
 
     # Paso 2: Construir grafo de similitud
-    G = build_similarity_graph(feature_vectors, patient_ids, threshold=similarity_threshold)
+    G = build_similarity_graph(feature_vectors, patient_ids, threshold=similarity_threshold,
+                               memory_budget_mb=memory_budget_mb, n_jobs=similarity_jobs,
+                               knn=knn, mutual=mutual_knn)
     print(f"[2] Grafo construido: {G.number_of_nodes()} nodos, {G.number_of_edges()} aristas.", flush=True)
 
     # Paso 3: Detectar comunidades
-    partition = detect_communities(G, method=method, seed=seed_random)
+    partition = detect_communities(G, method=method, seed=seed_random, backend=backend)
     n_comms = len(set(partition.values()))
-    print(f"[3] Comunidades detectadas ({method}): {n_comms} comunidades.", flush=True)
+    print(f"[3] Comunidades detectadas ({method}, {backend}): {n_comms} comunidades.", flush=True)
 
-    # Paso 4: Evaluar modularidad
-    modularity = evaluate_modularity(G, partition)
+    # Paso 4: Evaluar modularidad y métricas por comunidad (una sola pasada por las aristas)
+    quality = partition_quality(G, partition)
+    modularity = quality["modularity"] if quality["modularity"] is not None else float("nan")
     print(f"[4] Modularidad de la partición: {modularity:.4f}", flush=True)
+    for i, comm_id in enumerate(quality["communities"]):
+        print(f"  Comunidad {comm_id}: {quality['size'][i]} pacientes, "
+              f"peso interno {quality['internal_weight'][i]:.1f}, "
+              f"grado total {quality['total_degree'][i]:.1f}, "
+              f"conductancia {quality['conductance'][i]:.4f}")
 
     # Paso 5: Mostrar comunidades formadas
     communities = {}
@@ -59,7 +91,13 @@ def community_detection_main(ttl_path: str,
             print(f"    - {pid}")
     print("[Done] Visualización de comunidades completada.", flush=True)
 
-    return partition, G
+    if save_model:
+        CommunityAssigner(feature_vectors, patient_ids, partition, vectorizer,
+                          threshold=similarity_threshold, knn=knn,
+                          mutual=mutual_knn).save(save_model, graph=G)
+        print(f"Modelo de asignación guardado en {save_model}", flush=True)
+
+    return partition, G, quality
 
 
 if __name__ == '__main__':
@@ -70,59 +108,89 @@ if __name__ == '__main__':
     np.random.seed(SEED)
 
     parser = argparse.ArgumentParser(description='Pipeline de Community Detection para pacientes RDF')
-    parser.add_argument('ttl_path', help='Ruta al archivo .ttl con el grafo RDF')
+    parser.add_argument('ttl_path', nargs='+',
+                        help='Ruta al archivo .ttl con el grafo RDF (admite varios ficheros o patrones glob)')
     parser.add_argument('--threshold', type=float, default=None,
                         help='Umbral de similitud para filtrar aristas (entre 0 y 1)')
     parser.add_argument('--method', choices=['louvain', 'label_propagation'], default='louvain',
                         help='Método de detección de comunidades')
+    parser.add_argument('--backend', choices=BACKENDS, default='networkx',
+                        help='Implementación del método: networkx (python-louvain / NetworkX) o igraph (nativa, '
+                             'más rápida en grafos grandes)')
+    parser.add_argument('--streaming', action='store_true',
+                        help='Extrae las características en streaming sin cargar el grafo RDF completo')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='No reutilizar ni guardar los vectores de características en la caché en disco')
+    parser.add_argument('--jobs', type=int, default=None,
+                        help='Número de procesos para la ingesta de varios ficheros y la disposición por comunidad '
+                             'de la imagen (por defecto, número de CPUs)')
+    parser.add_argument('--similarity-jobs', type=int, default=1,
+                        help='Número de hilos para el cálculo de similitudes por bloques')
+    parser.add_argument('--sparse', action='store_true',
+                        help='Codifica las características como matriz dispersa (CSR)')
+    parser.add_argument('--memory-budget', type=float, default=DEFAULT_MEMORY_BUDGET_MB,
+                        help='Memoria máxima (MB) para los bloques de la matriz de similitud')
+    parser.add_argument('--knn', type=int, default=None,
+                        help='Construye un grafo de k vecinos más cercanos (compatible con --threshold)')
+    parser.add_argument('--mutual-knn', action='store_true',
+                        help='Con --knn, conservar solo las aristas entre vecinos mutuos')
+    parser.add_argument('--save-model', default=None,
+                        help='Guarda partición, características y esquema (.npz) para asignar pacientes nuevos '
+                             'con assign_patients_main.py')
+    parser.add_argument('--layout', choices=LAYOUTS, default='auto',
+                        help='Disposición de la imagen: spring (grafo completo), community (grafo de comunidades y '
+                             'disposición local por comunidad, con caché) o auto (community en grafos grandes)')
     args = parser.parse_args()
 
-    partition, G = community_detection_main(
+    partition, G, quality = community_detection_main(
         ttl_path=args.ttl_path,
         similarity_threshold=args.threshold,
         method=args.method,
-        seed_random=SEED
+        seed_random=SEED,
+        streaming=args.streaming,
+        use_cache=not args.no_cache,
+        n_jobs=args.jobs,
+        similarity_jobs=args.similarity_jobs,
+        sparse=args.sparse,
+        memory_budget_mb=args.memory_budget,
+        knn=args.knn,
+        mutual_knn=args.mutual_knn,
+        backend=args.backend,
+        save_model=args.save_model
     )
 
-    visualize_communities(G, partition, "visualization_output/communitiesGuttman", False)
+    visualize_communities(G, partition, "visualization_output/communitiesGuttman", False,
+                          layout=args.layout, seed=SEED, n_jobs=args.jobs or os.cpu_count())
 
-    modularity_score = calculate_community_modularity(partition, G, weight='weight')
-    print(f"Modularity score: {modularity_score:.4f}")
+    # Modularidad ya calculada en community_detection_main (partition_quality)
+    modularity_score = quality["modularity"]
 
-    # --- Save communities to a TXT file ---
+    # --- Save the partition (results directory) and its TXT / CSV views ---
     from datetime import datetime
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
     output_txt = f"communities_{timestamp}.txt"
-
-    # Group patients by community
-    communities = {}
-    for patient_id, comm_id in partition.items():
-        communities.setdefault(comm_id, []).append(patient_id)
-
-    # Write out
-    with open(output_txt, 'w') as f:
-        for comm_id, members in communities.items():
-            f.write(f"Community {comm_id} ({len(members)} patients):\n")
-            for pid in members:
-                f.write(f"  {pid}\n")
-            f.write("\n")
+    write_txt(partition, output_txt)
 
     print(f"Communities successfully saved to: {output_txt}")
 
     output_dir = "outputs"
     os.makedirs(output_dir, exist_ok=True)
     today_str = datetime.today().strftime("%Y%m%d")
+    results_dir = save_results(
+        os.path.join(output_dir, f"{today_str}_CommunityDetection"),
+        partition,
+        modularity=modularity_score,
+        metadata={"method": args.method, "backend": args.backend, "threshold": args.threshold,
+                  "knn": args.knn, "mutual_knn": args.mutual_knn, "seed": SEED,
+                  "input": args.ttl_path, "timestamp": timestamp}
+    )
+    print(f"Results saved to {results_dir}")
+
     output_file = os.path.join(
         output_dir,
         f"{today_str}_CommunityDetection.csv"
     )
-
-    with open(output_file, mode="w", newline="", encoding="utf-8") as csvfile:
-        writer = csv.writer(csvfile)
-        writer.writerow(["Cluster", "PatientID"])
-        for comm_id, members in communities.items():
-            for pid in members:
-                writer.writerow([comm_id, pid])
+    write_csv(partition, output_file)
 
     print(f"CSV file saved to {output_file}")
 
@@ -0,0 +1,31 @@
+# conftest.py
+# Los tests se ejecutan desde la raíz del repositorio (python -m pytest); este fichero
+# hace que la raíz esté en sys.path para importar feature_builder, clustering, metrics...
+import os
+
+import matplotlib
+import pytest
+
+matplotlib.use("Agg")
+
+# Ficheros RDF pequeños compartidos por los tests (ver feature_builder/test_data)
+TEST_DATA_DIR = os.path.join(os.path.dirname(__file__), "feature_builder", "test_data")
+
+
+@pytest.fixture
+def patients_ttl():
+    """Cohorte de 24 pacientes."""
+    return os.path.join(TEST_DATA_DIR, "patients.ttl")
+
+
+@pytest.fixture
+def patients_update_ttl():
+    """La cohorte de patients_ttl con dos pacientes menos y cuatro nuevos."""
+    return os.path.join(TEST_DATA_DIR, "patients_update.ttl")
+
+
+@pytest.fixture
+def patient_features(patients_ttl):
+    """dict { patient_uri: [(feature_uri, value), ...] } de patients_ttl."""
+    from feature_builder.graph_analyzer import stream_patient_features
+    return stream_patient_features(patients_ttl)
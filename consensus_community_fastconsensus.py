@@ -4,48 +4,39 @@ run_pipeline.py
 
 Orchestrates the full patient‐community pipeline:
   1) Extract features from an RDF Turtle file
-  2) Build a weighted NetworkX similarity graph
-  3) (Optionally) export the NX graph to GraphML
-  4) Convert NX → igraph via GraphML
-  5) Detect communities (Louvain or Leiden)
-  6) Save community assignments to TXT
+  2) Build a weighted similarity graph (array-backed PatientGraph)
+  3) (Optionally) export the graph to GraphML
+  4) Convert NX → igraph in memory
+  5) Fast consensus over repeated Louvain or Leiden partitions
+  6) Save community assignments (results directory + TXT view)
 """
 
 import argparse
+import os
 import networkx as nx
 from datetime import datetime
 
 from feature_builder.vectorizer import build_feature_vectors
-from feature_builder.graph_builder import build_similarity_graph
-from igraph_converter import convert_networkx_to_igraph_via_graphml
-from clustering.community_detector import detect_communities
+from feature_builder.graph_builder import build_similarity_graph, DEFAULT_MEMORY_BUDGET_MB
+from igraph_converter import convert_networkx_to_igraph
+from clustering.community_detector import evaluate_modularity
+from clustering.results import save_results, write_txt
 from fastconsensus.core import fast_consensus_clustering
-from utils import group_partition_into_communities
 
 
 def save_communities_txt(partition: dict, out_path: str):
     """
     Write communities (patient → community) into a human‐readable TXT file.
     """
-    # Group by community
-    communities = {}
-    for pid, cid in partition.items():
-        communities.setdefault(cid, []).append(pid)
-
-    with open(out_path, 'w') as f:
-        for cid, members in sorted(communities.items()):
-            f.write(f"Community {cid} ({len(members)} patients):\n")
-            for pid in members:
-                f.write(f"  {pid}\n")
-            f.write("\n")
+    write_txt(partition, out_path)
 
 
 def main():
     parser = argparse.ArgumentParser(
         description="Full pipeline: TTL → features → NX graph → igraph → communities"
     )
-    parser.add_argument("ttl_path",
-                        help="Path to the RDF Turtle file with ClinicalCase data")
+    parser.add_argument("ttl_path", nargs="+",
+                        help="Path(s) or glob pattern(s) of the RDF Turtle file(s) with ClinicalCase data")
     parser.add_argument("--threshold", type=float, default=None,
                         help="Similarity threshold (0–1) to filter edges; if omitted, keep all >0")
     parser.add_argument("--method", choices=["louvain", "leiden"], default="louvain",
@@ -56,32 +47,65 @@ def main():
                         help="Path to save community assignments (TXT). "
                              "Default: communities_<timestamp>.txt")
     parser.add_argument("--seed", type=int, default=42,
-                        help="Random seed for Leiden (ignored by Louvain)")
+                        help="Random seed for the consensus partitions")
+    parser.add_argument("--n-partitions", type=int, default=20,
+                        help="Partitions per consensus round")
+    parser.add_argument("--consensus-threshold", type=float, default=0.2,
+                        help="Minimum co-membership fraction to keep an edge in the consensus graph")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Do not reuse or store feature vectors in the on-disk cache")
+    parser.add_argument("--jobs", type=int, default=None,
+                        help="Worker processes for multi-file ingestion (default: number of CPUs) "
+                             "and threads for the blocked similarity computation (default: 1)")
+    parser.add_argument("--sparse", action="store_true",
+                        help="Encode features as a sparse CSR matrix")
+    parser.add_argument("--memory-budget", type=float, default=DEFAULT_MEMORY_BUDGET_MB,
+                        help="Memory budget (MB) for the similarity matrix blocks")
+    parser.add_argument("--knn", type=int, default=None,
+                        help="Build a k-nearest-neighbour graph (can be combined with --threshold)")
+    parser.add_argument("--mutual-knn", action="store_true",
+                        help="With --knn, keep only edges between mutual neighbours")
     args = parser.parse_args()
 
     # Step 1: feature vectors
     print("[1] Extracting feature vectors...", flush=True)
-    feature_vectors, patient_ids = build_feature_vectors(args.ttl_path)
+    feature_vectors, patient_ids = build_feature_vectors(args.ttl_path, use_cache=not args.no_cache,
+                                                         n_jobs=args.jobs, sparse=args.sparse)
     print(f"    → {len(patient_ids)} patients, {feature_vectors.shape[1]} features", flush=True)
 
-    # Step 2: build NX similarity graph
+    # Step 2: build similarity graph
     print("[2] Building similarity graph...", flush=True)
-    nx_graph = build_similarity_graph(feature_vectors, patient_ids, threshold=args.threshold)
-    print(f"    → {nx_graph.number_of_nodes()} nodes, {nx_graph.number_of_edges()} edges", flush=True)
+    graph = build_similarity_graph(feature_vectors, patient_ids, threshold=args.threshold,
+                                   memory_budget_mb=args.memory_budget, n_jobs=args.jobs or 1,
+                                   knn=args.knn, mutual=args.mutual_knn)
+    print(f"    → {graph.number_of_nodes()} nodes, {graph.number_of_edges()} edges", flush=True)
 
     # Optional export to GraphML
     if args.export_graphml:
-        print(f"[3] Exporting NX graph to GraphML at {args.export_graphml}", flush=True)
-        nx.write_graphml(nx_graph, args.export_graphml)
+        print(f"[3] Exporting graph to GraphML at {args.export_graphml}", flush=True)
+        nx.write_graphml(graph.to_networkx(), args.export_graphml)
 
     # Step 3: convert to igraph
-    print("[4] Converting to igraph via GraphML...", flush=True)
-    ig_graph = convert_networkx_to_igraph_via_graphml(nx_graph)
-
-    partition = fast_consensus_clustering(ig_graph, n_partitions=20, threshold=0.2)
-
-    # Save the communities to a TXT file
+    print("[4] Converting to igraph...", flush=True)
+    ig_graph = convert_networkx_to_igraph(graph)
+
+    # Step 4: fast consensus over repeated partitions
+    print(f"[5] Running fast consensus ({args.method}, {args.n_partitions} partitions per round)...", flush=True)
+    partition = fast_consensus_clustering(ig_graph, n_partitions=args.n_partitions,
+                                          threshold=args.consensus_threshold, algorithm=args.method,
+                                          seed=args.seed, n_jobs=args.jobs)
+    modularity = evaluate_modularity(graph, partition) if graph.number_of_edges() else None
+    print(f"    → {len(set(partition.values()))} communities", flush=True)
+
+    # Save the communities as a results directory and its TXT view
     output_path = args.output_txt or f"communities_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
+    results_dir = save_results(os.path.splitext(output_path)[0], partition, modularity=modularity,
+                               metadata={"method": f"fastconsensus_{args.method}", "seed": args.seed,
+                                         "n_partitions": args.n_partitions,
+                                         "consensus_threshold": args.consensus_threshold,
+                                         "threshold": args.threshold, "knn": args.knn,
+                                         "input": args.ttl_path})
+    print(f"    → Results saved to {results_dir}", flush=True)
     save_communities_txt(partition, output_path)
     print(f"    → Communities saved to {output_path}", flush=True)
 
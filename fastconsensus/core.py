@@ -0,0 +1,150 @@
+# fastconsensus/core.py
+"""
+Fast consensus clustering (Tandon et al., 2019) on top of the community detection
+methods in clustering.community_detector.
+
+Each round runs ``n_partitions`` detections on the current consensus graph, reweights
+every existing edge by the fraction of partitions in which its endpoints share a
+community, drops edges below ``threshold`` and closes a sample of open triads. The
+co-membership is only ever evaluated for edges (or sampled triads), never for all n²
+pairs, so memory stays proportional to the number of edges.
+"""
+
+import os
+
+import igraph as ig
+import numpy as np
+
+from feature_builder.patient_graph import PatientGraph
+from clustering.ensemble import EnsemblePool, run_ensemble
+
+
+def fast_consensus_clustering(ig_graph: ig.Graph,
+                              n_partitions: int = 20,
+                              threshold: float = 0.2,
+                              algorithm: str = "leiden",
+                              delta: float = 0.02,
+                              max_iter: int = 20,
+                              seed: int = None,
+                              n_jobs: int = None) -> dict:
+    """
+    Compute a consensus partition of an undirected (optionally weighted) graph.
+
+    :param ig_graph: igraph Graph; the ``name`` vertex attribute (if any) labels the output
+                     and the ``weight`` edge attribute (if any) is used in the first round.
+    :param n_partitions: Number of partitions per round.
+    :param threshold: Edges whose co-membership fraction is below this value are removed.
+    :param algorithm: Detection method for each partition ('leiden', 'louvain' or 'label_propagation').
+    :param delta: Convergence tolerance: stop when at most this fraction of edges has a
+                  co-membership strictly between 0 and 1.
+    :param max_iter: Maximum number of rounds. If the partitions have not converged by then, a
+                     warning is printed and the highest-modularity partition of the last round
+                     is returned.
+    :param seed: Seed for the partitions and the triad sampling.
+    :param n_jobs: Worker processes for the partitions of each round (see run_ensemble). The
+                   process pool is created once and reused by every round.
+    :return: Dict { vertex name: community id }.
+    """
+    rng = np.random.default_rng(seed)
+    graph = _patient_graph_from_igraph(ig_graph)
+    if "name" in ig_graph.vs.attributes():
+        names = ig_graph.vs["name"]
+    else:
+        names = list(range(ig_graph.vcount()))
+
+    with EnsemblePool(min(n_jobs or os.cpu_count() or 1, n_partitions)) as pool:
+        for _ in range(max_iter):
+            memberships, modularities = _partition_round(graph, n_partitions, algorithm, rng, pool)
+
+            weights = _co_membership(memberships, graph.sources, graph.targets)
+            uncertain = np.count_nonzero((weights > 0) & (weights < 1))
+            if uncertain <= delta * max(1, len(weights)):
+                consensus = memberships[0]
+                break
+
+            # Zero-weight edges would not influence any partition
+            keep = (weights >= threshold) & (weights > 0)
+            sources, targets, weights = graph.sources[keep], graph.targets[keep], weights[keep]
+            graph = _triadic_closure(graph.node_ids, sources, targets, weights, memberships, rng)
+        else:
+            print(f"[WARNING] Fast consensus did not converge in {max_iter} rounds "
+                  f"({uncertain} of {len(weights)} edges still uncertain); "
+                  f"returning the highest-modularity partition of the last round", flush=True)
+            consensus = memberships[np.argmax(modularities)]
+
+    return {node: int(comm_id) for node, comm_id in zip(names, consensus)}
+
+
+def _patient_graph_from_igraph(ig_graph: ig.Graph) -> PatientGraph:
+    """
+    Edge arrays (i < j) of an igraph Graph; unweighted graphs get weight 1.
+    Nodes are labelled by their vertex index (as strings, like igraph vertex names).
+    """
+    node_ids = [str(i) for i in range(ig_graph.vcount())]
+    edges = np.array(ig_graph.get_edgelist(), dtype=np.int64).reshape(-1, 2)
+    if "weight" in ig_graph.es.attributes():
+        weights = np.asarray(ig_graph.es["weight"], dtype=float)
+    else:
+        weights = np.ones(len(edges))
+    return PatientGraph(node_ids, edges.min(axis=1), edges.max(axis=1), weights)
+
+
+def _partition_round(graph: PatientGraph, n_partitions: int, algorithm: str, rng,
+                     pool: EnsemblePool):
+    """
+    Run n_partitions detections on the shared pool; return an (n_partitions, n_nodes) membership
+    matrix and the modularity of each partition on the current graph (-inf for an edgeless graph).
+    """
+    seeds = rng.integers(2 ** 31 - 1, size=n_partitions).tolist()
+    results = run_ensemble(graph, seeds, methods=(algorithm,), backend="igraph", pool=pool)
+    memberships = np.vstack([graph.membership(result["partition"]) for result in results])
+    modularities = np.array([-np.inf if result["modularity"] is None else result["modularity"]
+                             for result in results])
+    return memberships, modularities
+
+
+def _co_membership(memberships: np.ndarray, sources, targets) -> np.ndarray:
+    """Fraction of partitions in which each (source, target) pair shares a community."""
+    if len(sources) == 0:
+        return np.zeros(0)
+    return (memberships[:, sources] == memberships[:, targets]).mean(axis=0)
+
+
+def _triadic_closure(node_ids, sources, targets, weights, memberships, rng) -> PatientGraph:
+    """
+    Sample as many open triads as there are edges (pick a node, then two of its neighbours)
+    and add each missing neighbour-neighbour edge weighted by its co-membership fraction
+    (pairs never placed together are skipped).
+    """
+    graph = PatientGraph(node_ids, sources, targets, weights)
+    n, n_samples = graph.number_of_nodes(), graph.number_of_edges()
+    adjacency = graph.adjacency
+    degrees = np.diff(adjacency.indptr)
+
+    candidates = np.flatnonzero(degrees >= 2)
+    if n_samples == 0 or len(candidates) == 0:
+        return graph
+
+    centers = rng.choice(candidates, size=n_samples)
+    first = rng.integers(degrees[centers])
+    # Second neighbour drawn from the remaining degree - 1 positions, so it differs from the first
+    second = rng.integers(degrees[centers] - 1)
+    second += second >= first
+    u = adjacency.indices[adjacency.indptr[centers] + first]
+    w = adjacency.indices[adjacency.indptr[centers] + second]
+
+    low, high = np.minimum(u, w).astype(np.int64), np.maximum(u, w).astype(np.int64)
+    new_keys = np.unique(low * n + high)
+    existing_keys = graph.sources.astype(np.int64) * n + graph.targets
+    new_keys = new_keys[~np.isin(new_keys, existing_keys)]
+    if len(new_keys) == 0:
+        return graph
+
+    new_sources, new_targets = new_keys // n, new_keys % n
+    new_weights = _co_membership(memberships, new_sources, new_targets)
+    positive = new_weights > 0
+    new_sources, new_targets, new_weights = new_sources[positive], new_targets[positive], new_weights[positive]
+    return PatientGraph(node_ids,
+                        np.concatenate([graph.sources, new_sources]),
+                        np.concatenate([graph.targets, new_targets]),
+                        np.concatenate([graph.weights, new_weights]))
@@ -0,0 +1,51 @@
+import igraph as ig
+import numpy as np
+
+import clustering.ensemble as ensemble
+from fastconsensus.core import _patient_graph_from_igraph, fast_consensus_clustering
+
+
+def _planted_partition_graph(seed=0):
+    rng = np.random.default_rng(seed)
+    blocks = np.repeat([0, 1, 2], 60)
+    probabilities = np.where(blocks[:, None] == blocks[None, :], 0.3, 0.02)
+    edges = np.argwhere(np.triu(rng.random(probabilities.shape) < probabilities, k=1))
+    return ig.Graph(n=len(blocks), edges=edges.tolist()), blocks
+
+
+def test_rounds_share_one_process_pool(monkeypatch):
+    graph, blocks = _planted_partition_graph()
+    created = []
+
+    class CountingExecutor(ensemble.ProcessPoolExecutor):
+        def __init__(self, *args, **kwargs):
+            created.append(kwargs.get("max_workers"))
+            super().__init__(*args, **kwargs)
+
+    monkeypatch.setattr(ensemble, "ProcessPoolExecutor", CountingExecutor)
+
+    # delta=0 forces several rounds
+    serial = fast_consensus_clustering(graph, n_partitions=6, seed=3, n_jobs=1, delta=0.0, max_iter=4)
+    parallel = fast_consensus_clustering(graph, n_partitions=6, seed=3, n_jobs=2, delta=0.0, max_iter=4)
+
+    assert created == [2]
+    assert parallel == serial
+    membership = np.array([serial[i] for i in range(len(blocks))])
+    assert len(set(zip(blocks.tolist(), membership.tolist()))) == 3
+
+
+def test_non_convergence_returns_best_partition_of_last_round(capsys):
+    graph, _ = _planted_partition_graph()
+
+    # delta=0 with a single round cannot converge on this graph
+    consensus = fast_consensus_clustering(graph, n_partitions=6, algorithm="label_propagation",
+                                          seed=0, n_jobs=1, delta=0.0, max_iter=1)
+    assert "did not converge" in capsys.readouterr().out
+
+    # The same round, replayed: consensus is its highest-modularity partition
+    # (with seed 0 that is not the first partition of the round)
+    seeds = np.random.default_rng(0).integers(2 ** 31 - 1, size=6).tolist()
+    results = ensemble.run_ensemble(_patient_graph_from_igraph(graph), seeds, methods=("label_propagation",),
+                                    backend="igraph", n_jobs=1)
+    best = max(results, key=lambda result: result["modularity"])
+    assert consensus == {int(node): comm_id for node, comm_id in best["partition"].items()}
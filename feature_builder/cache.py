@@ -0,0 +1,118 @@
+# feature_builder/cache.py
+import hashlib
+import json
+import os
+import tempfile
+import zipfile
+
+import numpy as np
+
+
+# Directorio y tamaño máximo de la caché (se pueden sobrescribir por variables de entorno)
+DEFAULT_CACHE_DIR = os.environ.get("FEATURE_CACHE_DIR", ".feature_cache")
+DEFAULT_MAX_BYTES = int(os.environ.get("FEATURE_CACHE_MAX_BYTES", 2 * 1024 ** 3))
+
+# Incrementar al cambiar la extracción o la codificación para invalidar entradas antiguas
+CACHE_VERSION = 3
+
+_CHUNK_SIZE = 1 << 20
+
+
+def file_digest(path):
+    """
+    Calcula el hash del contenido de un fichero leyéndolo por bloques.
+
+    :param path: Ruta al fichero
+    :return: Hash hexadecimal (blake2b)
+    """
+    digest = hashlib.blake2b(digest_size=20)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cache_key(ttl_path, **settings):
+    """
+    Construye la clave de caché a partir del contenido del fichero (o ficheros) de entrada
+    y de los parámetros de extracción/codificación.
+
+    :param ttl_path: Ruta al fichero RDF de entrada o lista de rutas (el orden importa)
+    :param settings: Parámetros que influyen en el resultado (serializables a JSON)
+    :return: Clave hexadecimal
+    """
+    paths = [ttl_path] if isinstance(ttl_path, (str, os.PathLike)) else list(ttl_path)
+    payload = {
+        "version": CACHE_VERSION,
+        "input": [file_digest(path) for path in paths],
+        "settings": settings,
+    }
+    encoded = json.dumps(payload, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.blake2b(encoded, digest_size=20).hexdigest()
+
+
+def load_cached(key, cache_dir=None):
+    """
+    Carga una entrada de la caché.
+
+    :param key: Clave devuelta por cache_key
+    :param cache_dir: Directorio de la caché (por defecto DEFAULT_CACHE_DIR)
+    :return: dict { nombre: np.ndarray } o None si no existe o no se puede leer
+             (p.ej. un fichero truncado o dañado, que se trata como un fallo de caché)
+    """
+    path = _entry_path(key, cache_dir)
+    try:
+        with np.load(path, allow_pickle=False) as data:
+            arrays = {name: data[name] for name in data.files}
+    except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+        return None
+    # Marcar la entrada como usada recientemente para la política de desalojo
+    os.utime(path)
+    return arrays
+
+
+def store_cached(key, arrays, cache_dir=None, max_bytes=None):
+    """
+    Guarda un conjunto de arrays en la caché (formato .npz sin comprimir)
+    y desaloja las entradas menos usadas si se supera el tamaño máximo.
+
+    :param key: Clave devuelta por cache_key
+    :param arrays: dict { nombre: np.ndarray }
+    :param cache_dir: Directorio de la caché (por defecto DEFAULT_CACHE_DIR)
+    :param max_bytes: Tamaño máximo de la caché en bytes (por defecto DEFAULT_MAX_BYTES)
+    """
+    cache_dir = cache_dir or DEFAULT_CACHE_DIR
+    os.makedirs(cache_dir, exist_ok=True)
+
+    # Escritura atómica: fichero temporal + rename
+    fd, tmp_path = tempfile.mkstemp(suffix=".npz.tmp", dir=cache_dir)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_path, _entry_path(key, cache_dir))
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    _evict(cache_dir, DEFAULT_MAX_BYTES if max_bytes is None else max_bytes)
+
+
+def _entry_path(key, cache_dir=None):
+    return os.path.join(cache_dir or DEFAULT_CACHE_DIR, f"{key}.npz")
+
+
+def _evict(cache_dir, max_bytes):
+    """Elimina las entradas usadas hace más tiempo hasta quedar por debajo de max_bytes."""
+    entries = []
+    for name in os.listdir(cache_dir):
+        if name.endswith(".npz"):
+            stat = os.stat(os.path.join(cache_dir, name))
+            entries.append((stat.st_mtime, stat.st_size, name))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, name in sorted(entries):
+        if total <= max_bytes:
+            break
+        os.remove(os.path.join(cache_dir, name))
+        total -= size
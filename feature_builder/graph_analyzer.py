@@ -1,6 +1,14 @@
+import glob
+import os
+import pathlib
+from concurrent.futures import ProcessPoolExecutor
+
 import rdflib
 from .config import NAMESPACES
 from rdflib import URIRef
+from rdflib.plugins.parsers.notation3 import RDFSink, SinkParser
+from rdflib.plugins.parsers.ntriples import W3CNTriplesParser
+from rdflib.util import guess_format
 
 
 # Cargar namespaces dinámicamente desde config
@@ -31,47 +39,48 @@ def extract_patient_nodes(graph):
     Extrae todos los nodos que son instancias de "ClinicalCase",
     sin depender de namespaces.
     Busca triples (?s rdf:type ?o) donde el nombre local de ?o sea "ClinicalCase".
+    El nombre local de cada clase se resuelve una sola vez.
     Retorna una lista de sujetos.
     """
-    patient_nodes = set()
+    patient_nodes = {}
+    is_case_class = {}
     for subj, _, obj in graph.triples((None, rdflib.RDF.type, None)):
-        if isinstance(obj, URIRef):
-            # Obtener el fragmento tras '#' o '/', para comparar el nombre local
-            local_name = obj.split('#')[-1].split('/')[-1]
-            if local_name == 'ClinicalCase':
-                patient_nodes.add(subj)
+        if obj not in is_case_class:
+            is_case_class[obj] = _is_clinical_case(obj)
+        if is_case_class[obj]:
+            patient_nodes[subj] = None
     return list(patient_nodes)
 
+
 def extract_patient_features(graph, patient_nodes):
     """
     Para cada paciente, recorre sus ns1:hasPart y extrae:
       - Observaciones (ns1:hasObservable + ns1:hasObservableValue → valor)
       - Situaciones clínicas (ns1:representsSituation como booleano True)
+    Los triples relevantes se indexan en un único recorrido del grafo
+    (ver index_patient_graph), sin consultas al grafo por paciente.
     Devuelve un dict { patient_uri: [(feature_uri, value), ...] }
     """
-    features_by_patient = {}
-    for patient in patient_nodes:
-        features = []
-        for part in graph.objects(patient, NS1.hasPart):
-            # Observaciones
-            for observable in graph.objects(part, NS1.hasObservable):
-                value = None
-                for val_node in graph.objects(part, NS1.hasObservableValue):
-                    # Literal directo
-                    if isinstance(val_node, rdflib.Literal):
-                        value = str(val_node)
-                    else:
-                        # Nodo intermedio: buscar cualquier hasValue
-                        for p, o in graph.predicate_objects(val_node):
-                            if _is_has_value(p):
-                                value = str(o)
-                if value is not None:
-                    features.append((str(observable), value))
-            # Situaciones clínicas
-            for situation in graph.objects(part, NS1.representsSituation):
-                features.append((str(situation), True))
-        features_by_patient[str(patient)] = features
-    return features_by_patient
+    return index_patient_graph(graph).features(patient_nodes)
+
+
+def index_patient_graph(graph):
+    """
+    Recorre una sola vez todos los triples del grafo y construye los índices por
+    sujeto necesarios para extraer las características de todos los pacientes.
+
+    :param graph: rdflib.Graph ya cargado
+    :return: _PatientFeatureIndex con los pacientes en `patients` y el método `features()`
+    """
+    index = _PatientFeatureIndex()
+    for triple in graph:
+        index.add(triple)
+    return index
+
+
+def _is_clinical_case(obj):
+    # Obtener el fragmento tras '#' o '/', para comparar el nombre local
+    return isinstance(obj, URIRef) and obj.split('#')[-1].split('/')[-1] == 'ClinicalCase'
 
 # Predicado local para diagnosticar "hasValue"
 def _is_has_value(predicate):
@@ -110,3 +119,179 @@ def filter_features(features):
             filtered[patient] = patient_filtered_features
 
     return filtered
+
+
+_UNRESOLVED = object()
+
+
+class _PatientFeatureIndex:
+    """
+    Índices por sujeto con solo el estado necesario para la unión
+    ClinicalCase → hasPart → hasObservable/hasObservableValue/representsSituation.
+    El resto de triples se descarta según llegan.
+
+    Acepta triples tanto por la interfaz de rdflib.Graph (``add``), usada por el
+    parser Turtle, como por la de los parsers N-Triples (``triple``), por lo que
+    sirve igual para ingesta en streaming que para indexar un grafo ya cargado.
+    Los diccionarios internos actúan como conjuntos ordenados, de modo que los
+    triples duplicados se ignoran igual que en un rdflib.Graph.
+    """
+
+    def __init__(self):
+        self.patients = {}
+        self.parts = {}
+        self.observables = {}
+        self.observable_values = {}
+        self.situations = {}
+        self.has_values = {}
+        # Índice destino de cada predicado; los predicados desconocidos se resuelven
+        # una sola vez (hasValue en cualquier namespace o descartado)
+        self._indexes = {
+            rdflib.RDF.type: self.patients,
+            NS1.hasPart: self.parts,
+            NS1.hasObservable: self.observables,
+            NS1.hasObservableValue: self.observable_values,
+            NS1.representsSituation: self.situations,
+        }
+        self._is_case_class = {}
+
+    def add(self, triple):
+        s, p, o = triple
+        index = self._indexes.get(p, _UNRESOLVED)
+        if index is _UNRESOLVED:
+            index = self._indexes[p] = self.has_values if _is_has_value(p) else None
+        if index is None:
+            return
+        if index is self.patients:
+            is_case = self._is_case_class.get(o)
+            if is_case is None:
+                is_case = self._is_case_class[o] = _is_clinical_case(o)
+            if is_case:
+                self.patients[s] = None
+        else:
+            index.setdefault(s, {})[o] = None
+
+    def triple(self, s, p, o):
+        self.add((s, p, o))
+
+    def features(self, patient_nodes=None):
+        """
+        Resuelve la unión acumulada con la misma semántica que extract_patient_features.
+        :param patient_nodes: Pacientes a extraer. Si None, todos los ClinicalCase indexados.
+        :return: dict { patient_uri: [(feature_uri, value), ...] }
+        """
+        if patient_nodes is None:
+            patient_nodes = self.patients
+
+        # Valor de cada part resuelto en una pasada (literal directo o hasValue del nodo intermedio)
+        part_values = {}
+        for part, val_nodes in self.observable_values.items():
+            value = None
+            for val_node in val_nodes:
+                if isinstance(val_node, rdflib.Literal):
+                    value = str(val_node)
+                else:
+                    for o in self.has_values.get(val_node, ()):
+                        value = str(o)
+            if value is not None:
+                part_values[part] = value
+
+        features_by_patient = {}
+        for patient in patient_nodes:
+            features = []
+            for part in self.parts.get(patient, ()):
+                value = part_values.get(part)
+                if value is not None:
+                    for observable in self.observables.get(part, ()):
+                        features.append((str(observable), value))
+                for situation in self.situations.get(part, ()):
+                    features.append((str(situation), True))
+            features_by_patient[str(patient)] = features
+        return features_by_patient
+
+
+def stream_patient_features(ttl_path, rdf_format=None):
+    """
+    Extrae las características de los pacientes leyendo el fichero triple a triple,
+    sin construir un rdflib.Graph completo en memoria.
+
+    :param ttl_path: Ruta al fichero Turtle (.ttl) o N-Triples (.nt)
+    :param rdf_format: 'turtle' o 'nt'. Si None, se deduce de la extensión del fichero.
+    :return: dict { patient_uri: [(feature_uri, value), ...] }
+    """
+    rdf_format = rdf_format or guess_format(str(ttl_path)) or "turtle"
+    sink = _PatientFeatureIndex()
+
+    if rdf_format in ("nt", "ntriples", "nt11"):
+        # El parser N-Triples procesa el fichero línea a línea
+        with open(ttl_path, "rb") as f:
+            W3CNTriplesParser(sink=sink).parse(f)
+    elif rdf_format == "turtle":
+        base_uri = pathlib.Path(ttl_path).absolute().as_uri()
+        parser = SinkParser(RDFSink(sink), baseURI=base_uri, turtle=True)
+        with open(ttl_path, "rb") as f:
+            parser.loadStream(f)
+    else:
+        raise ValueError(f"Formato RDF no soportado para ingesta en streaming: {rdf_format}. Use 'turtle' o 'nt'.")
+
+    return sink.features()
+
+
+def resolve_input_paths(ttl_path):
+    """
+    Normaliza la entrada a una lista ordenada de ficheros.
+    Acepta una ruta, un patrón glob (p.ej. 'data/*.ttl') o una lista de rutas/patrones.
+
+    :return: Lista de rutas (los patrones se expanden en orden alfabético)
+    """
+    patterns = [ttl_path] if isinstance(ttl_path, (str, os.PathLike)) else list(ttl_path)
+    paths = []
+    for pattern in patterns:
+        pattern = str(pattern)
+        if glob.has_magic(pattern):
+            matches = sorted(glob.glob(pattern))
+            if not matches:
+                raise FileNotFoundError(f"El patrón no coincide con ningún fichero: {pattern}")
+            paths.extend(matches)
+        else:
+            paths.append(pattern)
+    return paths
+
+
+def extract_features_from_file(ttl_path, streaming=False):
+    """
+    Extrae las características de todos los pacientes de un único fichero RDF.
+
+    :param ttl_path: Ruta al fichero .ttl (o .nt en modo streaming)
+    :param streaming: Si True, usa stream_patient_features en lugar de cargar el rdflib.Graph
+    :return: dict { patient_uri: [(feature_uri, value), ...] }
+    """
+    if streaming:
+        return stream_patient_features(ttl_path)
+    graph = load_rdf_graph(ttl_path)
+    return index_patient_graph(graph).features()
+
+
+def extract_features_from_files(ttl_paths, streaming=False, n_jobs=None):
+    """
+    Extrae las características de varios ficheros RDF (p.ej. uno por hospital),
+    procesando cada fichero en un proceso independiente, y las fusiona.
+    Si un paciente aparece en varios ficheros se conserva la primera aparición
+    (en el orden de ttl_paths), igual que en filter_features.
+
+    :param ttl_paths: Lista de rutas a ficheros RDF
+    :param streaming: Si True, cada proceso extrae en streaming
+    :param n_jobs: Número de procesos (None = número de CPUs)
+    :return: dict { patient_uri: [(feature_uri, value), ...] }
+    """
+    if len(ttl_paths) == 1:
+        return extract_features_from_file(ttl_paths[0], streaming)
+
+    merged = {}
+    with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+        # map conserva el orden de los ficheros, necesario para la regla de primera aparición
+        for shard in executor.map(extract_features_from_file, ttl_paths, [streaming] * len(ttl_paths)):
+            for patient, features in shard.items():
+                if patient not in merged:
+                    merged[patient] = features
+    return merged
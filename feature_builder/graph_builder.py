@@ -1,36 +1,291 @@
 # feature_builder/graph_builder.py
+from concurrent.futures import ThreadPoolExecutor
+
 import networkx as nx
 import numpy as np
+import scipy.sparse as sp
+
+from sklearn.neighbors import NearestNeighbors
+from sklearn.preprocessing import normalize
+
+from feature_builder.patient_graph import PatientGraph
+
 
-from sklearn.metrics.pairwise import cosine_similarity
+# Memoria máxima (MB) para los bloques de similitud calculados a la vez
+DEFAULT_MEMORY_BUDGET_MB = 512
 
 
-def build_similarity_graph(feature_vectors: np.ndarray,
+def build_similarity_graph(feature_vectors,
                            patient_ids: list,
-                           threshold: float = None) -> nx.Graph:
+                           threshold: float = None,
+                           memory_budget_mb: float = DEFAULT_MEMORY_BUDGET_MB,
+                           n_jobs: int = 1,
+                           knn: int = None,
+                           mutual: bool = False) -> PatientGraph:
     """
     Construye un grafo de similitud a partir de la matriz de características.
+    Por defecto conecta todos los pares por encima del umbral; con knn, cada paciente
+    se conecta solo con sus k vecinos más similares (ver knn_edges).
 
-    :param feature_vectors: Matriz NumPy de forma (n_pacientes, n_características)
+    :param feature_vectors: Matriz NumPy o scipy.sparse de forma (n_pacientes, n_características).
+                            Las matrices dispersas se usan tal cual, sin densificarlas.
     :param patient_ids: Lista de identificadores de pacientes, de longitud n_pacientes
     :param threshold: Umbral opcional para crear aristas. Si None, se crea grafo completo ponderado.
-    :return: Grafo de NetworkX con nodos etiquetados por patient_ids y aristas ponderadas por similitud.
+    :param memory_budget_mb: Memoria máxima para los bloques de la matriz de similitud (ver similarity_edges)
+    :param n_jobs: Número de hilos para calcular bloques en paralelo (o para la búsqueda de vecinos)
+    :param knn: Si se indica, construye un grafo de k vecinos más cercanos en lugar del grafo por umbral.
+    :param mutual: Con knn, conservar solo las aristas en las que cada extremo es vecino del otro.
+    :return: PatientGraph con nodos etiquetados por patient_ids y aristas ponderadas por similitud
+             (usar to_networkx() para obtener el grafo de NetworkX).
+    """
+    if knn is not None:
+        sources, targets, weights = knn_edges(feature_vectors, knn, mutual=mutual,
+                                              threshold=threshold, n_jobs=n_jobs)
+    else:
+        sources, targets, weights = similarity_edges(feature_vectors, threshold,
+                                                     memory_budget_mb=memory_budget_mb, n_jobs=n_jobs)
+    return PatientGraph(patient_ids, sources, targets, weights)
+
+
+def similarity_edges(feature_vectors, threshold: float = None,
+                     memory_budget_mb: float = DEFAULT_MEMORY_BUDGET_MB, n_jobs: int = 1):
+    """
+    Calcula las aristas del grafo de similitud como arrays, sin construir el grafo.
+    Se conserva una arista (i, j), i < j, si su similitud coseno es > 0 y >= threshold.
+
+    La matriz de similitud no se materializa completa: se calcula por bloques de filas
+    (solo la parte j >= i) de forma que los bloques en curso no superen memory_budget_mb,
+    y de cada bloque se conservan únicamente las aristas que superan el umbral.
+    La memoria máxima depende del tamaño de bloque y del número de aristas, no de n².
+
+    :param feature_vectors: Matriz NumPy o scipy.sparse de forma (n_pacientes, n_características)
+    :param threshold: Umbral opcional. Si None, se conservan todas las aristas con similitud > 0.
+    :param memory_budget_mb: Memoria máxima (MB) para los bloques calculados simultáneamente
+    :param n_jobs: Número de hilos (BLAS libera el GIL durante el producto de matrices)
+    :return: (sources, targets, weights): índices de fila de los extremos y pesos, en orden (i, j) creciente
+    """
+    # Normalizar una sola vez: la similitud coseno es el producto escalar de filas unitarias
+    normalized = normalize(feature_vectors)
+    n = normalized.shape[0]
+
+    # Cada fila del bloque ocupa n floats de similitud + n bytes de máscara
+    n_jobs = max(1, n_jobs or 1)
+    bytes_per_row = max(1, n) * (np.dtype(float).itemsize + 1)
+    block_rows = int(memory_budget_mb * 1024 ** 2 // (bytes_per_row * n_jobs))
+    block_rows = min(max(1, block_rows), max(1, n))
+
+    def edges_for_block(start):
+        stop = min(start + block_rows, n)
+        sim_block = normalized[start:stop] @ normalized[start:].T
+        return _threshold_edges(sim_block, start, threshold, col_offset=start)
+
+    starts = range(0, n, block_rows)
+    if n_jobs > 1:
+        with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+            blocks = list(executor.map(edges_for_block, starts))
+    else:
+        blocks = [edges_for_block(start) for start in starts]
+
+    if not blocks:
+        return np.zeros(0, dtype=int), np.zeros(0, dtype=int), np.zeros(0)
+    sources, targets, weights = (np.concatenate(parts) for parts in zip(*blocks))
+    return sources, targets, weights
+
+
+def new_similarity_edges(feature_vectors, first_new: int, threshold: float = None,
+                         memory_budget_mb: float = DEFAULT_MEMORY_BUDGET_MB, n_jobs: int = 1):
+    """
+    Calcula solo las aristas en las que participa alguna fila nueva (índice >= first_new):
+    nuevas contra existentes y nuevas entre sí. Coste O(Δn·n) en lugar de O(n²).
+    Mismas reglas que similarity_edges (similitud > 0 y >= threshold).
+
+    :param feature_vectors: Matriz NumPy o scipy.sparse con las filas existentes seguidas de las nuevas
+    :param first_new: Índice de la primera fila nueva
+    :param threshold: Umbral opcional
+    :param memory_budget_mb: Memoria máxima (MB) para los bloques calculados simultáneamente
+    :param n_jobs: Número de hilos
+    :return: (sources, targets, weights) con sources < targets y targets >= first_new
+    """
+    normalized = normalize(feature_vectors)
+    n = normalized.shape[0]
+    new_rows = normalized[first_new:]
+    n_new = new_rows.shape[0]
+    if n_new == 0:
+        return np.zeros(0, dtype=int), np.zeros(0, dtype=int), np.zeros(0)
+
+    # Bloques de filas de toda la matriz contra las columnas nuevas; la condición
+    # columna > fila de _threshold_edges deja cada par una sola vez
+    n_jobs = max(1, n_jobs or 1)
+    bytes_per_row = n_new * (np.dtype(float).itemsize + 1)
+    block_rows = int(memory_budget_mb * 1024 ** 2 // (bytes_per_row * n_jobs))
+    block_rows = min(max(1, block_rows), n)
+
+    def edges_for_block(start):
+        stop = min(start + block_rows, n)
+        sim_block = normalized[start:stop] @ new_rows.T
+        return _threshold_edges(sim_block, start, threshold, col_offset=first_new)
+
+    starts = range(0, n, block_rows)
+    if n_jobs > 1:
+        with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+            blocks = list(executor.map(edges_for_block, starts))
+    else:
+        blocks = [edges_for_block(start) for start in starts]
+
+    sources, targets, weights = (np.concatenate(parts) for parts in zip(*blocks))
+    return sources, targets, weights
+
+
+def update_similarity_graph(G: PatientGraph,
+                            feature_vectors,
+                            added_vectors,
+                            added_ids: list,
+                            removed_ids=(),
+                            threshold: float = None,
+                            memory_budget_mb: float = DEFAULT_MEMORY_BUDGET_MB,
+                            n_jobs: int = 1):
+    """
+    Actualiza un grafo de similitud por umbral cuando cambia la cohorte, sin recalcular
+    las similitudes entre pacientes que ya estaban.
+
+    Se eliminan los nodos de removed_ids (y sus aristas), se conservan las aristas entre
+    los pacientes restantes y solo se calculan las filas nuevas (ver new_similarity_edges).
+    Los pacientes restantes mantienen su orden y los nuevos se añaden al final.
+    No es válido para grafos kNN, cuyos vecinos cambian al añadir pacientes.
+
+    :param G: Grafo construido con build_similarity_graph (mismo threshold)
+    :param feature_vectors: Matriz de características de los nodos de G, en el orden de G.node_ids
+    :param added_vectors: Matriz de características de los pacientes nuevos (mismo esquema)
+    :param added_ids: Identificadores de los pacientes nuevos
+    :param removed_ids: Identificadores de los pacientes que ya no están en la cohorte
+    :param threshold: Umbral usado al construir G
+    :param memory_budget_mb: Memoria máxima para los bloques de similitud
+    :param n_jobs: Número de hilos
+    :return: (PatientGraph actualizado, matriz de características actualizada)
+    """
+    removed = set(removed_ids)
+    keep = np.array([node not in removed for node in G.node_ids], dtype=bool)
+    kept_ids = [node for node, kept in zip(G.node_ids, keep) if kept]
+
+    # Índices antiguos → nuevos de los nodos conservados
+    new_index = np.cumsum(keep) - 1
+    edge_kept = keep[G.sources] & keep[G.targets]
+    sources = new_index[G.sources[edge_kept]]
+    targets = new_index[G.targets[edge_kept]]
+    weights = G.weights[edge_kept]
+
+    kept_vectors = feature_vectors[np.flatnonzero(keep)]
+    if sp.issparse(kept_vectors) or sp.issparse(added_vectors):
+        feature_vectors = sp.vstack([sp.csr_matrix(kept_vectors), sp.csr_matrix(added_vectors)]).tocsr()
+    else:
+        feature_vectors = np.vstack([kept_vectors, added_vectors])
+
+    new_sources, new_targets, new_weights = new_similarity_edges(feature_vectors, len(kept_ids), threshold,
+                                                                 memory_budget_mb=memory_budget_mb, n_jobs=n_jobs)
+    graph = PatientGraph(kept_ids + list(added_ids),
+                         np.concatenate([sources, new_sources]),
+                         np.concatenate([targets, new_targets]),
+                         np.concatenate([weights, new_weights]))
+    return graph, feature_vectors
+
+
+def knn_edges(feature_vectors, k: int, mutual: bool = False, threshold: float = None, n_jobs: int = None):
+    """
+    Calcula las aristas de un grafo de k vecinos más cercanos por similitud coseno,
+    sin calcular la matriz de similitud completa.
+
+    Sobre vectores normalizados, la distancia euclídea es monótona con la similitud coseno
+    (||a - b||² = 2 - 2·cos), por lo que los vecinos se buscan con un índice de
+    NearestNeighbors (árbol KD/Ball para matrices densas, búsqueda por bloques para
+    dispersas). El grafo resultante tiene O(n·k) aristas y el peso de cada arista es
+    la similitud coseno; se mantienen las reglas peso > 0 y peso >= threshold.
+
+    :param feature_vectors: Matriz NumPy o scipy.sparse de forma (n_pacientes, n_características)
+    :param k: Número de vecinos por paciente
+    :param mutual: Si True, solo aristas (i, j) donde j es vecino de i e i es vecino de j.
+                   Si False, basta con que uno de los dos sea vecino del otro.
+    :param threshold: Umbral opcional adicional sobre la similitud
+    :param n_jobs: Número de procesos para la búsqueda de vecinos (None = 1)
+    :return: (sources, targets, weights) con sources < targets, en orden (i, j) creciente
+    """
+    normalized = normalize(feature_vectors)
+    n = normalized.shape[0]
+    if n < 2 or k < 1:
+        return np.zeros(0, dtype=int), np.zeros(0, dtype=int), np.zeros(0)
+
+    # Sin argumento, kneighbors excluye a cada paciente de su propia lista de vecinos
+    n_neighbors = min(k, n - 1)
+    index = NearestNeighbors(n_neighbors=n_neighbors, n_jobs=n_jobs).fit(normalized)
+    neighbors = index.kneighbors(return_distance=False)
+
+    sources, targets = np.repeat(np.arange(n), n_neighbors), neighbors.ravel()
+    low, high = np.minimum(sources, targets), np.maximum(sources, targets)
+    pair_keys, counts = np.unique(low * n + high, return_counts=True)
+    if mutual:
+        pair_keys = pair_keys[counts == 2]
+    sources, targets = pair_keys // n, pair_keys % n
+
+    # Peso = similitud coseno exacta (producto escalar de las filas normalizadas)
+    if sp.issparse(normalized):
+        weights = np.asarray(normalized[sources].multiply(normalized[targets]).sum(axis=1)).ravel()
+    else:
+        weights = np.einsum("ij,ij->i", normalized[sources], normalized[targets])
+
+    mask = weights > 0
+    if threshold is not None:
+        mask &= weights >= threshold
+    return sources[mask], targets[mask], weights[mask]
+
+
+def graph_from_edges(patient_ids: list, sources, targets, weights) -> nx.Graph:
+    """
+    Construye el grafo de NetworkX a partir de los arrays de aristas, en bloque.
+
+    :param patient_ids: Lista de identificadores de pacientes (índice → nodo)
+    :param sources: Índices del primer extremo de cada arista
+    :param targets: Índices del segundo extremo de cada arista
+    :param weights: Peso de cada arista
+    :return: Grafo de NetworkX con nodos etiquetados por patient_ids
     """
     G = nx.Graph()
+    G.add_nodes_from(patient_ids)
+
+    ids = np.asarray(patient_ids, dtype=object)
+    G.add_weighted_edges_from(zip(ids[sources], ids[targets], np.asarray(weights).tolist()))
+    return G
+
 
-    # Agregar nodos de pacientes
-    for pid in patient_ids:
-        G.add_node(pid)
+def _threshold_edges(sim_block, row_offset, threshold, col_offset=0):
+    """
+    Extrae las aristas del triángulo superior de un bloque de la matriz de similitud.
+
+    :param sim_block: Bloque denso o scipy.sparse con las filas [row_offset, ...) y las
+                      columnas [col_offset, ...) de la matriz de similitud
+    :param row_offset: Índice global de la primera fila del bloque
+    :param threshold: Umbral opcional (ver similarity_edges)
+    :param col_offset: Índice global de la primera columna del bloque
+    :return: (sources, targets, weights)
+    """
+    if sp.issparse(sim_block):
+        # Producto de matrices dispersas: filtrar directamente los valores almacenados
+        sim_block = sim_block.tocsr()
+        sim_block.sort_indices()
+        coo = sim_block.tocoo()
+        local_rows, local_cols, values = coo.row, coo.col, coo.data
+        mask = values > 0
+        if threshold is not None:
+            mask &= values >= threshold
+        mask &= local_cols + col_offset > local_rows + row_offset
+        return local_rows[mask] + row_offset, local_cols[mask] + col_offset, values[mask]
 
-    # Calcular similitud entre vectores (coseno)
-    sim_matrix = cosine_similarity(feature_vectors)
+    sim_block = np.asarray(sim_block)
+    rows = np.arange(row_offset, row_offset + sim_block.shape[0])
+    cols = np.arange(col_offset, col_offset + sim_block.shape[1])
 
-    # Agregar aristas según umbral
-    n = len(patient_ids)
-    for i in range(n):
-        for j in range(i + 1, n):
-            weight = sim_matrix[i, j]
-            if weight > 0 and (threshold is None or weight >= threshold):
-                G.add_edge(patient_ids[i], patient_ids[j], weight=weight)
+    mask = sim_block > 0
+    if threshold is not None:
+        mask &= sim_block >= threshold
+    mask &= cols[None, :] > rows[:, None]
 
-    return G
\ No newline at end of file
+    local_rows, local_cols = np.nonzero(mask)
+    return local_rows + row_offset, local_cols + col_offset, sim_block[local_rows, local_cols]
@@ -0,0 +1,115 @@
+# feature_builder/patient_graph.py
+import networkx as nx
+import numpy as np
+import scipy.sparse as sp
+
+
+class PatientGraph:
+    """
+    Grafo de similitud compacto basado en arrays.
+
+    Los nodos se identifican por enteros 0..n-1 y `node_ids` es la tabla entero → URI
+    del paciente. Cada arista no dirigida (i, j), i < j, se guarda una sola vez en
+    `sources`, `targets` (int32) y `weights` (float32). La matriz de adyacencia CSR
+    simétrica se construye bajo demanda, y el grafo de NetworkX solo se materializa
+    con to_networkx() para el código que lo necesite.
+    """
+
+    def __init__(self, node_ids, sources, targets, weights):
+        self.node_ids = list(node_ids)
+        self.sources = np.asarray(sources, dtype=np.int32)
+        self.targets = np.asarray(targets, dtype=np.int32)
+        self.weights = np.asarray(weights, dtype=np.float32)
+        self._adjacency = None
+        self._node_index = None
+
+    def number_of_nodes(self) -> int:
+        return len(self.node_ids)
+
+    def number_of_edges(self) -> int:
+        return len(self.sources)
+
+    def nodes(self) -> list:
+        return list(self.node_ids)
+
+    @property
+    def node_index(self) -> dict:
+        """Diccionario URI → índice entero."""
+        if self._node_index is None:
+            self._node_index = {node: i for i, node in enumerate(self.node_ids)}
+        return self._node_index
+
+    @property
+    def adjacency(self) -> sp.csr_matrix:
+        """Matriz de adyacencia ponderada simétrica (CSR, float32)."""
+        if self._adjacency is None:
+            n = self.number_of_nodes()
+            rows = np.concatenate([self.sources, self.targets])
+            cols = np.concatenate([self.targets, self.sources])
+            data = np.concatenate([self.weights, self.weights])
+            self._adjacency = sp.csr_matrix((data, (rows, cols)), shape=(n, n))
+        return self._adjacency
+
+    def degrees(self) -> np.ndarray:
+        """Grado ponderado de cada nodo (float64)."""
+        n = self.number_of_nodes()
+        weights = self.weights.astype(float)
+        return (np.bincount(self.sources, weights=weights, minlength=n)
+                + np.bincount(self.targets, weights=weights, minlength=n))
+
+    def membership(self, partition: dict) -> np.ndarray:
+        """
+        Convierte una partición { nodo: comunidad } en un array de enteros por índice de nodo.
+        Los nodos sin comunidad reciben -1.
+        """
+        labels = np.full(self.number_of_nodes(), -1, dtype=np.int64)
+        index = self.node_index
+        for node, comm_id in partition.items():
+            i = index.get(node)
+            if i is not None:
+                labels[i] = comm_id
+        return labels
+
+    def to_networkx(self) -> nx.Graph:
+        """Materializa el grafo como nx.Graph con nodos etiquetados por URI y atributo 'weight'."""
+        G = nx.Graph()
+        G.add_nodes_from(self.node_ids)
+        ids = np.asarray(self.node_ids, dtype=object)
+        G.add_weighted_edges_from(zip(ids[self.sources], ids[self.targets], self.weights.tolist()))
+        return G
+
+    def to_igraph(self):
+        """Construye el grafo de igraph (atributos 'name' y 'weight') sin pasar por NetworkX."""
+        from igraph_converter import igraph_from_edges
+        return igraph_from_edges(self.node_ids, self.sources, self.targets, self.weights)
+
+    def state_arrays(self, prefix=""):
+        """Arrays del grafo (sin objetos Python), para guardarlos con np.savez."""
+        return {
+            f"{prefix}node_ids": np.array(self.node_ids, dtype=str),
+            f"{prefix}sources": self.sources,
+            f"{prefix}targets": self.targets,
+            f"{prefix}weights": self.weights,
+        }
+
+    @classmethod
+    def from_state_arrays(cls, arrays, prefix="") -> "PatientGraph":
+        """Reconstruye el grafo a partir de state_arrays()."""
+        return cls(arrays[f"{prefix}node_ids"].tolist(), arrays[f"{prefix}sources"],
+                   arrays[f"{prefix}targets"], arrays[f"{prefix}weights"])
+
+    @classmethod
+    def from_networkx(cls, G: nx.Graph, weight: str = "weight") -> "PatientGraph":
+        """Construye un PatientGraph a partir de un grafo de NetworkX no dirigido."""
+        node_ids = list(G.nodes())
+        index = {node: i for i, node in enumerate(node_ids)}
+        sources, targets, weights = [], [], []
+        for u, v, w in G.edges(data=weight, default=1.0):
+            i, j = index[u], index[v]
+            sources.append(min(i, j))
+            targets.append(max(i, j))
+            weights.append(w)
+        return cls(node_ids, sources, targets, weights)
+
+    def __repr__(self):
+        return f"PatientGraph with {self.number_of_nodes()} nodes and {self.number_of_edges()} edges"
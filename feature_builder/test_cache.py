@@ -0,0 +1,80 @@
+import shutil
+
+import numpy as np
+import pytest
+
+import feature_builder.cache as cache
+import feature_builder.vectorizer as vectorizer
+from feature_builder.vectorizer import build_feature_vectors
+
+NEW_PATIENT = """
+d:Case_900 a ns3:ClinicalCase ; ns1:hasPart d:Case_900_age .
+d:Case_900_age ns1:hasObservable sct:397669002 ; ns1:hasObservableValue [ ns2:hasValue 40 ] .
+"""
+
+
+@pytest.fixture
+def stores(monkeypatch, tmp_path):
+    """Caché en un directorio temporal; devuelve la lista de claves escritas (una por fallo de caché)."""
+    monkeypatch.setattr(cache, "DEFAULT_CACHE_DIR", str(tmp_path / "cache"))
+    written = []
+
+    def store_cached(key, arrays, *args, **kwargs):
+        written.append(key)
+        return cache.store_cached(key, arrays, *args, **kwargs)
+
+    monkeypatch.setattr(vectorizer, "store_cached", store_cached)
+    return written
+
+
+def test_hit_and_miss(patients_ttl, stores):
+    feature_vectors, patient_ids = build_feature_vectors(patients_ttl)
+    assert len(stores) == 1
+
+    cached_vectors, cached_ids = build_feature_vectors(patients_ttl)
+    assert len(stores) == 1
+    assert cached_ids == patient_ids
+    np.testing.assert_array_equal(cached_vectors, feature_vectors)
+
+    # Otros parámetros de extracción: otra entrada
+    build_feature_vectors(patients_ttl, streaming=True)
+    assert len(stores) == 2
+    assert cache.load_cached("0" * 40) is None
+
+
+def test_changed_content_invalidates_entry(patients_ttl, stores, tmp_path):
+    ttl_path = tmp_path / "patients.ttl"
+    shutil.copy(patients_ttl, ttl_path)
+    _, patient_ids = build_feature_vectors(str(ttl_path))
+
+    with open(ttl_path, "a", encoding="utf-8") as f:
+        f.write(NEW_PATIENT)
+    _, updated_ids = build_feature_vectors(str(ttl_path))
+
+    assert len(stores) == 2 and stores[0] != stores[1]
+    assert len(updated_ids) == len(patient_ids) + 1
+
+
+def test_eviction_keeps_recent_entries(tmp_path):
+    arrays = {"x": np.zeros(1000)}
+    for i in range(3):
+        cache.store_cached(f"key{i}", arrays, cache_dir=str(tmp_path), max_bytes=20000)
+    assert cache.load_cached("key2", cache_dir=str(tmp_path)) is not None
+    assert cache.load_cached("key0", cache_dir=str(tmp_path)) is None
+
+
+def test_damaged_entry_is_a_miss(patients_ttl, stores):
+    feature_vectors, patient_ids = build_feature_vectors(patients_ttl)
+    entry = cache._entry_path(stores[0])
+
+    # Entrada truncada (p.ej. un proceso interrumpido) y entrada que no es un .npz
+    for damaged in (open(entry, "rb").read()[:200], b"not a zip file"):
+        with open(entry, "wb") as f:
+            f.write(damaged)
+        assert cache.load_cached(stores[0]) is None
+
+        # Al volver a leer el TTL el orden de los pacientes puede cambiar
+        rebuilt_vectors, rebuilt_ids = build_feature_vectors(patients_ttl)
+        order = [rebuilt_ids.index(pid) for pid in patient_ids]
+        np.testing.assert_allclose(rebuilt_vectors[order], feature_vectors)
+    assert len(stores) == 3
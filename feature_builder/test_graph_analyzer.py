@@ -0,0 +1,121 @@
+import os
+
+import pytest
+import rdflib
+
+from feature_builder.graph_analyzer import (NS1, extract_features_from_files, extract_patient_features,
+                                            extract_patient_nodes, load_rdf_graph, resolve_input_paths,
+                                            stream_patient_features)
+
+AGE = "http://snomed.info/id/397669002"
+SEX = "http://snomed.info/id/263495000"
+ADM = "http://snomed.info/id/adm"
+DIS = "http://snomed.info/id/dis"
+ISCHEMIC = "http://snomed.info/id/422504002"
+HEMORRHAGIC = "http://snomed.info/id/274100004"
+CASE = "http://resqplus-resources/ontologies/resqplus-data#Case_{:03d}"
+
+PREFIXES = """@prefix ns1: <http://www.semanticweb.org/catimc/SemanticCommonDataModel#> .
+@prefix ns2: <http://purl.org/biotop/btl2.owl#> .
+@prefix ns3: <http://www.semanticweb.org/catimc/resqplus#> .
+@prefix d: <http://resqplus-resources/ontologies/resqplus-data#> .
+@prefix sct: <http://snomed.info/id/> .
+"""
+
+
+def _shard(patients):
+    """TTL con un paciente por (número, edad)."""
+    lines = [PREFIXES]
+    for number, age in patients:
+        case = f"d:Case_{number:03d}"
+        lines.append(f"{case} a ns3:ClinicalCase ; ns1:hasPart {case}_age .")
+        lines.append(f"{case}_age ns1:hasObservable sct:397669002 ; ns1:hasObservableValue [ ns2:hasValue {age} ] .")
+    return "\n".join(lines) + "\n"
+
+
+def _reference_features(graph):
+    """
+    Extracción de referencia con consultas anidadas al rdflib.Graph, paciente a paciente
+    (el procedimiento original, independiente de los índices de graph_analyzer).
+    """
+    patients = {s for s, o in graph.subject_objects(rdflib.RDF.type)
+                if isinstance(o, rdflib.URIRef) and o.split('#')[-1].split('/')[-1] == 'ClinicalCase'}
+    features_by_patient = {}
+    for patient in patients:
+        features = []
+        for part in graph.objects(patient, NS1.hasPart):
+            for observable in graph.objects(part, NS1.hasObservable):
+                value = None
+                for val_node in graph.objects(part, NS1.hasObservableValue):
+                    if isinstance(val_node, rdflib.Literal):
+                        value = str(val_node)
+                    else:
+                        for p, o in graph.predicate_objects(val_node):
+                            if str(p).split('#')[-1].split('/')[-1] == 'hasValue':
+                                value = str(o)
+                if value is not None:
+                    features.append((str(observable), value))
+            for situation in graph.objects(part, NS1.representsSituation):
+                features.append((str(situation), True))
+        features_by_patient[str(patient)] = features
+    return features_by_patient
+
+
+def _sorted(features):
+    # El orden de las partes de un paciente depende del orden de los triples en el rdflib.Graph
+    return {patient: sorted(values, key=str) for patient, values in features.items()}
+
+
+def test_streaming_matches_reference_extraction(patients_ttl):
+    expected = _reference_features(load_rdf_graph(patients_ttl))
+    assert _sorted(stream_patient_features(patients_ttl)) == _sorted(expected)
+
+
+def test_indexed_graph_extraction_matches_reference(patients_ttl):
+    graph = load_rdf_graph(patients_ttl)
+    expected = _reference_features(graph)
+
+    patient_nodes = extract_patient_nodes(graph)
+    assert sorted(map(str, patient_nodes)) == sorted(expected)
+    assert _sorted(extract_patient_features(graph, patient_nodes)) == _sorted(expected)
+
+
+def test_streaming_ntriples_matches_turtle(patients_ttl, tmp_path):
+    nt_path = tmp_path / "patients.nt"
+    rdflib.Graph().parse(patients_ttl, format="turtle").serialize(nt_path, format="nt", encoding="utf-8")
+    assert _sorted(stream_patient_features(nt_path)) == _sorted(stream_patient_features(patients_ttl))
+
+
+def test_blank_node_and_literal_values(patients_ttl):
+    features = _sorted(stream_patient_features(patients_ttl))
+
+    assert len(features) == 24
+    # Valores en nodo en blanco anónimo ([ ns2:hasValue 55 ]), en nodo etiquetado (_:age2)
+    # y como literal directo ("62"); Case_003 no tiene sexo
+    assert features[CASE.format(1)] == sorted([(AGE, "55"), (SEX, "Male"), (ISCHEMIC, True),
+                                               (ADM, "20"), (DIS, "60")], key=str)
+    assert features[CASE.format(2)] == sorted([(AGE, "87"), (SEX, "Male"), (HEMORRHAGIC, True),
+                                               (ADM, "85"), (DIS, "15")], key=str)
+    assert features[CASE.format(3)] == sorted([(AGE, "67"), (ISCHEMIC, True), (ADM, "30"), (DIS, "5")], key=str)
+    assert features[CASE.format(4)] == sorted([(AGE, "62"), (SEX, "Male"), (ISCHEMIC, True),
+                                               (ADM, "65"), (DIS, "10")], key=str)
+    # El sujeto que no es ClinicalCase no aparece
+    assert not any("Hospital" in patient for patient in features)
+
+
+@pytest.mark.parametrize("streaming", [False, True])
+def test_multi_file_glob_keeps_first_occurrence(tmp_path, streaming):
+    # Case_002 aparece en los dos hospitales con edades distintas
+    (tmp_path / "hospital_b.ttl").write_text(_shard([(2, 99), (3, 70)]), encoding="utf-8")
+    (tmp_path / "hospital_a.ttl").write_text(_shard([(1, 50), (2, 60)]), encoding="utf-8")
+
+    paths = resolve_input_paths(str(tmp_path / "hospital_*.ttl"))
+    assert [os.path.basename(p) for p in paths] == ["hospital_a.ttl", "hospital_b.ttl"]
+
+    features = extract_features_from_files(paths, streaming=streaming, n_jobs=2)
+    assert sorted(features) == [CASE.format(1), CASE.format(2), CASE.format(3)]
+    assert features[CASE.format(2)] == [(AGE, "60")]
+
+    # En orden inverso gana el otro fichero
+    features = extract_features_from_files(paths[::-1], streaming=streaming, n_jobs=2)
+    assert features[CASE.format(2)] == [(AGE, "99")]
@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+from sklearn.metrics.pairwise import cosine_similarity
+
+from feature_builder.graph_builder import DEFAULT_MEMORY_BUDGET_MB, similarity_edges
+from feature_builder.vectorizer import FeatureVectorizer
+
+
+def _reference_edges(feature_vectors, threshold):
+    """Doble bucle original de build_similarity_graph: pares i < j con peso > 0 y >= threshold."""
+    sim_matrix = cosine_similarity(feature_vectors)
+    n = sim_matrix.shape[0]
+    sources, targets, weights = [], [], []
+    for i in range(n):
+        for j in range(i + 1, n):
+            weight = sim_matrix[i, j]
+            if weight > 0 and (threshold is None or weight >= threshold):
+                sources.append(i)
+                targets.append(j)
+                weights.append(weight)
+    return sources, targets, weights
+
+
+@pytest.mark.parametrize("sparse", [False, True])
+@pytest.mark.parametrize("threshold", [None, 0.5, 0.9])
+def test_similarity_edges_match_reference_loop(sparse, threshold, patient_features):
+    feature_vectors, _ = FeatureVectorizer(sparse=sparse).fit_transform(patient_features)
+    expected_sources, expected_targets, expected_weights = _reference_edges(feature_vectors, threshold)
+
+    # Presupuesto por defecto, y un presupuesto mínimo para forzar varios bloques de filas, con y sin hilos
+    for memory_budget_mb, n_jobs in ((DEFAULT_MEMORY_BUDGET_MB, 1), (1e-4, 1), (1e-4, 2)):
+        sources, targets, weights = similarity_edges(feature_vectors, threshold,
+                                                     memory_budget_mb=memory_budget_mb, n_jobs=n_jobs)
+        np.testing.assert_array_equal(sources, expected_sources)
+        np.testing.assert_array_equal(targets, expected_targets)
+        np.testing.assert_allclose(weights, expected_weights)
@@ -0,0 +1,120 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.preprocessing import StandardScaler
+
+from feature_builder.vectorizer import FeatureVectorizer, _parse_rows
+
+
+def _pandas_encoding(patient_features, prefix_sep=':'):
+    """Codificación original con pandas (fillna(0) + get_dummies + StandardScaler), como referencia."""
+    rows, patient_ids, _ = _parse_rows(patient_features)
+    df = pd.DataFrame(rows, index=patient_ids).fillna(0)
+    numeric_cols = df.select_dtypes(include=[np.number]).columns.tolist()
+    categorical_cols = df.select_dtypes(include=['object']).columns.tolist()
+    if categorical_cols:
+        df_cat = pd.get_dummies(df[categorical_cols], prefix=categorical_cols, prefix_sep=prefix_sep)
+        df = pd.concat([df[numeric_cols], df_cat], axis=1)
+    if numeric_cols:
+        df[numeric_cols] = StandardScaler().fit_transform(df[numeric_cols])
+    return df.to_numpy(dtype=float), patient_ids, df.columns.tolist()
+
+
+# Categórica con texto, un 0 observado ('0' / '0.0') y pacientes sin valor (0 de relleno)
+MIXED_FEATURES = {
+    "p1": [("mix", "a"), ("age", "70")],
+    "p2": [("mix", "0"), ("age", "82")],
+    "p3": [("age", "65"), ("stroke", True)],
+    "p4": [("mix", "0.0"), ("age", "70"), ("stroke", True)],
+    "p5": [("mix", "2"), ("sex", "F")],
+    "p6": [("sex", "M"), ("age", "91")],
+}
+
+
+@pytest.mark.parametrize("order", [
+    ["p1", "p2", "p3", "p4", "p5", "p6"],
+    ["p3", "p4", "p1", "p2", "p6", "p5"],
+])
+def test_dense_matches_pandas_encoding_on_mixed_types(order):
+    patient_features = {patient: MIXED_FEATURES[patient] for patient in order}
+    expected, expected_ids, expected_columns = _pandas_encoding(patient_features)
+
+    vectorizer = FeatureVectorizer()
+    feature_vectors, patient_ids = vectorizer.fit_transform(patient_features)
+
+    assert patient_ids == expected_ids
+    assert vectorizer.columns == expected_columns
+    np.testing.assert_allclose(feature_vectors, expected)
+
+
+def test_zero_level_is_shared_by_observed_and_missing_values():
+    # p3 (sin valor) va primero: pandas nombra el nivel 'mix:0' y le une el '0.0' observado de p4
+    order = ["p3", "p1", "p2", "p4", "p5", "p6"]
+    vectorizer = FeatureVectorizer()
+    feature_vectors, patient_ids = vectorizer.fit_transform({patient: MIXED_FEATURES[patient] for patient in order})
+    zero_columns = [j for j, column in enumerate(vectorizer.columns) if column in ("mix:0", "mix:0.0")]
+    assert [vectorizer.columns[j] for j in zero_columns] == ["mix:0"]
+    # p3 y p6 (sin valor), p2 ('0') y p4 ('0.0') caen en el mismo nivel
+    assert feature_vectors[:, zero_columns[0]].tolist() == [1, 0, 1, 1, 0, 1]
+
+
+def _pandas_sparse_encoding(patient_features, prefix_sep=':'):
+    """
+    Referencia con pandas del modo disperso: sin nivel de relleno en las categóricas,
+    numéricas escaladas sin centrar e indicadores de situación sin escalar.
+    """
+    rows, patient_ids, situations = _parse_rows(patient_features)
+    df = pd.DataFrame(rows, index=patient_ids)
+    categorical_cols = [c for c in df.columns if df[c].map(lambda v: isinstance(v, str)).any()]
+    numeric_cols = [c for c in df.columns if c not in categorical_cols]
+    df_num = df[numeric_cols].astype(float).fillna(0)
+    scaled = [c for c in numeric_cols if c not in situations]
+    if scaled:
+        df_num[scaled] = StandardScaler(with_mean=False).fit_transform(df_num[scaled])
+    df_cat = pd.get_dummies(df[categorical_cols], prefix=categorical_cols, prefix_sep=prefix_sep, dtype=float)
+    return pd.concat([df_num, df_cat], axis=1), patient_ids
+
+
+def test_dense_matches_pandas_encoding_on_ttl_fixture(patient_features):
+    expected, expected_ids, expected_columns = _pandas_encoding(patient_features)
+
+    vectorizer = FeatureVectorizer()
+    feature_vectors, patient_ids = vectorizer.fit_transform(patient_features)
+
+    assert patient_ids == expected_ids
+    assert vectorizer.columns == expected_columns
+    np.testing.assert_allclose(feature_vectors, expected)
+
+
+@pytest.mark.parametrize("features", ["ttl", "mixed"])
+def test_sparse_matches_pandas_encoding(features, patient_features):
+    patient_features = patient_features if features == "ttl" else MIXED_FEATURES
+    expected, expected_ids = _pandas_sparse_encoding(patient_features)
+
+    vectorizer = FeatureVectorizer(sparse=True)
+    feature_vectors, patient_ids = vectorizer.fit_transform(patient_features)
+
+    assert patient_ids == expected_ids
+    assert sorted(vectorizer.columns) == sorted(expected.columns)
+    np.testing.assert_allclose(feature_vectors.toarray(), expected[vectorizer.columns].to_numpy(dtype=float))
+
+
+@pytest.mark.parametrize("sparse", [False, True])
+def test_save_load_round_trip(sparse, patient_features, tmp_path):
+    patients = list(patient_features)
+    cohort = {patient: patient_features[patient] for patient in patients[:18]}
+    new = {patient: patient_features[patient] for patient in patients[18:]}
+    vectorizer = FeatureVectorizer(sparse=sparse).fit(cohort)
+
+    path = tmp_path / "vectorizer.npz"
+    vectorizer.save(path)
+    loaded = FeatureVectorizer.load(path)
+
+    assert loaded.sparse == sparse
+    assert loaded.columns == vectorizer.columns
+    expected, expected_ids = vectorizer.transform(new)
+    feature_vectors, patient_ids = loaded.transform(new)
+    assert patient_ids == expected_ids
+    if sparse:
+        expected, feature_vectors = expected.toarray(), feature_vectors.toarray()
+    np.testing.assert_array_equal(feature_vectors, expected)
@@ -1,23 +1,65 @@
 # feature_builder/vectorizer.py
 import numpy as np
 import pandas as pd
+import scipy.sparse as sp
 from .config import NAMESPACES
 from sklearn.preprocessing import StandardScaler
-from rdflib import URIRef
-from feature_builder.graph_analyzer import extract_patient_nodes, extract_patient_features, load_rdf_graph
+from feature_builder.graph_analyzer import extract_features_from_files, resolve_input_paths
+from feature_builder.cache import cache_key, load_cached, store_cached
 
 
-def build_feature_vectors(ttl_path):
+def build_feature_vectors(ttl_path, streaming=False, use_cache=True, n_jobs=None, sparse=False,
+                          vectorizer=None):
     """
     Construye los vectores de características de los pacientes a partir del archivo RDF.
 
-    :param ttl_path: Ruta al archivo .ttl con el grafo RDF
+    :param ttl_path: Ruta al archivo .ttl con el grafo RDF, patrón glob o lista de rutas.
+                     Con varios ficheros, cada uno se procesa en un proceso independiente.
+    :param streaming: Si True, lee el fichero triple a triple sin construir el rdflib.Graph completo.
+    :param use_cache: Si True, reutiliza la matriz guardada en la caché en disco para el mismo
+                      contenido de fichero y parámetros (ver feature_builder.cache).
+    :param n_jobs: Número de procesos para la ingesta de varios ficheros (None = número de CPUs)
+    :param sparse: Si True, devuelve una matriz scipy.sparse CSR (ver FeatureVectorizer)
+    :param vectorizer: FeatureVectorizer opcional. Si ya está ajustado, solo se aplica transform()
+                       con su esquema (sin caché); si no, se ajusta aquí y queda disponible para
+                       guardarlo con save(). Su modo denso/disperso tiene prioridad sobre `sparse`.
     :return: (feature_vectors, patient_ids)
     """
-    graph = load_rdf_graph(ttl_path)
-    patient_nodes = extract_patient_nodes(graph)
-    patient_features = extract_patient_features(graph, patient_nodes)
-    feature_vectors, patient_ids = _vectorize_features(patient_features)
+    ttl_paths = resolve_input_paths(ttl_path)
+
+    if vectorizer is None:
+        vectorizer = FeatureVectorizer(sparse=sparse)
+    sparse = vectorizer.sparse
+    fit = not vectorizer.is_fitted
+    use_cache = use_cache and fit
+
+    if use_cache:
+        key = cache_key(ttl_paths, stage="feature_vectors", streaming=streaming, sparse=sparse)
+        cached = load_cached(key)
+        if cached is not None:
+            if sparse:
+                feature_vectors = sp.csr_matrix((cached["data"], cached["indices"], cached["indptr"]),
+                                                shape=tuple(cached["shape"]))
+            else:
+                feature_vectors = cached["feature_vectors"]
+            vectorizer.set_state_arrays(cached, prefix="vectorizer_")
+            return feature_vectors, cached["patient_ids"].tolist()
+
+    patient_features = extract_features_from_files(ttl_paths, streaming=streaming, n_jobs=n_jobs)
+    if fit:
+        feature_vectors, patient_ids = vectorizer.fit_transform(patient_features)
+    else:
+        feature_vectors, patient_ids = vectorizer.transform(patient_features)
+
+    if use_cache:
+        if sparse:
+            arrays = {"data": feature_vectors.data, "indices": feature_vectors.indices,
+                      "indptr": feature_vectors.indptr, "shape": np.array(feature_vectors.shape)}
+        else:
+            arrays = {"feature_vectors": feature_vectors}
+        arrays["patient_ids"] = np.array(patient_ids, dtype=str)
+        arrays.update(vectorizer.state_arrays(prefix="vectorizer_"))
+        store_cached(key, arrays)
 
     # if sort:
     #    patient_ids = sorted(patient_ids)
@@ -31,14 +73,275 @@ def _vectorize_features(patient_features):
     :param patient_features: dict { patient_uri: [(feature_uri, value), ...] }
     :return: (feature_vectors (np.ndarray), patient_ids (list))
     """
-    # Preparar filas de datos y lista de pacientes
+    return FeatureVectorizer().fit_transform(patient_features)
+
+
+def _vectorize_features_sparse(patient_features):
+    """
+    Variante dispersa de _vectorize_features (ver FeatureVectorizer con sparse=True).
+    :param patient_features: dict { patient_uri: [(feature_uri, value), ...] }
+    :return: (feature_vectors (scipy.sparse.csr_matrix), patient_ids (list), columns (list))
+    """
+    vectorizer = FeatureVectorizer(sparse=True)
+    feature_vectors, patient_ids = vectorizer.fit_transform(patient_features)
+    return feature_vectors, patient_ids, vectorizer.columns
+
+
+class FeatureVectorizer:
+    """
+    Codificador de características ajustable y persistente.
+
+    Guarda el esquema de columnas, los niveles de las categóricas (one-hot) y las
+    estadísticas del escalado, de modo que nuevos pacientes se codifican con
+    transform() contra el esquema congelado, sin reajustar sobre toda la cohorte.
+    Las características o niveles no vistos en fit() se ignoran.
+
+    Modo denso (por defecto): misma codificación que el DataFrame con fillna(0),
+    pd.get_dummies y StandardScaler sobre las columnas numéricas. Con fill_categorical=False
+    solo se rellenan las numéricas: las categóricas ausentes dan dummies a cero, sin el
+    nivel '<feature><sep>0' (codificación original del clustering).
+
+    Modo disperso (sparse=True): matriz CSR construida directamente desde las tuplas.
+    Para conservar la dispersión:
+      - Las columnas numéricas se escalan a varianza unidad sin centrar (el centrado
+        convertiría en no nulos todos los valores ausentes).
+      - Las situaciones clínicas (valor True) son indicadores 0/1 y no se escalan.
+      - Las categóricas generan una columna por nivel observado; los pacientes sin
+        valor no tienen columna propia (en la densa, '<feature><sep>0').
+
+    :param sparse: Si True, transform() devuelve scipy.sparse.csr_matrix
+    :param prefix_sep: Separador entre característica y nivel en las columnas one-hot
+    :param fill_categorical: Solo modo denso: si False, las categóricas ausentes no se rellenan con 0
+    """
+
+    def __init__(self, sparse=False, prefix_sep=':', fill_categorical=True):
+        self.sparse = sparse
+        self.prefix_sep = prefix_sep
+        self.fill_categorical = fill_categorical
+        self.columns = None
+        self.categorical = None
+        self.numeric_idx = None
+        self.mean = None
+        self.scale = None
+
+    @property
+    def is_fitted(self):
+        return self.columns is not None
+
+    def fit(self, patient_features):
+        """
+        Ajusta el esquema y el escalado.
+        :param patient_features: dict { patient_uri: [(feature_uri, value), ...] }
+        :return: self
+        """
+        rows, patient_ids, situations = _parse_rows(patient_features)
+        if self.sparse:
+            self._fit_sparse(rows, situations)
+        else:
+            self._fit_dense(rows, patient_ids)
+        return self
+
+    def fit_transform(self, patient_features):
+        return self.fit(patient_features).transform(patient_features)
+
+    def transform(self, patient_features):
+        """
+        Codifica pacientes con el esquema ajustado.
+        :param patient_features: dict { patient_uri: [(feature_uri, value), ...] }
+        :return: (feature_vectors, patient_ids)
+        """
+        if not self.is_fitted:
+            raise ValueError("El FeatureVectorizer no está ajustado. Llame antes a fit().")
+
+        rows, patient_ids, _ = _parse_rows(patient_features)
+        feature_vectors = self._encode(rows)
+
+        if self.sparse:
+            scale = np.ones(len(self.columns))
+            scale[self.numeric_idx] = 1.0 / self.scale
+            feature_vectors = (feature_vectors @ sp.diags(scale)).tocsr()
+        else:
+            feature_vectors = feature_vectors.toarray()
+            feature_vectors[:, self.numeric_idx] = (feature_vectors[:, self.numeric_idx] - self.mean) / self.scale
+
+        return feature_vectors, patient_ids
+
+    def save(self, path):
+        """Guarda el esquema y el escalado en un fichero .npz."""
+        np.savez(path, **self.state_arrays())
+
+    @classmethod
+    def load(cls, path):
+        """Carga un FeatureVectorizer guardado con save()."""
+        with np.load(path, allow_pickle=False) as data:
+            return cls.from_state_arrays({name: data[name] for name in data.files})
+
+    def state_arrays(self, prefix=""):
+        """
+        Estado ajustado como dict de arrays NumPy (sin objetos Python),
+        para guardarlo con np.savez o junto a otras matrices en la caché.
+        """
+        return {
+            f"{prefix}sparse": np.array(self.sparse),
+            f"{prefix}prefix_sep": np.array(self.prefix_sep),
+            f"{prefix}fill_categorical": np.array(self.fill_categorical),
+            f"{prefix}columns": np.array(self.columns, dtype=str),
+            f"{prefix}categorical": np.array(sorted(self.categorical), dtype=str),
+            f"{prefix}numeric_idx": self.numeric_idx,
+            f"{prefix}mean": self.mean,
+            f"{prefix}scale": self.scale,
+        }
+
+    @classmethod
+    def from_state_arrays(cls, arrays, prefix=""):
+        """Reconstruye un FeatureVectorizer ajustado a partir de state_arrays()."""
+        return cls().set_state_arrays(arrays, prefix)
+
+    def set_state_arrays(self, arrays, prefix=""):
+        """Restaura en esta instancia el estado devuelto por state_arrays()."""
+        self.sparse = bool(arrays[f"{prefix}sparse"])
+        self.prefix_sep = str(arrays[f"{prefix}prefix_sep"])
+        self.fill_categorical = bool(arrays[f"{prefix}fill_categorical"])
+        self._set_schema(arrays[f"{prefix}columns"].tolist(), set(arrays[f"{prefix}categorical"].tolist()),
+                         arrays[f"{prefix}numeric_idx"], arrays[f"{prefix}mean"], arrays[f"{prefix}scale"])
+        return self
+
+    def _fit_dense(self, rows, patient_ids):
+        # Mismo procedimiento que la codificación original con pandas, para conservar
+        # el orden de columnas y los niveles de get_dummies
+        df = pd.DataFrame(rows, index=patient_ids)
+        if self.fill_categorical:
+            df = df.fillna(0)
+        else:
+            # Sin rellenar las categóricas, get_dummies deja a cero las filas sin valor
+            filled_cols = df.select_dtypes(include=[np.number]).columns
+            df[filled_cols] = df[filled_cols].fillna(0)
+        numeric_cols = df.select_dtypes(include=[np.number]).columns.tolist()
+        categorical_cols = df.select_dtypes(include=['object']).columns.tolist()
+
+        columns = list(numeric_cols)
+        if categorical_cols:
+            df_cat = pd.get_dummies(df[categorical_cols], prefix=categorical_cols, prefix_sep=self.prefix_sep)
+            columns += df_cat.columns.tolist()
+
+        if numeric_cols:
+            scaler = StandardScaler().fit(df[numeric_cols])
+            mean, scale = scaler.mean_, scaler.scale_
+        else:
+            mean, scale = np.zeros(0), np.ones(0)
+
+        self._set_schema(columns, set(categorical_cols), np.arange(len(numeric_cols)), mean, scale)
+
+    def _fit_sparse(self, rows, situations):
+        # Una característica es categórica si alguno de sus valores no es numérico (como en pandas)
+        categorical = set()
+        numeric = set()
+        for row in rows:
+            for feature_uri, value in row.items():
+                if isinstance(value, str):
+                    categorical.add(feature_uri)
+                else:
+                    numeric.add(feature_uri)
+        numeric -= categorical
+
+        # Vocabulario de columnas en orden de primera aparición
+        vocabulary = {}
+        for row in rows:
+            for feature_uri, value in row.items():
+                column = f"{feature_uri}{self.prefix_sep}{value}" if feature_uri in categorical else feature_uri
+                vocabulary.setdefault(column, len(vocabulary))
+        columns = list(vocabulary)
+
+        # Escalar solo las columnas numéricas (no indicadores ni one-hot)
+        numeric_idx = np.array([j for j, column in enumerate(columns)
+                                if column in numeric and column not in situations], dtype=int)
+        self._set_schema(columns, categorical, numeric_idx, np.zeros(len(numeric_idx)), np.ones(len(numeric_idx)))
+        if len(numeric_idx):
+            self.scale = StandardScaler(with_mean=False).fit(self._encode(rows)[:, numeric_idx]).scale_
+
+    def _encode(self, rows):
+        """Construye la matriz CSR sin escalar a partir de las filas parseadas."""
+        row_idx, col_idx, data = [], [], []
+        for i, row in enumerate(rows):
+            for feature_uri, value in row.items():
+                if feature_uri in self.categorical:
+                    j = self._levels.get((feature_uri, _level_key(value)))
+                    value = 1.0
+                elif isinstance(value, str):
+                    # Valor no numérico en una columna numérica: se trata como ausente
+                    j = None
+                else:
+                    j = self._index.get(feature_uri)
+                if j is not None:
+                    row_idx.append(i)
+                    col_idx.append(j)
+                    data.append(float(value))
+            # Categóricas ausentes (solo en modo denso con fill_categorical, donde fillna(0) genera el nivel '0')
+            for feature_uri, j in self._missing_levels:
+                if feature_uri not in row:
+                    row_idx.append(i)
+                    col_idx.append(j)
+                    data.append(1.0)
+
+        return sp.csr_matrix((np.asarray(data, dtype=float), (row_idx, col_idx)),
+                             shape=(len(rows), len(self.columns)))
+
+    def _set_schema(self, columns, categorical, numeric_idx, mean, scale):
+        self.columns = list(columns)
+        self.categorical = set(categorical)
+        self.numeric_idx = np.asarray(numeric_idx, dtype=int)
+        self.mean = np.asarray(mean, dtype=float)
+        self.scale = np.asarray(scale, dtype=float)
+        self._index = {column: j for j, column in enumerate(self.columns)}
+
+        # Nivel normalizado → columna one-hot. Como factorize en pd.get_dummies, 0 y 0.0 son el
+        # mismo nivel y la columna toma el nombre del primero visto ('<feature><sep>0' o '...0.0')
+        self._levels = {}
+        prefixes = sorted(((f"{feature_uri}{self.prefix_sep}", feature_uri) for feature_uri in self.categorical),
+                          key=lambda item: len(item[0]), reverse=True)
+        for j, column in enumerate(self.columns):
+            for prefix, feature_uri in prefixes:
+                if column.startswith(prefix):
+                    self._levels[(feature_uri, _level_key(column[len(prefix):]))] = j
+                    break
+
+        self._missing_levels = []
+        if not self.sparse and self.fill_categorical:
+            for feature_uri in sorted(self.categorical, key=str):
+                # Categóricas ausentes: fillna(0) genera (o se une a) el nivel 0
+                j = self._levels.get((feature_uri, 0.0))
+                if j is not None:
+                    self._missing_levels.append((feature_uri, j))
+
+
+def _level_key(level):
+    """
+    Clave de un nivel categórico: los niveles numéricos (o su nombre de columna, p.ej. '0' o
+    '0.0') se comparan como float, igual que factorize; el resto como texto.
+    """
+    if isinstance(level, str):
+        try:
+            return float(level)
+        except ValueError:
+            return level
+    return float(level)
+
+
+def _parse_rows(patient_features):
+    """
+    Convierte cada lista de tuplas en un dict { feature_uri: valor } con valores
+    1 (situaciones), float o str.
+    :return: (rows (list of dict), patient_ids (list), situations (set de feature_uri con valor True))
+    """
     rows = []
     patient_ids = []
+    situations = set()
     for patient, features in patient_features.items():
         row = {}
         for feature_uri, value in features:
             if value is True:
                 row[feature_uri] = 1
+                situations.add(feature_uri)
             else:
                 try:
                     row[feature_uri] = float(value)
@@ -46,24 +349,4 @@ def _vectorize_features(patient_features):
                     row[feature_uri] = str(value)
         rows.append(row)
         patient_ids.append(patient)
-
-    # Crear DataFrame con pacientes como índice
-    df = pd.DataFrame(rows, index=patient_ids).fillna(0)
-
-    # Separar columnas por tipo
-    numeric_cols = df.select_dtypes(include=[np.number]).columns.tolist()
-    categorical_cols = df.select_dtypes(include=['object']).columns.tolist()
-
-    # Codificar categóricas con one-hot
-    if categorical_cols:
-        df_cat = pd.get_dummies(df[categorical_cols], prefix=categorical_cols, prefix_sep=':')
-        df = pd.concat([df[numeric_cols], df_cat], axis=1)
-
-    # Escalar columnas numéricas
-    if numeric_cols:
-        scaler = StandardScaler()
-        df[numeric_cols] = scaler.fit_transform(df[numeric_cols])
-
-    # Matriz de características y lista de IDs
-    feature_vectors = df.values
-    return feature_vectors, patient_ids
+    return rows, patient_ids, situations
@@ -1,8 +1,11 @@
 import tempfile
 import os
 import networkx as nx
+import numpy as np
 import igraph as ig
 
+from feature_builder.patient_graph import PatientGraph
+
 def convert_networkx_to_igraph_via_graphml(nx_graph: nx.Graph) -> ig.Graph:
     """
     Convert a NetworkX graph into an igraph Graph by round-tripping through GraphML.
@@ -29,3 +32,54 @@ def convert_networkx_to_igraph_via_graphml(nx_graph: nx.Graph) -> ig.Graph:
         os.remove(tmp_path)
 
     return ig_graph
+
+
+def convert_networkx_to_igraph(nx_graph: nx.Graph, weight: str = "weight") -> ig.Graph:
+    """
+    Convert a NetworkX graph into an igraph Graph in memory, without a GraphML round trip.
+
+    Vertices keep the NetworkX node order and get a string ``name`` attribute (as the
+    GraphML round trip did); edges keep their order and their weight attribute.
+    A PatientGraph is converted straight from its edge arrays (``weight`` attribute).
+
+    :param nx_graph: A NetworkX Graph or DiGraph, or a PatientGraph.
+    :param weight: Edge attribute to copy (stored under the same name in igraph).
+    :return: An igraph Graph with the same structure and edge weights.
+    """
+    if isinstance(nx_graph, PatientGraph):
+        return nx_graph.to_igraph()
+
+    names = list(nx_graph.nodes())
+    index = {node: i for i, node in enumerate(names)}
+
+    edges = []
+    weights = []
+    has_weight = False
+    for u, v, data in nx_graph.edges(data=True):
+        edges.append((index[u], index[v]))
+        w = data.get(weight)
+        has_weight = has_weight or w is not None
+        weights.append(w)
+
+    ig_graph = ig.Graph(n=len(names), edges=edges, directed=nx_graph.is_directed())
+    ig_graph.vs["name"] = [str(node) for node in names]
+    if has_weight:
+        ig_graph.es[weight] = [1.0 if w is None else float(w) for w in weights]
+    return ig_graph
+
+
+def igraph_from_edges(patient_ids: list, sources, targets, weights) -> ig.Graph:
+    """
+    Build an igraph Graph directly from similarity edge arrays, without creating a NetworkX graph.
+
+    :param patient_ids: Vertex names, indexed by position.
+    :param sources: Index of the first endpoint of each edge.
+    :param targets: Index of the second endpoint of each edge.
+    :param weights: Weight of each edge.
+    :return: An undirected igraph Graph with ``name`` and ``weight`` attributes.
+    """
+    edges = list(zip(np.asarray(sources).tolist(), np.asarray(targets).tolist()))
+    ig_graph = ig.Graph(n=len(patient_ids), edges=edges, directed=False)
+    ig_graph.vs["name"] = [str(pid) for pid in patient_ids]
+    ig_graph.es["weight"] = np.asarray(weights, dtype=float).tolist()
+    return ig_graph
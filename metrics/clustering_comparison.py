@@ -1,17 +1,19 @@
-import csv
 from sklearn.metrics import normalized_mutual_info_score
 
-def read_results(file_path, id_column, label_column):
-    results = {}
-    with open(file_path, newline='', encoding='utf-8') as csvfile:
-        reader = csv.DictReader(csvfile)
-        for row in reader:
-            results[row[id_column]] = row[label_column]
-    return results
+from clustering.results import read_partition
 
-def compare_clusterings(file_path1, file_path2, id_column1, id_column2, label_column1, label_column2):
-    clustering1 = read_results(file_path1, id_column1, label_column1)
-    clustering2 = read_results(file_path2, id_column2, label_column2)
+def read_results(file_path, id_column=None, label_column=None, index=0):
+    """
+    Reads a partition from a results directory (.partitions, see clustering.results) or a CSV/TXT export.
+    The CSV columns are detected when id_column / label_column are None.
+    """
+    return {node: str(label) for node, label in
+            read_partition(file_path, index=index, id_column=id_column, label_column=label_column).items()}
+
+def compare_clusterings(file_path1, file_path2, id_column1=None, id_column2=None, label_column1=None,
+                        label_column2=None, index1=0, index2=0):
+    clustering1 = read_results(file_path1, id_column1, label_column1, index1)
+    clustering2 = read_results(file_path2, id_column2, label_column2, index2)
 
     all_ids = set(clustering1.keys()).union(set(clustering2.keys()))
 
@@ -19,8 +21,8 @@ def compare_clusterings(file_path1, file_path2, id_column1, id_column2, label_co
     labels2 = []
 
     for id in all_ids:
-        labels1.append(clustering1.get(id, -1))
-        labels2.append(clustering2.get(id, -1))
+        labels1.append(clustering1.get(id, "-1"))
+        labels2.append(clustering2.get(id, "-1"))
 
     nmi = normalized_mutual_info_score(labels1, labels2)
     return nmi
@@ -29,12 +31,14 @@ if __name__ == "__main__":
     import argparse
 
     parser = argparse.ArgumentParser(description='Compara dos resultados de clustering usando NMI.')
-    parser.add_argument('file1', help='Ruta al primer archivo CSV')
-    parser.add_argument('file2', help='Ruta al segundo archivo CSV')
-    parser.add_argument('--id_column1', default='patient_id', help='Nombre de la columna de IDs en el primer archivo')
-    parser.add_argument('--id_column2', default='patient_id', help='Nombre de la columna de IDs en el segundo archivo')
-    parser.add_argument('--label_column1', default='community_id', help='Nombre de la columna de etiquetas en el primer archivo')
-    parser.add_argument('--label_column2', default='community_id', help='Nombre de la columna de etiquetas en el segundo archivo')
+    parser.add_argument('file1', help='Ruta al primer resultado (directorio .partitions, CSV o TXT)')
+    parser.add_argument('file2', help='Ruta al segundo resultado (directorio .partitions, CSV o TXT)')
+    parser.add_argument('--id_column1', default=None, help='Nombre de la columna de IDs en el primer archivo (por defecto, detectada)')
+    parser.add_argument('--id_column2', default=None, help='Nombre de la columna de IDs en el segundo archivo (por defecto, detectada)')
+    parser.add_argument('--label_column1', default=None, help='Nombre de la columna de etiquetas en el primer archivo (por defecto, detectada)')
+    parser.add_argument('--label_column2', default=None, help='Nombre de la columna de etiquetas en el segundo archivo (por defecto, detectada)')
+    parser.add_argument('--index1', type=int, default=0, help='Partición del primer directorio de resultados')
+    parser.add_argument('--index2', type=int, default=0, help='Partición del segundo directorio de resultados')
     args = parser.parse_args()
 
     nmi_score = compare_clusterings(
@@ -43,7 +47,9 @@ if __name__ == "__main__":
         args.id_column1,
         args.id_column2,
         args.label_column1,
-        args.label_column2
+        args.label_column2,
+        args.index1,
+        args.index2
     )
 
     print(f"NMI entre los dos clusterings: {nmi_score:.4f}")
\ No newline at end of file
@@ -0,0 +1,65 @@
+import numpy as np
+import networkx as nx
+
+from feature_builder.patient_graph import PatientGraph
+
+
+def community_quality(sources, targets, weights, membership) -> dict:
+    """
+    Modularity and per-community metrics of a partition, computed over edge arrays.
+
+    Each undirected edge (i, j) appears once. Nodes with membership < 0 are treated as
+    singleton communities (as NetworkX does for nodes outside the partition).
+
+    :param sources: First endpoint index of each edge
+    :param targets: Second endpoint index of each edge
+    :param weights: Weight of each edge
+    :param membership: Community id of each node (integer array, length n_nodes)
+    :return: dict with the global "modularity" (resolution 1) and, per community (aligned with
+             "communities"): "size", "internal_weight", "total_degree", "cut_weight", "conductance"
+    """
+    membership = np.asarray(membership).copy()
+    sources, targets = np.asarray(sources), np.asarray(targets)
+    weights = np.asarray(weights, dtype=float)
+
+    missing = membership < 0
+    membership[missing] = membership.max(initial=-1) + 1 + np.arange(missing.sum())
+    communities, labels = np.unique(membership, return_inverse=True)
+    k = len(communities)
+
+    # Single pass over the edges
+    source_labels, target_labels = labels[sources], labels[targets]
+    internal = source_labels == target_labels
+    internal_weight = np.bincount(source_labels[internal], weights=weights[internal], minlength=k)
+    total_degree = (np.bincount(source_labels, weights=weights, minlength=k)
+                    + np.bincount(target_labels, weights=weights, minlength=k))
+
+    total_weight = weights.sum()
+    cut_weight = total_degree - 2 * internal_weight
+    # Conductance: cut / min(volume inside, volume outside); 0 when the denominator is 0
+    volume = np.minimum(total_degree, 2 * total_weight - total_degree)
+    conductance = np.divide(cut_weight, volume, out=np.zeros(k), where=volume > 0)
+
+    if total_weight > 0:
+        modularity = float(np.sum(internal_weight / total_weight - (total_degree / (2 * total_weight)) ** 2))
+    else:
+        modularity = None
+
+    return {
+        "modularity": modularity,
+        "communities": communities,
+        "size": np.bincount(labels, minlength=k),
+        "internal_weight": internal_weight,
+        "total_degree": total_degree,
+        "cut_weight": cut_weight,
+        "conductance": conductance,
+    }
+
+
+def partition_quality(G, partition: dict) -> dict:
+    """
+    community_quality for a PatientGraph or NetworkX graph and a { node: community_id } partition.
+    """
+    if isinstance(G, nx.Graph):
+        G = PatientGraph.from_networkx(G)
+    return community_quality(G.sources, G.targets, G.weights, G.membership(partition))
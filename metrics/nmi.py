@@ -1,30 +1,145 @@
-from sklearn.metrics import normalized_mutual_info_score
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# Label matrix and per-partition statistics shared with the worker processes (see _init_worker)
+_worker_state = None
+
 
 def nmi_communities(array_of_dicts: list) -> float:
-    
+
     # Check input validity
     if array_of_dicts is None or len(array_of_dicts) < 2:
         raise ValueError("NMI requires at least two partitions to compare.")
 
-    # Convert list of dicts to list of lists
+    # Average of the pairwise NMI matrix (upper triangle, i < j)
+    nmi = pairwise_partition_scores(array_of_dicts)["nmi"]
+    upper = np.triu_indices(len(array_of_dicts), k=1)
+    average_nmi = float(nmi[upper].mean())
+    return average_nmi
+
+
+def encode_partitions(array_of_dicts: list):
+    """
+    Encode partitions { node: community_id } as an integer label matrix.
+
+    Nodes missing from a partition get their own label (-1 before relabelling), as in
+    nmi_communities. Labels in each row are relabelled to 0..c-1.
+
+    :param array_of_dicts: List of partitions
+    :return: (labels (n_partitions x n_nodes int array), nodes (sorted list))
+    """
     all_nodes = set()
     for partition in array_of_dicts:
         all_nodes.update(partition.keys())
-    all_nodes = sorted(all_nodes)
+    nodes = sorted(all_nodes)
 
-    # Contains a list of community labels for each partition
-    label_lists = []
-    for partition in array_of_dicts:
-        labels = [partition.get(node, -1) for node in all_nodes]
-        label_lists.append(labels)
-
-    # Calculate pairwise NMI and average
-    nmi_values = []
-    for i in range(len(label_lists)):
-        print("...Calculating NMI for partition", i)
-        for j in range(i + 1, len(label_lists)):
-            nmi = normalized_mutual_info_score(label_lists[i], label_lists[j])
-            nmi_values.append(nmi)
-
-    average_nmi = sum(nmi_values) / len(nmi_values) if nmi_values else 0.0
-    return average_nmi
\ No newline at end of file
+    labels = np.empty((len(array_of_dicts), len(nodes)), dtype=np.int64)
+    for row, partition in enumerate(array_of_dicts):
+        raw = np.asarray([partition.get(node, -1) for node in nodes])
+        if raw.dtype == object:
+            raw = raw.astype(str)
+        _, labels[row] = np.unique(raw, return_inverse=True)
+    return labels, nodes
+
+
+def pairwise_partition_scores(partitions, n_jobs: int = 1) -> dict:
+    """
+    Pairwise NMI, ARI and variation of information between all partitions.
+
+    Each pair is scored from its sparse contingency table (non-empty cells only), with
+    the per-partition entropies computed once. Values match sklearn's
+    normalized_mutual_info_score (arithmetic average) and adjusted_rand_score; VI is in nats.
+
+    :param partitions: List of partitions { node: community_id }, a label matrix
+                       from encode_partitions or a result set from clustering.results.load_results
+    :param n_jobs: Worker processes; rows of the matrix are split between them
+    :return: dict { "nmi", "ari", "vi" } of symmetric (n_partitions x n_partitions) matrices
+    """
+    if isinstance(partitions, np.ndarray):
+        labels = np.asarray(partitions)
+    elif hasattr(partitions, "label_matrix"):
+        labels = partitions.label_matrix()
+    else:
+        labels, _ = encode_partitions(partitions)
+    k = labels.shape[0]
+    state = (labels,) + _partition_stats(labels)
+
+    rows = list(range(k))
+    if n_jobs and n_jobs > 1 and k > 1:
+        with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker,
+                                 initargs=(state,)) as executor:
+            row_scores = list(executor.map(_score_row, rows, chunksize=max(1, k // (4 * n_jobs))))
+    else:
+        row_scores = [_score_row(i, state) for i in rows]
+
+    scores = {name: np.eye(k) if name != "vi" else np.zeros((k, k)) for name in ("nmi", "ari", "vi")}
+    for i, row in zip(rows, row_scores):
+        for name, values in row.items():
+            scores[name][i, i + 1:] = values
+            scores[name][i + 1:, i] = values
+    return scores
+
+
+def _init_worker(state):
+    global _worker_state
+    _worker_state = state
+
+
+def _comb2(x):
+    return x * (x - 1) / 2.0
+
+
+def _partition_stats(labels):
+    """Cluster sizes, entropy and sum of C(size, 2) of every partition, computed once."""
+    n = labels.shape[1]
+    counts = [np.bincount(row).astype(float) for row in labels]
+    entropies = []
+    for c in counts:
+        p = c[c > 0] / n
+        entropies.append(float(-np.sum(p * np.log(p))))
+    pair_sums = [_comb2(c).sum() for c in counts]
+    return counts, entropies, pair_sums
+
+
+def _score_row(i, state=None):
+    """Scores of partition i against partitions i+1..k-1."""
+    labels, counts, entropies, pair_sums = state if state is not None else _worker_state
+    k, n = labels.shape
+    a, counts_a, h_a, sum_a = labels[i], counts[i], entropies[i], pair_sums[i]
+    n_a = len(counts_a)
+    total_pairs = _comb2(float(n))
+
+    nmi, ari, vi = [], [], []
+    for j in range(i + 1, k):
+        counts_b, h_b, sum_b = counts[j], entropies[j], pair_sums[j]
+        n_b = len(counts_b)
+        # Sparse contingency table: only the non-empty cells (codes in int64, so n_a * n_b
+        # may exceed the int32 range without allocating the dense n_a x n_b table)
+        cells, nij = np.unique(a * np.int64(n_b) + labels[j], return_counts=True)
+        nij = nij.astype(float)
+        rows_ij, cols_ij = np.divmod(cells, n_b)
+
+        # Marginals of the occupied rows/columns, taken from the same cells
+        row_sums = np.bincount(rows_ij, weights=nij, minlength=n_a)
+        col_sums = np.bincount(cols_ij, weights=nij, minlength=n_b)
+
+        # Mutual information from the non-zero cells of the contingency table
+        mi = float(np.sum(nij / n * np.log(nij * n / (row_sums[rows_ij] * col_sums[cols_ij]))))
+        mi = max(mi, 0.0)
+
+        if n_a == n_b == 1:
+            nmi.append(1.0)
+        else:
+            nmi.append(mi / max((h_a + h_b) / 2, np.finfo(float).eps))
+
+        expected = sum_a * sum_b / total_pairs if total_pairs else 0.0
+        maximum = (sum_a + sum_b) / 2
+        if maximum == expected:
+            ari.append(1.0)
+        else:
+            ari.append((_comb2(nij).sum() - expected) / (maximum - expected))
+
+        vi.append(max(h_a + h_b - 2 * mi, 0.0))
+
+    return {"nmi": np.array(nmi), "ari": np.array(ari), "vi": np.array(vi)}
@@ -0,0 +1,38 @@
+import networkx as nx
+import numpy as np
+import pytest
+
+from feature_builder.graph_builder import build_similarity_graph
+from feature_builder.vectorizer import FeatureVectorizer
+from metrics.community_quality import community_quality, partition_quality
+
+
+@pytest.fixture
+def patient_graph(patient_features):
+    feature_vectors, patient_ids = FeatureVectorizer().fit_transform(patient_features)
+    return build_similarity_graph(feature_vectors, patient_ids, threshold=0.3)
+
+
+def test_modularity_matches_networkx(patient_graph):
+    G = patient_graph.to_networkx()
+    rng = np.random.default_rng(0)
+    for n_communities in (1, 3, 6):
+        partition = dict(zip(patient_graph.node_ids, rng.integers(0, n_communities, len(patient_graph.node_ids)).tolist()))
+        communities = [{node for node, c in partition.items() if c == community} for community in set(partition.values())]
+
+        quality = community_quality(patient_graph.sources, patient_graph.targets, patient_graph.weights,
+                                    patient_graph.membership(partition))
+        assert quality["modularity"] == pytest.approx(nx.community.modularity(G, communities, weight="weight"))
+        assert partition_quality(G, partition)["modularity"] == pytest.approx(quality["modularity"])
+
+
+def test_missing_nodes_are_singletons(patient_graph):
+    G = patient_graph.to_networkx()
+    nodes = patient_graph.node_ids
+    partition = {node: i % 2 for i, node in enumerate(nodes[:-4])}
+    communities = [{node for node, c in partition.items() if c == community} for community in (0, 1)]
+    communities += [{node} for node in nodes[-4:]]
+
+    quality = partition_quality(patient_graph, partition)
+    assert quality["modularity"] == pytest.approx(nx.community.modularity(G, communities, weight="weight"))
+    assert quality["size"].sum() == len(nodes)
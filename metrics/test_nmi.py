@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+from sklearn.metrics import adjusted_rand_score, normalized_mutual_info_score
+
+from metrics.nmi import encode_partitions, nmi_communities, pairwise_partition_scores
+
+
+@pytest.fixture
+def partitions():
+    rng = np.random.default_rng(0)
+    nodes = [f"p{i}" for i in range(300)]
+    result = [dict(zip(nodes, rng.integers(0, k, len(nodes)).tolist())) for k in (1, 2, 5, 40, 300)]
+    # Partición con pacientes ausentes (comparten la etiqueta -1) y comunidades no enteras
+    result.append({node: f"c{i % 7}" for i, node in enumerate(nodes[:250])})
+    return result
+
+
+@pytest.mark.parametrize("n_jobs", [1, 2])
+def test_pairwise_scores_match_sklearn(partitions, n_jobs):
+    labels, _ = encode_partitions(partitions)
+    scores = pairwise_partition_scores(partitions, n_jobs=n_jobs)
+
+    for i in range(len(partitions)):
+        for j in range(len(partitions)):
+            assert scores["nmi"][i, j] == pytest.approx(normalized_mutual_info_score(labels[i], labels[j]))
+            assert scores["ari"][i, j] == pytest.approx(adjusted_rand_score(labels[i], labels[j]))
+    assert np.allclose(np.diag(scores["vi"]), 0)
+
+
+def test_nmi_communities_is_the_mean_pairwise_nmi(partitions):
+    labels, _ = encode_partitions(partitions)
+    expected = np.mean([normalized_mutual_info_score(labels[i], labels[j])
+                        for i in range(len(labels)) for j in range(i + 1, len(labels))])
+    assert nmi_communities(partitions) == pytest.approx(expected)
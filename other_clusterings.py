@@ -5,7 +5,10 @@ import argparse
 import sys
 import rdflib
 
-from clustering.clustering import clustering_apply
+from clustering.clustering import (clustering_apply, clustering_sweep, has_cached_preprocess, reorganize_clusters,
+                                   KMEANS_ENGINES, GRAPH_METHODS)
+from clustering.results import save_results, write_csv
+from feature_builder.vectorizer import FeatureVectorizer
 import csv
 import os
 from datetime import datetime
@@ -23,7 +26,7 @@ def main():
     parser.add_argument("ttl_path", help="Ruta al fichero .ttl con el grafo RDF")
     parser.add_argument(
         "-m", "--method",
-        choices=["kmeans"],
+        choices=["kmeans"] + GRAPH_METHODS,
         required=True,
         help="Método a ejecutar"
     )
@@ -33,15 +36,118 @@ def main():
         default=5,
         help="(Optional) Number of clusters (default=5)"
     )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="No reutilizar ni guardar el preprocesado en la caché en disco"
+    )
+    parser.add_argument(
+        "--report-sample",
+        type=int,
+        default=None,
+        help="Estima la silueta del informe con una muestra estratificada de este tamaño (con intervalo de confianza)"
+    )
+    parser.add_argument(
+        "--engine",
+        choices=KMEANS_ENGINES,
+        default="kmeans",
+        help="KMeans completo o MiniBatchKMeans (más rápido en cohortes grandes)"
+    )
+    parser.add_argument(
+        "--k-values",
+        type=int,
+        nargs="+",
+        default=None,
+        help="Barrido de k (solo kmeans): evalúa estos valores preprocesando una sola vez y guarda el CSV del k con mayor silueta"
+    )
+    parser.add_argument(
+        "--graph-knn",
+        type=int,
+        default=10,
+        help="Vecinos del grafo de similitud para agglomerative_* y spectral (0 = grafo solo por umbral)"
+    )
+    parser.add_argument(
+        "--graph-threshold",
+        type=float,
+        default=None,
+        help="Umbral de similitud del grafo para agglomerative_* y spectral"
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="Número de procesos para el barrido de k"
+    )
+    parser.add_argument(
+        "--sparse",
+        action="store_true",
+        help="Codifica las características como matriz dispersa (CSR) y la usa tal cual en el clustering"
+    )
     args = parser.parse_args()
+    if args.k_values and args.method != "kmeans":
+        parser.error("--k-values solo está disponible con -m kmeans")
+
+    vectorizer = FeatureVectorizer(sparse=args.sparse, prefix_sep='_', fill_categorical=False)
+
+    # Con caché, el TTL solo se carga si no hay una entrada para su contenido
+    graph = None
+    if args.no_cache or not has_cached_preprocess(args.ttl_path, vectorizer):
+        try:
+            graph = load_rdf_graph(args.ttl_path)
+        except Exception as e:
+            print(f"[ERROR] No se pudo cargar el TTL ({args.ttl_path}): {e}", file=sys.stderr)
+            sys.exit(1)
+
+    output_dir = "outputs"
+    os.makedirs(output_dir, exist_ok=True)
+    today_str = datetime.today().strftime("%Y%m%d")
+
+    if args.k_values:
+        results, patient_nodes = clustering_sweep(graph, args.method, args.k_values,
+                                                  ttl_path=args.ttl_path, use_cache=not args.no_cache,
+                                                  vectorizer=vectorizer,
+                                                  report_sample_size=args.report_sample,
+                                                  engine=args.engine, n_jobs=args.jobs)
 
-    try:
-        graph = load_rdf_graph(args.ttl_path)
-    except Exception as e:
-        print(f"[ERROR] No se pudo cargar el TTL ({args.ttl_path}): {e}", file=sys.stderr)
-        sys.exit(1)
+        columns = ["k", "inertia", "silhouette", "silhouette_pct_negative", "calinski_harabasz",
+                   "davies_bouldin", "min_cluster_size", "max_cluster_size", "largest_share_pct", "seconds"]
+        print(f"{'k':>4} {'Inercia':>12} {'Silueta':>8} {'%Neg':>6} {'CH':>10} {'DB':>7} "
+              f"{'Min':>6} {'Max':>6} {'%Mayor':>7} {'Seg.':>6}")
+        for row in results:
+            silhouette = row["silhouette"] if row["silhouette"] is not None else float("nan")
+            print(f"{row['k']:>4} {row['inertia']:>12.1f} {silhouette:>8.3f} "
+                  f"{row['silhouette_pct_negative'] or 0:>6.3f} {row['calinski_harabasz'] or 0:>10.1f} "
+                  f"{row['davies_bouldin'] or 0:>7.3f} {row['min_cluster_size']:>6} {row['max_cluster_size']:>6} "
+                  f"{row['largest_share_pct']:>7.1f} {row['seconds']:>6.2f}")
 
-    clusters = clustering_apply(graph, args.method, args.nclusters)
+        sweep_file = os.path.join(output_dir, f"{today_str}_{args.method}_KSweep.csv")
+        with open(sweep_file, mode="w", newline="", encoding="utf-8") as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(columns)
+            for row in results:
+                writer.writerow([row[column] for column in columns])
+        print(f"CSV file saved to {sweep_file}")
+
+        # Todas las particiones del barrido en un único directorio de resultados
+        sweep_results = save_results(
+            os.path.join(output_dir, f"{today_str}_{args.method}_KSweep"),
+            [dict(zip(patient_nodes, row["labels"].tolist())) for row in results],
+            metadata=[{"method": args.method, "engine": args.engine, "k": row["k"],
+                       "silhouette": row["silhouette"], "input": args.ttl_path} for row in results]
+        )
+        print(f"Results saved to {sweep_results}")
+
+        # k elegido: mayor silueta
+        best = max(results, key=lambda row: row["silhouette"] if row["silhouette"] is not None else -1)
+        print(f"k elegido (mayor silueta): {best['k']}")
+        args.nclusters = best["k"]
+        clusters = reorganize_clusters(dict(zip(patient_nodes, best["labels"])))
+    else:
+        clusters = clustering_apply(graph, args.method, args.nclusters,
+                                    ttl_path=args.ttl_path, use_cache=not args.no_cache,
+                                    vectorizer=vectorizer,
+                                    report_sample_size=args.report_sample, engine=args.engine,
+                                    graph_knn=args.graph_knn or None, graph_threshold=args.graph_threshold)
 
     for cluster in clusters:
         print(f"Cluster {cluster}:")
@@ -49,20 +155,20 @@ def main():
         #    print(f"  - {patient}")
         #print()
 
-    output_dir = "outputs"
-    os.makedirs(output_dir, exist_ok=True)
-    today_str = datetime.today().strftime("%Y%m%d")
+    partition = {patient: cluster for cluster in clusters for patient in clusters[cluster]}
+    results_dir = save_results(
+        os.path.join(output_dir, f"{today_str}_{args.method}_{args.nclusters}"),
+        partition,
+        metadata={"method": args.method, "engine": args.engine, "k": args.nclusters, "sparse": args.sparse,
+                  "input": args.ttl_path}
+    )
+    print(f"Results saved to {results_dir}")
+
     output_file = os.path.join(
         output_dir,
         f"{today_str}_{args.method}_{args.nclusters}.csv"
     )
-
-    with open(output_file, mode="w", newline="", encoding="utf-8") as csvfile:
-        writer = csv.writer(csvfile)
-        writer.writerow(["Cluster", "PatientID"])
-        for cluster in clusters:
-            for patient in clusters[cluster]:
-                writer.writerow([cluster, patient])
+    write_csv(partition, output_file)
     print(f"CSV file saved to {output_file}")
 
 
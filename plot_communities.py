@@ -1,37 +1,25 @@
 #!/usr/bin/env python3
+import argparse
+import os
+
 import matplotlib.pyplot as plt
 
+from clustering.results import load_results, read_partition
+
 def read_communities(file_path):
     """
-    Lee el archivo communities.txt y devuelve un diccionario
-    donde la clave es el ID de la comunidad y el valor es el número de miembros.
-    
-    Se asume que el archivo tiene el formato:
-      Comunidad <id>:
-        <nodo>
-        <nodo>
-      Comunidad <id>:
-        <nodo>
-        ...
+    Lee una partición y devuelve un diccionario donde la clave es el ID de la comunidad
+    y el valor es el número de miembros.
+
+    Admite un directorio de resultados (.partitions, ver clustering.results), que se lee
+    mapeado en memoria, o sus vistas exportadas: CSV (Cluster, PatientID) o TXT con
+    cabeceras "Community <id> (...):" o "Comunidad <id>:" seguidas de un nodo por línea.
     """
+    if os.path.isdir(file_path):
+        return load_results(file_path).community_sizes()
     communities = {}
-    current_comm = None
-    with open(file_path, "r", encoding="utf-8") as f:
-        for line in f:
-            line = line.strip()
-            if line.startswith("Comunidad"):
-                # Extraer el identificador de la comunidad (se espera el formato "Comunidad <id>:")
-                parts = line.split()
-                if len(parts) >= 2:
-                    comm_id = parts[1].strip(":")
-                    current_comm = comm_id
-                    communities[current_comm] = 0
-            elif line and current_comm is not None:
-                # Cada línea que no esté vacía y esté indentada se considera un nodo de la comunidad actual.
-                communities[current_comm] += 1
-            elif not line:
-                # Línea en blanco: fin de la sección de una comunidad.
-                current_comm = None
+    for comm_id in read_partition(file_path).values():
+        communities[comm_id] = communities.get(comm_id, 0) + 1
     return communities
 
 def plot_communities(communities):
@@ -39,8 +27,8 @@ def plot_communities(communities):
     Genera un gráfico de barras con la cantidad de miembros por comunidad.
     """
     # Extraer IDs y sus respectivos conteos
-    comm_ids = list(communities.keys())
-    counts = [communities[comm] for comm in comm_ids]
+    comm_ids = [str(comm) for comm in communities.keys()]
+    counts = list(communities.values())
 
     # Crear el gráfico de barras
     plt.figure(figsize=(10, 6))
@@ -54,8 +42,12 @@ def plot_communities(communities):
     plt.show()
 
 def main():
-    file_path = "communities.txt"
-    communities = read_communities(file_path)
+    parser = argparse.ArgumentParser(description='Gráfico del número de miembros por comunidad.')
+    parser.add_argument('file_path', nargs='?', default="communities.txt",
+                        help='Directorio de resultados (.partitions), CSV o TXT de comunidades')
+    args = parser.parse_args()
+
+    communities = read_communities(args.file_path)
     print("Cantidad de miembros por comunidad:")
     for comm, count in communities.items():
         print(f"Comunidad {comm}: {count} miembros")
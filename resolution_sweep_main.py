@@ -0,0 +1,89 @@
+# resolution_sweep_main.py
+import argparse
+import csv
+import os
+import random
+from datetime import datetime
+
+import numpy as np
+
+from feature_builder.vectorizer import build_feature_vectors
+from feature_builder.graph_builder import build_similarity_graph, DEFAULT_MEMORY_BUDGET_MB
+from clustering.resolution_sweep import resolution_sweep
+from clustering.results import save_results
+
+
+if __name__ == '__main__':
+
+    SEED = 42
+
+    random.seed(SEED)
+    np.random.seed(SEED)
+
+    parser = argparse.ArgumentParser(
+        description='Perfil de resolución con Leiden, inicializando cada paso con la partición anterior')
+    parser.add_argument('ttl_path', nargs='+',
+                        help='Ruta al archivo .ttl con el grafo RDF (admite varios ficheros o patrones glob)')
+    parser.add_argument('--resolutions', type=float, nargs='+', default=None,
+                        help='Valores de resolución a evaluar (por defecto, de 0.2 a 2.0 en pasos de 0.2)')
+    parser.add_argument('--threshold', type=float, default=None,
+                        help='Umbral de similitud para filtrar aristas (entre 0 y 1)')
+    parser.add_argument('--knn', type=int, default=None,
+                        help='Construye un grafo de k vecinos más cercanos (compatible con --threshold)')
+    parser.add_argument('--mutual-knn', action='store_true',
+                        help='Con --knn, conservar solo las aristas entre vecinos mutuos')
+    parser.add_argument('--cold-start', action='store_true',
+                        help='No inicializar cada resolución con la partición anterior')
+    parser.add_argument('--sparse', action='store_true',
+                        help='Codifica las características como matriz dispersa (CSR)')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='No reutilizar ni guardar los vectores de características en la caché en disco')
+    parser.add_argument('--jobs', type=int, default=None,
+                        help='Número de procesos para la ingesta de varios ficheros (por defecto, número de CPUs) '
+                             'y de hilos para el cálculo de similitudes (por defecto, 1)')
+    parser.add_argument('--memory-budget', type=float, default=DEFAULT_MEMORY_BUDGET_MB,
+                        help='Memoria máxima (MB) para los bloques de la matriz de similitud')
+    args = parser.parse_args()
+
+    resolutions = args.resolutions or [round(0.2 * i, 1) for i in range(1, 11)]
+
+    feature_vectors, patient_ids = build_feature_vectors(args.ttl_path, use_cache=not args.no_cache,
+                                                         n_jobs=args.jobs, sparse=args.sparse)
+    print(f"[1] Características extraídas: {len(patient_ids)} pacientes, {feature_vectors.shape[1]} dimensiones.", flush=True)
+
+    G = build_similarity_graph(feature_vectors, patient_ids, threshold=args.threshold,
+                               memory_budget_mb=args.memory_budget, n_jobs=args.jobs or 1,
+                               knn=args.knn, mutual=args.mutual_knn)
+    print(f"[2] Grafo construido: {G.number_of_nodes()} nodos, {G.number_of_edges()} aristas.", flush=True)
+
+    results = resolution_sweep(G, resolutions, seed=SEED, warm_start=not args.cold_start)
+
+    print("[3] Perfil de resolución:", flush=True)
+    print(f"  {'Resolución':>10} {'Comunidades':>12} {'Modularidad':>12} {'Segundos':>9}")
+    for row in results:
+        modularity = f"{row['modularity']:.4f}" if row['modularity'] is not None else "-"
+        print(f"  {row['resolution']:>10.3f} {row['communities']:>12} {modularity:>12} {row['seconds']:>9.2f}")
+
+    output_dir = "outputs"
+    os.makedirs(output_dir, exist_ok=True)
+    today_str = datetime.today().strftime("%Y%m%d")
+    output_file = os.path.join(output_dir, f"{today_str}_ResolutionProfile_leiden.csv")
+
+    with open(output_file, mode="w", newline="", encoding="utf-8") as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(["Resolution", "Communities", "Modularity", "Quality", "Seconds"])
+        for row in results:
+            writer.writerow([row["resolution"], row["communities"], row["modularity"], row["quality"],
+                             round(row["seconds"], 3)])
+
+    print(f"CSV file saved to {output_file}")
+
+    # Particiones de todos los pasos en un único directorio de resultados
+    results_dir = save_results(os.path.join(output_dir, f"{today_str}_ResolutionProfile_leiden"),
+                               [row["partition"] for row in results],
+                               modularity=[row["modularity"] for row in results],
+                               metadata=[{"method": "leiden", "resolution": row["resolution"],
+                                          "warm_start": not args.cold_start, "threshold": args.threshold,
+                                          "knn": args.knn, "seed": SEED, "input": args.ttl_path}
+                                         for row in results])
+    print(f"Results saved to {results_dir}")
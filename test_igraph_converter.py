@@ -0,0 +1,59 @@
+import networkx as nx
+import numpy as np
+import pytest
+
+from feature_builder.graph_builder import graph_from_edges, similarity_edges
+from feature_builder.vectorizer import FeatureVectorizer
+from igraph_converter import (
+    convert_networkx_to_igraph,
+    convert_networkx_to_igraph_via_graphml,
+    igraph_from_edges,
+)
+
+
+def _as_tuples(ig_graph):
+    """Vertex names and (source name, target name, weight) per edge, in igraph order."""
+    names = ig_graph.vs["name"]
+    edges = [(names[e.source], names[e.target], e["weight"]) for e in ig_graph.es]
+    return names, edges
+
+
+@pytest.fixture
+def similarity(patient_features):
+    feature_vectors, patient_ids = FeatureVectorizer().fit_transform(patient_features)
+    return patient_ids, similarity_edges(feature_vectors, threshold=0.5)
+
+
+def test_igraph_from_edges_round_trip(similarity):
+    patient_ids, (sources, targets, weights) = similarity
+    ig_graph = igraph_from_edges(patient_ids, sources, targets, weights)
+
+    assert ig_graph.vcount() == len(patient_ids)
+    assert not ig_graph.is_directed()
+    # Reading the edges back gives the same arrays
+    edge_list = np.array(ig_graph.get_edgelist())
+    np.testing.assert_array_equal(edge_list[:, 0], sources)
+    np.testing.assert_array_equal(edge_list[:, 1], targets)
+    np.testing.assert_allclose(ig_graph.es["weight"], weights)
+
+    # Same graph as going through NetworkX, in memory or via GraphML
+    nx_graph = graph_from_edges(patient_ids, sources, targets, weights)
+    expected = _as_tuples(ig_graph)
+    assert _as_tuples(convert_networkx_to_igraph(nx_graph)) == expected
+    names, edges = _as_tuples(convert_networkx_to_igraph_via_graphml(nx_graph))
+    assert names == expected[0]
+    assert [(u, v) for u, v, _ in edges] == [(u, v) for u, v, _ in expected[1]]
+    np.testing.assert_allclose([w for _, _, w in edges], [w for _, _, w in expected[1]])
+
+
+def test_in_memory_conversion_keeps_isolated_nodes_and_default_weight():
+    nx_graph = nx.Graph()
+    nx_graph.add_nodes_from([3, 1, 2])
+    nx_graph.add_edge(3, 1, weight=0.5)
+    nx_graph.add_edge(1, 2)
+
+    ig_graph = convert_networkx_to_igraph(nx_graph)
+
+    assert ig_graph.vs["name"] == ["3", "1", "2"]
+    assert ig_graph.get_edgelist() == [(0, 1), (1, 2)]
+    assert ig_graph.es["weight"] == [0.5, 1.0]
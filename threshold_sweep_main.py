@@ -0,0 +1,83 @@
+# threshold_sweep_main.py
+import argparse
+import csv
+import os
+import random
+from datetime import datetime
+
+import numpy as np
+
+from feature_builder.vectorizer import build_feature_vectors
+from feature_builder.graph_builder import DEFAULT_MEMORY_BUDGET_MB
+from clustering.threshold_sweep import threshold_sweep
+from clustering.community_detector import BACKENDS
+from clustering.results import save_results
+
+
+if __name__ == '__main__':
+
+    SEED = 42
+
+    random.seed(SEED)
+    np.random.seed(SEED)
+
+    parser = argparse.ArgumentParser(
+        description='Barrido de umbrales de similitud reutilizando un único cálculo de similitudes')
+    parser.add_argument('ttl_path', nargs='+',
+                        help='Ruta al archivo .ttl con el grafo RDF (admite varios ficheros o patrones glob)')
+    parser.add_argument('--thresholds', type=float, nargs='+', default=None,
+                        help='Umbrales a evaluar (por defecto, de 0.1 a 0.9 en pasos de 0.1)')
+    parser.add_argument('--method', choices=['louvain', 'label_propagation', 'leiden'], default='louvain',
+                        help='Método de detección de comunidades')
+    parser.add_argument('--backend', choices=BACKENDS, default='networkx',
+                        help='Implementación de louvain / label_propagation: networkx o igraph (nativa)')
+    parser.add_argument('--sparse', action='store_true',
+                        help='Codifica las características como matriz dispersa (CSR)')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='No reutilizar ni guardar los vectores de características en la caché en disco')
+    parser.add_argument('--jobs', type=int, default=None,
+                        help='Número de procesos para la ingesta de varios ficheros (por defecto, número de CPUs) '
+                             'y de hilos para el cálculo de similitudes (por defecto, 1)')
+    parser.add_argument('--memory-budget', type=float, default=DEFAULT_MEMORY_BUDGET_MB,
+                        help='Memoria máxima (MB) para los bloques de la matriz de similitud')
+    args = parser.parse_args()
+
+    thresholds = args.thresholds or [round(0.1 * i, 1) for i in range(1, 10)]
+
+    feature_vectors, patient_ids = build_feature_vectors(args.ttl_path, use_cache=not args.no_cache,
+                                                         n_jobs=args.jobs, sparse=args.sparse)
+    print(f"[1] Características extraídas: {len(patient_ids)} pacientes, {feature_vectors.shape[1]} dimensiones.", flush=True)
+
+    results = threshold_sweep(feature_vectors, patient_ids, thresholds, method=args.method, seed=SEED,
+                              memory_budget_mb=args.memory_budget, n_jobs=args.jobs or 1,
+                              backend=args.backend)
+
+    print("[2] Resultados del barrido:", flush=True)
+    print(f"  {'Umbral':>8} {'Aristas':>10} {'Comunidades':>12} {'Modularidad':>12} {'Segundos':>9}")
+    for row in results:
+        modularity = f"{row['modularity']:.4f}" if row['modularity'] is not None else "-"
+        print(f"  {row['threshold']:>8.3f} {row['edges']:>10} {row['communities']:>12} "
+              f"{modularity:>12} {row['seconds']:>9.2f}")
+
+    output_dir = "outputs"
+    os.makedirs(output_dir, exist_ok=True)
+    today_str = datetime.today().strftime("%Y%m%d")
+    output_file = os.path.join(output_dir, f"{today_str}_ThresholdSweep_{args.method}.csv")
+
+    with open(output_file, mode="w", newline="", encoding="utf-8") as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(["Threshold", "Edges", "Communities", "Modularity", "Seconds"])
+        for row in results:
+            writer.writerow([row["threshold"], row["edges"], row["communities"], row["modularity"],
+                             round(row["seconds"], 3)])
+
+    print(f"CSV file saved to {output_file}")
+
+    # Particiones de todos los pasos en un único directorio de resultados
+    results_dir = save_results(os.path.join(output_dir, f"{today_str}_ThresholdSweep_{args.method}"),
+                               [row["partition"] for row in results],
+                               modularity=[row["modularity"] for row in results],
+                               metadata=[{"method": args.method, "backend": args.backend,
+                                          "threshold": row["threshold"], "seed": SEED, "input": args.ttl_path}
+                                         for row in results])
+    print(f"Results saved to {results_dir}")
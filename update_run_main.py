@@ -0,0 +1,41 @@
+# update_run_main.py
+import argparse
+import time
+
+from feature_builder.graph_builder import DEFAULT_MEMORY_BUDGET_MB
+from clustering.incremental import load_run, incremental_update
+
+
+if __name__ == '__main__':
+
+    SEED = 42
+
+    parser = argparse.ArgumentParser(
+        description='Actualiza de forma incremental una ejecución guardada con --save-model')
+    parser.add_argument('model_path',
+                        help='Fichero .npz guardado con community_detection_main.py --save-model')
+    parser.add_argument('ttl_path', nargs='+',
+                        help='Ficheros .ttl con la cohorte actual (admite patrones glob)')
+    parser.add_argument('--output', default=None,
+                        help='Fichero .npz de salida (por defecto, sobrescribe model_path)')
+    parser.add_argument('--jobs', type=int, default=1,
+                        help='Número de hilos para el cálculo de similitudes')
+    parser.add_argument('--memory-budget', type=float, default=DEFAULT_MEMORY_BUDGET_MB,
+                        help='Memoria máxima (MB) para los bloques de la matriz de similitud')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    assigner, G = load_run(args.model_path)
+    print(f"[1] Ejecución cargada: {G.number_of_nodes()} nodos, {G.number_of_edges()} aristas, "
+          f"{len(assigner.communities)} comunidades.", flush=True)
+
+    assigner, G, added_ids, removed_ids = incremental_update(assigner, G, args.ttl_path, seed=SEED,
+                                                             memory_budget_mb=args.memory_budget,
+                                                             n_jobs=args.jobs)
+    print(f"[2] {len(added_ids)} pacientes nuevos, {len(removed_ids)} eliminados.", flush=True)
+    print(f"[3] Grafo actualizado: {G.number_of_nodes()} nodos, {G.number_of_edges()} aristas, "
+          f"{len(assigner.communities)} comunidades ({time.perf_counter() - start:.2f} s).", flush=True)
+
+    output_path = args.output or args.model_path
+    assigner.save(output_path, graph=G)
+    print(f"Ejecución guardada en {output_path}")